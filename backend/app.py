@@ -1,24 +1,31 @@
+import logging
 from flask import Flask, render_template, request, redirect, url_for, session, flash
-import mysql.connector
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import check_password_hash
+from ustock_api.database import engine
+from ustock_api.logs import setup_logging
+from ustock_api.settings import SettingsError, settings
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# 🔐 Sans clé, n'importe qui pourrait forger un cookie de session administrateur : refuser de démarrer
+if not settings.flask_secret_key:
+    raise SettingsError(
+        "FLASK_SECRET_KEY manquant : clé de signature des sessions de l'administration "
+        "(générer avec python -c \"import secrets; print(secrets.token_urlsafe(64))\")"
+    )
 
 app = Flask(__name__)
-app.secret_key = "supersecretkey"  # Change cette clé pour plus de sécurité
+app.secret_key = settings.flask_secret_key
 
 # ⚙️ Configuration de Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = "login"
 
-# ⚙️ Configuration de la connexion MySQL
-db_config = {
-    "host": "localhost",
-    "user": "ustock",
-    "password": "UStock",
-    "database": "UStock"
-}
-
 # 📌 Classe utilisateur pour Flask-Login
 class User(UserMixin):
     def __init__(self, id, username, email):
@@ -30,16 +37,14 @@ class User(UserMixin):
 @login_manager.user_loader
 def load_user(user_id):
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with engine.connect() as conn:
+            user = conn.execute(
+                text("SELECT id, username, email FROM users WHERE id = :id"), {"id": user_id}
+            ).mappings().first()
         if user:
             return User(id=user["id"], username=user["username"], email=user["email"])
-    except mysql.connector.Error as err:
-        print(f"Erreur MySQL : {err}")
+    except SQLAlchemyError as err:
+        logger.error("Erreur MySQL : %s", err)
     return None
 
 # 🌍 Route de connexion
@@ -49,12 +54,10 @@ def login():
         email = request.form['email']
         password = request.form['password']
 
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with engine.connect() as conn:
+            user = conn.execute(
+                text("SELECT id, username, email, password_hash FROM users WHERE email = :email"), {"email": email}
+            ).mappings().first()
 
         if user and check_password_hash(user["password_hash"], password):
             user_obj = User(id=user["id"], username=user["username"], email=user["email"])
@@ -78,15 +81,12 @@ def logout():
 @app.route('/')
 @login_required
 def index():
-    conn = mysql.connector.connect(**db_config)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM products ORDER BY created_at DESC")
-    products = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with engine.connect() as conn:
+        products = conn.execute(text("SELECT * FROM products ORDER BY created_at DESC")).mappings().all()
 
     return render_template('index.html', products=products, username=current_user.username)
 
 # 🚀 Lancer l'application Flask
 if __name__ == '__main__':
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    # Jamais de débogueur interactif en production : FLASK_DEBUG=1 en local uniquement
+    app.run(debug=settings.flask_debug, host="0.0.0.0", port=5000)
@@ -0,0 +1,69 @@
+"""Durée et mémoire du digest quotidien d'expiration sur un grand nombre d'utilisateurs.
+
+Chaque utilisateur a `--stocks` lignes de stock réparties sur 60 jours ; la mémoire
+maximale (tracemalloc, mesurée sur la relance) doit rester la même quand `--users` augmente, car seule une
+tranche d'utilisateurs est chargée à la fois.
+
+Usage (depuis backend/) : python -m benchmarks.expiry_digest [--users 100000] [--stocks 5] [--chunk-size 1000]
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import date, timedelta
+from sqlalchemy import insert
+from benchmarks.fixtures import make_engine, make_sessionmaker
+from ustock_api import models
+from ustock_api.expiry_alerts import run_daily_digests
+
+SEED_BATCH_SIZE = 10_000
+
+
+def seed(engine, users: int, stocks: int, products: int = 1000):
+    today = date.today()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product.__table__), [
+            {"barcode": f"{3000000000000 + i}", "product_name": f"Produit {i}"} for i in range(products)
+        ])
+        for start in range(0, users, SEED_BATCH_SIZE):
+            user_ids = range(start + 1, min(users, start + SEED_BATCH_SIZE) + 1)
+            conn.execute(insert(models.User.__table__), [
+                {"id": user_id, "first_name": "Bench", "last_name": "User", "email": f"u{user_id}@ustock.test",
+                 "username": f"u{user_id}", "gender": "autres", "password_hash": "x"}
+                for user_id in user_ids
+            ])
+            conn.execute(insert(models.Stock.__table__), [
+                {"user_id": user_id, "product_id": 1 + (user_id * 7 + i) % products, "quantity": 1,
+                 "expiration_date": today + timedelta(days=(user_id + i * 13) % 60 - 10)}
+                for user_id in user_ids for i in range(stocks)
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--stocks", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    started = time.perf_counter()
+    seed(engine, args.users, args.stocks)
+    print(f"🌱 {args.users} utilisateurs, {args.users * args.stocks} stocks créés en {time.perf_counter() - started:.1f} s")
+
+    db = make_sessionmaker(engine)()
+    started = time.perf_counter()
+    scanned, written = run_daily_digests(db, chunk_size=args.chunk_size)
+    print(f"📬 Premier passage : {written} digests / {scanned} utilisateurs en {time.perf_counter() - started:.1f} s")
+
+    # Relance du même jour sous tracemalloc (plus lente) : mêmes lignes mises à jour, mémoire maximale
+    tracemalloc.start()
+    scanned, written = run_daily_digests(db, chunk_size=args.chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"🔁 Relance : {written} digests mis à jour, mémoire max {peak / 1024 / 1024:.1f} Mio")
+    print(f"🗂️ {db.query(models.Notification).count()} notifications en base")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
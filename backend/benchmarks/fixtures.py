@@ -0,0 +1,107 @@
+"""Outils communs aux benchmarks : base SQLite en mémoire, jeu de données et compteur de requêtes."""
+import os
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+# Les benchmarks ne doivent jamais toucher la base MySQL de production
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmarks-only-secret")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from ustock_api.database import Base
+from ustock_api import models
+
+
+# 🧪 Base SQLite en mémoire partagée entre les threads du client de test
+def make_engine(url: str = "sqlite://"):
+    engine = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def make_sessionmaker(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+# Session de préparation des données : les objets restent lisibles après commit
+def seed_session(engine):
+    return sessionmaker(bind=engine, expire_on_commit=False)()
+
+
+# 🔢 Compter les requêtes SQL émises pendant un bloc
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+# 👤 Créer un utilisateur de test
+def seed_user(db, username: str = "bench"):
+    user = models.User(
+        first_name="Bench",
+        last_name="User",
+        email=f"{username}@ustock.test",
+        username=username,
+        gender="autres",
+        password_hash="x",
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+# 📦 Créer `n` produits distincts et un stock par produit pour l'utilisateur
+def seed_stocks(db, user, n: int, start: int = 0):
+    today = date.today()
+    products = [
+        models.Product(barcode=f"{3000000000000 + start + i}", product_name=f"Produit {start + i}", brand="Bench")
+        for i in range(n)
+    ]
+    db.add_all(products)
+    db.flush()
+    db.add_all(
+        models.Stock(
+            product_id=product.id,
+            user_id=user.id,
+            quantity=1 + i % 5,
+            expiration_date=today + timedelta(days=i % 30),
+        )
+        for i, product in enumerate(products)
+    )
+    db.commit()
+
+
+# 🌐 Client HTTP de test branché sur la base de benchmark
+@contextmanager
+def make_client(app, SessionTesting, user):
+    from fastapi.testclient import TestClient
+    from ustock_api.auth import get_current_user
+    from ustock_api.database import get_db
+
+    def override_get_db():
+        db = SessionTesting()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
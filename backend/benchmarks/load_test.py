@@ -0,0 +1,437 @@
+"""Test de charge reproductible de l'API complète (`ustock_api.main:app`).
+
+- base : fichier SQLite temporaire par défaut, ou --url vers une base MySQL/MariaDB de test
+  (schéma déjà migré ; les comptes créés sont purgés à la fin, les produits restent) ;
+- Open Food Facts : serveur factice en mémoire (httpx.MockTransport) avec une latence simulée,
+  aucune requête ne sort de la machine ;
+- données : des comptes à 10, 100 et 1000 stocks (--profiles) et un historique de
+  consommations réparti sur 12 mois (--consumptions, de 10k à 1M) ;
+- charge : des utilisateurs virtuels enchaînent connexion, liste des stocks, ajout,
+  consommation, statistiques et scan d'un code-barres inconnu (--mix) pendant --duration ;
+- rapport : débit et p50/p95/p99 par opération (liste et statistiques aussi par profil),
+  enregistré en JSON pour comparer deux exécutions et signaler les régressions.
+
+L'application tourne dans le même processus (httpx.ASGITransport) : les latences
+incluent le client, mais pas le réseau. Même graine => mêmes données et même séquence d'opérations.
+
+Usage (depuis backend/) :
+    python -m benchmarks.load_test run [--duration 30] [--concurrency 24] [--consumptions 100000] [--output out.json]
+    python -m benchmarks.load_test run --baseline benchmarks/results/reference.json   # code de sortie 1 si régression
+    python -m benchmarks.load_test compare reference.json nouveau.json [--tolerance 0.2]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+DEFAULT_MIX = "login=5,list_stocks=35,add_stock=15,consume=25,stats=15,scan=5"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+PASSWORD = "benchmark"
+SEED_CHUNK_SIZE = 10_000
+# Codes-barres synthétiques : catalogue initial, puis produits découverts via le faux OFF
+CATALOGUE_BARCODE = 2_900_000_000_000
+SCAN_BARCODE = 2_950_000_000_000
+
+
+# ⚙️ L'application lit sa configuration à l'import : tout est fixé avant le premier import de ustock_api
+def configure_environment(args, database_url):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ.setdefault("JWT_SECRET_KEY", "load-test-only-secret")
+    os.environ.setdefault("SEARCH_INDEX_ON_STARTUP", "0")
+    os.environ.setdefault("OFF_MAX_RETRIES", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")  # Le journal JSON reste actif, sans une ligne par produit scanné
+
+
+def parse_mix(value: str):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"opération inconnue : {name!r} (attendu : {', '.join(OPERATIONS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# 🌍 Faux serveur Open Food Facts : toute fiche existe, les images sont absentes
+def off_stub_transport(latency_ms: float):
+    import httpx
+
+    async def handler(request):
+        await asyncio.sleep(latency_ms / 1000)
+        path = request.url.path
+        if path.startswith("/api/v0/product/"):
+            barcode = path.rsplit("/", 1)[-1].removesuffix(".json")
+            return httpx.Response(200, json={"status": 1, "product": {
+                "product_name": f"Produit scanné {barcode}", "brands": "Stub", "quantity": "500 g",
+                "nutriscore_grade": "b", "image_url": f"https://images.off.stub/{barcode}.jpg",
+            }})
+        if path == "/cgi/search.pl":
+            return httpx.Response(200, json={"products": []})
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handler)
+
+
+# 🌱 Jeu de données : insertions multi-lignes par tranches, puis agrégat mensuel reconstruit
+def seed(db, args, password_hash, prefix):
+    from sqlalchemy import insert, select
+    from ustock_api import models
+    from ustock_api.consumption_stats import backfill
+
+    rng = random.Random(args.seed)
+    today = date.today()
+    started = time.perf_counter()
+
+    catalogue_size = max(args.profiles) * 2  # De quoi ajouter des produits pas encore en stock
+    offset = CATALOGUE_BARCODE + prefix * 100_000
+    db.execute(insert(models.Product), [
+        {"barcode": str(offset + i), "product_name": f"Produit {i}", "brand": "Bench", "content_size": "1 kg", "nutriscore": "c"}
+        for i in range(catalogue_size)
+    ])
+    product_ids = [product_id for (product_id,) in db.execute(
+        select(models.Product.id).where(models.Product.barcode.in_([str(offset + i) for i in range(catalogue_size)])).order_by(models.Product.id)
+    )]
+
+    accounts = []
+    for profile in args.profiles:
+        for number in range(args.users_per_profile):
+            username = f"load{prefix}_{profile}_{number}"
+            user = models.User(
+                first_name="Load", last_name="Test", email=f"{username}@ustock.test", username=username,
+                gender="autres", password_hash=password_hash,
+            )
+            db.add(user)
+            db.flush()
+            accounts.append({"id": user.id, "username": username, "profile": profile})
+    db.commit()
+
+    for account in accounts:
+        held = rng.sample(product_ids, account["profile"])
+        db.execute(insert(models.Stock), [
+            {
+                "product_id": product_id, "user_id": account["id"], "quantity": rng.randint(3, 12),
+                "expiration_date": today + timedelta(days=rng.randint(-5, 90)) if rng.random() < 0.9 else None,
+            }
+            for product_id in held
+        ])
+        account["stocks"] = {
+            stock_id: quantity for stock_id, quantity in db.execute(
+                select(models.Stock.id, models.Stock.quantity).where(models.Stock.user_id == account["id"])
+            )
+        }
+    db.commit()
+
+    # Historique : les gros profils consomment davantage (poids proportionnel au nombre de stocks)
+    weights = [account["profile"] for account in accounts]
+    now = datetime.now()
+    remaining = args.consumptions
+    while remaining > 0:
+        size = min(SEED_CHUNK_SIZE, remaining)
+        rows = []
+        for account in rng.choices(accounts, weights=weights, k=size):
+            consumed_at = now - timedelta(days=rng.randint(0, 364), seconds=rng.randint(0, 86_399))
+            rows.append({
+                "product_id": rng.choice(product_ids), "user_id": account["id"], "stock_id": None,
+                "quantity": rng.randint(1, 3), "status": "wasted" if rng.random() < 0.2 else "consumed",
+                "expiration_date": consumed_at.date() + timedelta(days=rng.randint(-3, 10)), "consumption_date": consumed_at,
+            })
+        db.execute(insert(models.ProductConsumption), rows)
+        db.commit()
+        remaining -= size
+    for account in accounts:
+        backfill(db, account["id"])
+
+    print(
+        f"🌱 {len(accounts)} comptes ({', '.join(str(p) for p in args.profiles)} stocks), "
+        f"{args.consumptions} consommations, {catalogue_size} produits en {time.perf_counter() - started:.1f} s"
+    )
+    return accounts, product_ids
+
+
+# 🎭 Opérations du mélange : chacune renvoie (clé du rapport, réponse)
+async def op_login(client, user, rng):
+    response = await client.post("/users/login", json={"username": user["username"], "password": PASSWORD})
+    return "login", response
+
+
+async def op_list_stocks(client, user, rng):
+    response = await client.get("/stocks/", headers=user["headers"])
+    return f"list_stocks[{user['profile']}]", response
+
+
+async def op_add_stock(client, user, rng):
+    expiration = (date.today() + timedelta(days=rng.randint(1, 60))).isoformat()
+    response = await client.post(
+        "/stocks/", headers=user["headers"],
+        json={"product_id": rng.choice(user["product_ids"]), "quantity": rng.randint(1, 3), "expiration_date": expiration},
+    )
+    if response.status_code == 200:
+        stock = response.json()
+        user["stocks"][stock["id"]] = stock["quantity"]
+    return "add_stock", response
+
+
+async def op_consume(client, user, rng):
+    if not user["stocks"]:
+        return await op_add_stock(client, user, rng)
+    stock_id = rng.choice(list(user["stocks"]))
+    response = await client.post(
+        "/consumption/", headers=user["headers"],
+        json={"stock_id": stock_id, "quantity": 1, "status": "wasted" if rng.random() < 0.2 else "consumed"},
+    )
+    if response.status_code == 200:
+        user["stocks"][stock_id] -= 1
+    if response.status_code != 200 or user["stocks"][stock_id] <= 0:
+        user["stocks"].pop(stock_id, None)
+    return "consume", response
+
+
+async def op_stats(client, user, rng):
+    response = await client.get("/consumption/stats", headers=user["headers"])
+    return f"stats[{user['profile']}]", response
+
+
+async def op_scan(client, user, rng):
+    barcode = str(SCAN_BARCODE + user["prefix"] * 1_000_000 + next(user["scan_counter"]))
+    response = await client.post("/products/", params={"barcode": barcode})
+    return "scan", response
+
+
+OPERATIONS = {
+    "login": op_login, "list_stocks": op_list_stocks, "add_stock": op_add_stock,
+    "consume": op_consume, "stats": op_stats, "scan": op_scan,
+}
+
+
+async def drive(app, accounts, product_ids, args, prefix):
+    import itertools
+    import httpx
+    from ustock_api import off_client
+
+    off_client._client = off_client.OFFClient(base_url="http://off.stub", transport=off_stub_transport(args.off_latency_ms))
+    names, weights = zip(*args.mix.items())
+    samples = {}
+    scan_counter = itertools.count()
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            # Un compte par utilisateur virtuel (pas de course entre eux sur les mêmes stocks)
+            users = []
+            for number in range(args.concurrency):
+                account = accounts[number % len(accounts)]
+                response = await client.post("/users/login", json={"username": account["username"], "password": PASSWORD})
+                response.raise_for_status()
+                users.append({
+                    **account, "stocks": dict(account["stocks"]), "product_ids": product_ids, "prefix": prefix,
+                    "scan_counter": scan_counter, "headers": {"Authorization": f"Bearer {response.json()['access_token']}"},
+                })
+
+            deadline = time.perf_counter() + args.warmup + args.duration
+            measure_from = time.perf_counter() + args.warmup
+
+            async def virtual_user(number, user):
+                rng = random.Random(f"{args.seed}-{number}")
+                while time.perf_counter() < deadline:
+                    operation = OPERATIONS[rng.choices(names, weights=weights)[0]]
+                    started = time.perf_counter()
+                    try:
+                        key, response = await operation(client, user, rng)
+                        ok = response.status_code < 400
+                    except Exception as err:  # Une exception côté application remonte à travers ASGITransport
+                        key, ok = operation.__name__.removeprefix("op_"), False
+                        print(f"❌ {key} : {err!r}", file=sys.stderr)
+                    if started >= measure_from:
+                        samples.setdefault(key, []).append((time.perf_counter() - started, ok))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(virtual_user(number, user) for number, user in enumerate(users)))
+            elapsed = time.perf_counter() - max(started, measure_from)
+
+    return samples, elapsed
+
+
+def summarize(samples, elapsed):
+    from benchmarks.login_throughput import percentile  # Importe les fixtures : après configure_environment
+
+    def block(entries):
+        latencies = [latency for latency, _ in entries]
+        errors = sum(1 for _, ok in entries if not ok)
+        return {
+            "requests": len(entries),
+            "errors": errors,
+            "error_rate": round(errors / len(entries), 4) if entries else 0.0,
+            "throughput_rps": round(len(entries) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        }
+
+    return {
+        "endpoints": {key: block(entries) for key, entries in sorted(samples.items())},
+        "total": block([entry for entries in samples.values() for entry in entries]),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report):
+    print(f"\n{'opération':22} {'req':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'erreurs':>8}")
+    for key, stats in [*report["endpoints"].items(), ("TOTAL", report["total"])]:
+        print(
+            f"{key:22} {stats['requests']:7} {stats['throughput_rps']:8.1f} {stats['p50_ms']:7.1f}ms "
+            f"{stats['p95_ms']:7.1f}ms {stats['p99_ms']:7.1f}ms {stats['errors']:8}"
+        )
+
+
+# 📉 Régressions : p95/p99 plus lents ou débit plus faible au-delà de la tolérance, erreurs en hausse
+def compare(baseline, current, tolerance: float, min_requests: int = 20):
+    regressions = []
+    for key, before in baseline["endpoints"].items():
+        after = current["endpoints"].get(key)
+        if after is None or min(before["requests"], after["requests"]) < min_requests:
+            continue  # Trop peu d'échantillons : les percentiles ne veulent rien dire
+        for metric in ("p95_ms", "p99_ms"):
+            if after[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{key} {metric} : {before[metric]:.1f} -> {after[metric]:.1f} ms")
+        if after["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{key} débit : {before['throughput_rps']:.1f} -> {after['throughput_rps']:.1f} req/s")
+        if after["error_rate"] > before["error_rate"] + 0.01:
+            regressions.append(f"{key} erreurs : {before['error_rate']:.2%} -> {after['error_rate']:.2%}")
+    # Des résultats obtenus avec d'autres paramètres ne sont pas comparables
+    changed = [
+        name for name in ("database", "profiles", "users_per_profile", "consumptions", "concurrency", "mix", "rounds")
+        if baseline["config"].get(name) != current["config"].get(name)
+    ]
+    return regressions, changed
+
+
+def report_comparison(baseline, current, tolerance):
+    regressions, changed = compare(baseline, current, tolerance)
+    if changed:
+        print(f"⚠️ Paramètres différents de la référence : {', '.join(changed)}")
+    if regressions:
+        print(f"📉 {len(regressions)} régression(s) au-delà de {tolerance:.0%} :")
+        for line in regressions:
+            print(f"   - {line}")
+        return 1
+    print(f"✅ Aucune régression au-delà de {tolerance:.0%} par rapport à la référence")
+    return 0
+
+
+def run(args):
+    tempdir = None
+    if args.url:
+        database_url = args.url
+    else:
+        tempdir = tempfile.TemporaryDirectory(prefix="ustock-load-")
+        # Attente du verrou d'écriture plutôt qu'une erreur « database is locked »
+        database_url = f"sqlite:///{os.path.join(tempdir.name, 'load.db')}?timeout=60"
+    configure_environment(args, database_url)
+
+    from passlib.context import CryptContext
+    from ustock_api.account_deletion import purge_user
+    from ustock_api.database import Base, SessionLocal, engine
+    from ustock_api.main import app
+
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine)
+    prefix = random.Random(args.seed).randrange(100) if not args.url else os.getpid() % 100
+    password_hash = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=args.rounds).hash(PASSWORD)
+    db = SessionLocal()
+    try:
+        accounts, product_ids = seed(db, args, password_hash, prefix)
+        samples, elapsed = asyncio.run(drive(app, accounts, product_ids, args, prefix))
+        if args.url:
+            for account in accounts:
+                purge_user(db, account["id"])
+            db.commit()
+    finally:
+        db.close()
+        engine.dispose()
+        if tempdir:
+            tempdir.cleanup()
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "database": engine.dialect.name, "profiles": args.profiles, "users_per_profile": args.users_per_profile,
+            "consumptions": args.consumptions, "concurrency": args.concurrency, "duration": args.duration,
+            "mix": args.mix, "rounds": args.rounds, "off_latency_ms": args.off_latency_ms, "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        **summarize(samples, elapsed),
+    }
+    print_report(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load_test-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2, ensure_ascii=False)
+    print(f"💾 Résultats enregistrés dans {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            return report_comparison(json.load(handle), report, args.tolerance)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    load = subcommands.add_parser("run", help="préparer les données, lancer la charge et enregistrer les résultats")
+    load.add_argument("--url", help="base MySQL/MariaDB de test (défaut : fichier SQLite temporaire)")
+    load.add_argument("--profiles", type=lambda value: [int(part) for part in value.split(",")], default=[10, 100, 1000],
+                      help="nombre de stocks par compte, un profil par valeur")
+    load.add_argument("--users-per-profile", type=int, help="défaut : de quoi donner un compte à chaque utilisateur virtuel")
+    load.add_argument("--consumptions", type=int, default=10_000, help="lignes d'historique de consommation")
+    load.add_argument("--concurrency", type=int, default=24, help="utilisateurs virtuels")
+    load.add_argument("--duration", type=float, default=30, help="secondes mesurées")
+    load.add_argument("--warmup", type=float, default=3, help="secondes de préchauffage non mesurées")
+    load.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"poids des opérations (défaut : {DEFAULT_MIX})")
+    load.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")), help="coût bcrypt des comptes")
+    load.add_argument("--off-latency-ms", type=float, default=150, help="latence simulée d'Open Food Facts")
+    load.add_argument("--seed", type=int, default=1)
+    load.add_argument("--output", help="fichier JSON (défaut : benchmarks/results/load_test-<date>.json)")
+    load.add_argument("--baseline", help="résultats de référence à comparer")
+    load.add_argument("--tolerance", type=float, default=0.2, help="écart toléré avant de signaler une régression")
+
+    diff = subcommands.add_parser("compare", help="comparer deux fichiers de résultats")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as before, open(args.current, encoding="utf-8") as after:
+            return report_comparison(json.load(before), json.load(after), args.tolerance)
+
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+    if args.users_per_profile is None:
+        args.users_per_profile = max(1, math.ceil(args.concurrency / len(args.profiles)))
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Débit de POST /users/login et latence de GET /stocks/ pendant une rafale de connexions.
+
+Les connexions passent par le pool bcrypt dédié : les lectures de stock servies en
+parallèle ne doivent pas voir leur latence exploser.
+
+Usage (depuis backend/) : python -m benchmarks.login_throughput [--logins 200] [--concurrency 50] [--rounds 12]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.fixtures import make_engine, make_sessionmaker, seed_session, seed_stocks, seed_user
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else 0.0
+
+
+async def run(args):
+    import httpx
+    from fastapi import FastAPI
+    from passlib.context import CryptContext
+    from ustock_api.auth import create_access_token
+    from ustock_api.database import get_db
+    from ustock_api.passwords import shutdown_pool
+    from ustock_api.routes import stocks, users
+
+    engine = make_engine()
+    SessionTesting = make_sessionmaker(engine)
+    seed_db = seed_session(engine)
+    context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=args.rounds)
+    password_hash = context.hash("benchmark")
+    accounts = []
+    for i in range(args.users):
+        user = seed_user(seed_db, f"bench{i}")
+        user.password_hash = password_hash
+        accounts.append(user)
+    seed_db.commit()
+    seed_stocks(seed_db, accounts[0], 100)
+    token = create_access_token({"sub": accounts[0].username, "id": accounts[0].id})
+
+    app = FastAPI()
+    app.include_router(users.router)
+    app.include_router(stocks.router)
+
+    def override_get_db():
+        db = SessionTesting()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Préchauffage : démarrage des processus du pool
+        await client.post("/users/login", json={"username": "bench0", "password": "benchmark"})
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        done = asyncio.Event()
+        read_latencies = []
+
+        async def login(i):
+            async with semaphore:
+                response = await client.post(
+                    "/users/login", json={"username": f"bench{i % args.users}", "password": "benchmark"}
+                )
+                response.raise_for_status()
+
+        async def read_stocks():
+            headers = {"Authorization": f"Bearer {token}"}
+            while not done.is_set():
+                started = time.perf_counter()
+                (await client.get("/stocks/", headers=headers)).raise_for_status()
+                read_latencies.append(time.perf_counter() - started)
+
+        readers = [asyncio.create_task(read_stocks()) for _ in range(args.readers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(args.logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*readers)
+
+    shutdown_pool()
+    seed_db.close()
+    return elapsed, read_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    args = parser.parse_args()
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+    elapsed, read_latencies = asyncio.run(run(args))
+    print(f"🔐 {args.logins} connexions en {elapsed:.2f} s — {args.logins / elapsed:.1f} connexions/s (coût bcrypt {args.rounds})")
+    if read_latencies:
+        print(
+            f"📦 GET /stocks/ pendant la rafale : {len(read_latencies)} lectures, "
+            f"p50={percentile(read_latencies, 0.50):.1f} ms p95={percentile(read_latencies, 0.95):.1f} ms "
+            f"p99={percentile(read_latencies, 0.99):.1f} ms max={max(read_latencies) * 1000:.1f} ms "
+            f"moyenne={statistics.mean(read_latencies) * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
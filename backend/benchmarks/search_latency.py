@@ -0,0 +1,58 @@
+"""Latence de l'index de recherche local sur un catalogue synthétique.
+
+Les noms mélangent des mots courants (présents dans ~10 % des produits, cas défavorable)
+et des mots rares ; les requêtes sont des préfixes tapés au fil de la saisie.
+
+Usage (depuis backend/) : python -m benchmarks.search_latency [--products 1000000] [--repeat 50]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.login_throughput import percentile
+from ustock_api.search_index import SearchIndex
+
+COMMON_WORDS = [
+    "lait", "chocolat", "crème", "fraîche", "yaourt", "nature", "biscuit", "pain", "jambon", "fromage",
+    "beurre", "sucre", "farine", "pomme", "poire", "jus", "orange", "café", "thé", "eau",
+    "gazeuse", "pâtes", "riz", "sauce", "tomate", "huile", "olive", "sel", "poivre", "miel",
+]
+BRANDS = ["Carrefour", "Danone", "Nestlé", "Lactalis", "Bonne Maman", "Président", "Lu", "Panzani", "Évian", "Lindt"]
+QUERIES = ["la", "lai", "lait", "choco", "chocolat", "creme", "creme fr", "danone yao", "chcolat", "lait creme cho", "pates tom"]
+
+
+def build_index(products: int, seed: int = 1) -> SearchIndex:
+    rng = random.Random(seed)
+    rare = [f"{rng.choice(COMMON_WORDS)[:4]}{i}" for i in range(max(1, products // 5))]
+    index = SearchIndex()
+    index.load(
+        (product_id, " ".join(rng.sample(COMMON_WORDS, 3) + [rng.choice(rare)]), rng.choice(BRANDS))
+        for product_id in range(1, products + 1)
+    )
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = build_index(args.products)
+    print(f"🏗️ Index de {args.products} produits construit en {time.perf_counter() - started:.1f} s ({len(index)} termes)")
+
+    latencies = []
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            _, total = index.search(query, 0, 10)
+            timings.append(time.perf_counter() - started)
+        latencies.extend(timings)
+        print(f"🔎 {query!r:18} {total:8} résultats  p50={percentile(timings, 0.50):.1f} ms p99={percentile(timings, 0.99):.1f} ms")
+    print(f"📊 Toutes requêtes : p50={percentile(latencies, 0.50):.1f} ms p95={percentile(latencies, 0.95):.1f} ms p99={percentile(latencies, 0.99):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Écritures concurrentes sur une même ligne de stock : exactitude et débit.
+
+Des « appareils » envoient en parallèle des POST /consumption/ et des POST /stocks/ sur
+le même (produit, date). Deux phases :
+- mixte : consommations et ajouts entrelacés ; la quantité finale doit valoir
+  initiale + ajouts acceptés − consommations acceptées, sans doublon de ligne ;
+- épuisement : plus de demandes que d'unités ; exactement `initiale` consommations
+  acceptées, jamais de quantité négative, la ligne est supprimée.
+
+Par défaut sur un fichier SQLite temporaire (écritures sérialisées par la base) ;
+--url pour viser une base MySQL/MariaDB de test où les verrous de ligne s'exercent vraiment.
+
+Usage (depuis backend/) : python -m benchmarks.stock_contention [--devices 8] [--requests 50] [--url mysql+mysqlconnector://...]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from sqlalchemy import create_engine, func
+
+from benchmarks.fixtures import make_sessionmaker, seed_session, seed_user
+from ustock_api import models
+from ustock_api.database import Base
+
+
+def make_engine(url: str):
+    if url.startswith("sqlite"):
+        # Attente du verrou d'écriture plutôt qu'une erreur « database is locked »
+        return create_engine(url, connect_args={"check_same_thread": False, "timeout": 60})
+    return create_engine(url, pool_size=32, max_overflow=32)
+
+
+async def phase(client, stock_id, product_id, expiration, devices, requests, add_every):
+    counts = {"consumed": 0, "added": 0, "refused": 0, "errors": 0}
+
+    async def device(number):
+        for i in range(requests):
+            if add_every and (number + i) % add_every == 0:
+                response = await client.post("/stocks/", json={"product_id": product_id, "quantity": 1, "expiration_date": expiration})
+                key = "added"
+            else:
+                response = await client.post("/consumption/", json={"stock_id": stock_id, "quantity": 1, "status": "consumed"})
+                key = "consumed"
+            if response.status_code == 200:
+                counts[key] += 1
+            elif response.status_code in (400, 404):
+                counts["refused"] += 1
+            else:
+                counts["errors"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(device(number) for number in range(devices)))
+    return counts, time.perf_counter() - started
+
+
+async def run(args, engine):
+    import httpx
+    from fastapi import FastAPI
+    from ustock_api.auth import get_current_user
+    from ustock_api.database import get_db
+    from ustock_api.routes import consumption, stocks
+
+    Base.metadata.create_all(engine)
+    SessionTesting = make_sessionmaker(engine)
+    seed_db = seed_session(engine)
+    user = seed_user(seed_db, f"contention{os.getpid()}")
+    product = models.Product(barcode=f"{3990000000000 + os.getpid() % 1_000_000}", product_name="Produit contention")
+    seed_db.add(product)
+    seed_db.commit()
+
+    app = FastAPI()
+    app.include_router(stocks.router)
+    app.include_router(consumption.router)
+
+    def override_get_db():
+        db = SessionTesting()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: user
+
+    failures = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for name, initial, add_every, days in (("mixte", args.devices * args.requests, 3, 10), ("épuisement", args.requests, 0, 11)):
+            expiration = str(date.today() + timedelta(days=days))
+            created = await client.post("/stocks/", json={"product_id": product.id, "quantity": initial, "expiration_date": expiration})
+            created.raise_for_status()
+            counts, elapsed = await phase(client, created.json()["id"], product.id, expiration, args.devices, args.requests, add_every)
+
+            check_db = SessionTesting()
+            rows = check_db.query(models.Stock.quantity).filter(
+                models.Stock.user_id == user.id, models.Stock.product_id == product.id,
+                models.Stock.expiration_date == date.fromisoformat(expiration),
+            ).all()
+            check_db.close()
+            final = sum(quantity for (quantity,) in rows)
+            expected = initial + counts["added"] - counts["consumed"]
+            total = args.devices * args.requests
+            print(
+                f"⚙️ {name:10} {total} requêtes en {elapsed:.2f} s ({total / elapsed:.0f} req/s) — "
+                f"{counts['consumed']} consommations, {counts['added']} ajouts, {counts['refused']} refus, {counts['errors']} erreurs ; "
+                f"quantité finale {final} (attendue {expected}), {len(rows)} ligne(s)"
+            )
+            if counts["errors"]:
+                failures.append(f"{name} : {counts['errors']} réponse(s) en erreur")
+            if final != expected or len(rows) > 1 or any(quantity < 0 for (quantity,) in rows):
+                failures.append(f"{name} : quantité {final} au lieu de {expected} ({len(rows)} ligne(s))")
+            if not add_every and (counts["consumed"] != initial or rows):
+                failures.append(f"{name} : {counts['consumed']} consommations acceptées pour {initial} unités")
+
+        check_db = SessionTesting()
+        recorded = check_db.query(func.sum(models.ProductConsumption.quantity)).filter(models.ProductConsumption.user_id == user.id).scalar()
+        check_db.close()
+        print(f"🧾 {recorded} unités dans l'historique de consommation")
+    seed_db.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=8, help="clients en parallèle")
+    parser.add_argument("--requests", type=int, default=50, help="requêtes par client et par phase")
+    parser.add_argument("--url", help="base de test (par défaut un fichier SQLite temporaire)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(args.url or f"sqlite:///{os.path.join(directory, 'contention.db')}")
+        failures = asyncio.run(run(args, engine))
+        engine.dispose()
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ Aucune mise à jour perdue, aucune quantité négative")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
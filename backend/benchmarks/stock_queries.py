@@ -0,0 +1,53 @@
+"""Vérifie que GET /stocks/ émet un nombre de requêtes SQL constant quel que soit le nombre de stocks.
+
+Usage (depuis backend/) : python -m benchmarks.stock_queries [N1 N2 ...]
+"""
+import sys
+import time
+from fastapi import FastAPI
+from benchmarks.fixtures import QueryCounter, make_client, make_engine, make_sessionmaker, seed_session, seed_stocks, seed_user
+from ustock_api.routes import stocks
+
+
+def measure(sizes):
+    app = FastAPI()
+    app.include_router(stocks.router)
+    engine = make_engine()
+    SessionTesting = make_sessionmaker(engine)
+    seed_db = seed_session(engine)
+    user = seed_user(seed_db)
+
+    results = []
+    seeded = 0
+    with make_client(app, SessionTesting, user) as client:
+        client.get("/stocks/").raise_for_status()  # Préchauffage : version du catalogue mise en cache
+        for n in sorted(sizes):
+            seed_stocks(seed_db, user, n - seeded, start=seeded)
+            seeded = n
+            with QueryCounter(engine) as counter:
+                started = time.perf_counter()
+                response = client.get("/stocks/")
+                elapsed = time.perf_counter() - started
+            response.raise_for_status()
+            assert len(response.json()) == n
+            results.append((n, counter.count, elapsed))
+    seed_db.close()
+    return results
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or [10, 100, 300, 1000]
+    results = measure(sizes)
+    for n, queries, elapsed in results:
+        print(f"N={n:>6}  requêtes SQL={queries}  durée={elapsed * 1000:.1f} ms")
+
+    counts = {queries for _, queries, _ in results}
+    if len(counts) != 1:
+        print("❌ Le nombre de requêtes varie avec N (N+1 ?)")
+        return 1
+    print("✅ Nombre de requêtes constant")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
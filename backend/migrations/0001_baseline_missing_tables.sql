@@ -0,0 +1,31 @@
+-- Tables et colonnes utilisées par l'API mais absentes de certaines bases (dump initial)
+
+CREATE TABLE IF NOT EXISTS `product_consumption` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `product_id` int(11) NOT NULL,
+  `user_id` int(11) NOT NULL,
+  `stock_id` int(11) DEFAULT NULL,
+  `quantity` int(11) NOT NULL DEFAULT 1,
+  `status` enum('consumed','wasted') NOT NULL,
+  `expiration_date` date DEFAULT NULL,
+  `consumption_date` timestamp NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  KEY `product_id` (`product_id`),
+  KEY `user_id` (`user_id`),
+  CONSTRAINT `product_consumption_ibfk_1` FOREIGN KEY (`product_id`) REFERENCES `products` (`id`),
+  CONSTRAINT `product_consumption_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE IF NOT EXISTS `consumption_monthly_stats` (
+  `user_id` int(11) NOT NULL,
+  `month` date NOT NULL,
+  `product_id` int(11) NOT NULL,
+  `consumed_quantity` int(11) NOT NULL DEFAULT 0,
+  `wasted_quantity` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`,`month`,`product_id`),
+  KEY `product_id` (`product_id`),
+  CONSTRAINT `consumption_monthly_stats_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE,
+  CONSTRAINT `consumption_monthly_stats_ibfk_2` FOREIGN KEY (`product_id`) REFERENCES `products` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+ALTER TABLE `users` ADD COLUMN IF NOT EXISTS `profile_image_url` varchar(255) DEFAULT NULL AFTER `password_hash`;
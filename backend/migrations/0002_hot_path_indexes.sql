@@ -0,0 +1,10 @@
+-- Index composites alignés sur les requêtes des routes
+
+-- add_product_to_user / POST /stocks/batch : recherche par (user_id, product_id, expiration_date)
+CREATE INDEX IF NOT EXISTS `ix_stocks_user_product_expiration` ON `stocks` (`user_id`, `product_id`, `expiration_date`);
+
+-- GET /consumption/?status=... : filtre (user_id, status), tri par consumption_date
+CREATE INDEX IF NOT EXISTS `ix_consumption_user_status_date` ON `product_consumption` (`user_id`, `status`, `consumption_date`);
+
+-- GET /consumption/ sans filtre : historique trié par date
+CREATE INDEX IF NOT EXISTS `ix_consumption_user_date` ON `product_consumption` (`user_id`, `consumption_date`);
@@ -0,0 +1,8 @@
+-- Fichiers de dump / delta Open Food Facts déjà importés (voir ustock_api/off_dump.py)
+
+CREATE TABLE IF NOT EXISTS `off_dump_imports` (
+  `filename` varchar(255) NOT NULL,
+  `products` int(11) NOT NULL DEFAULT 0,
+  `imported_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`filename`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -0,0 +1,8 @@
+-- Versions utilisées pour les ETag (GET /products/, GET /stocks/)
+
+-- Date de dernière modification d'une fiche produit (import OFF, dump)
+ALTER TABLE `products` ADD COLUMN IF NOT EXISTS `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp() AFTER `created_at`;
+CREATE INDEX IF NOT EXISTS `ix_products_updated_at` ON `products` (`updated_at`);
+
+-- Compteur incrémenté à chaque modification du stock d'un utilisateur (voir ustock_api/changes.py)
+ALTER TABLE `users` ADD COLUMN IF NOT EXISTS `stock_version` int(11) NOT NULL DEFAULT 0 AFTER `profile_image_url`;
@@ -0,0 +1,18 @@
+-- Synchronisation incrémentale (GET /sync) : date de modification des stocks et journal des changements
+
+ALTER TABLE `stocks` ADD COLUMN IF NOT EXISTS `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp() AFTER `added_at`;
+
+-- Une ligne par entité créée, modifiée ou supprimée ; `version` = users.stock_version après la modification
+CREATE TABLE IF NOT EXISTS `change_log` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `user_id` int(11) NOT NULL,
+  `version` int(11) NOT NULL,
+  `entity` enum('stock','consumption') NOT NULL,
+  `entity_id` int(11) NOT NULL,
+  `action` enum('upsert','delete') NOT NULL,
+  `changed_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  KEY `ix_change_log_user_version` (`user_id`,`version`),
+  KEY `ix_change_log_changed_at` (`changed_at`),
+  CONSTRAINT `change_log_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -0,0 +1,9 @@
+-- Inventaire partagé par famille (GET /families/me/inventory)
+
+-- Les stocks créés avant cette migration n'ont pas de family_id : reprendre celle de leur propriétaire
+UPDATE `stocks` JOIN `users` ON `users`.`id` = `stocks`.`user_id`
+SET `stocks`.`family_id` = `users`.`family_id`
+WHERE `stocks`.`family_id` IS NULL AND `users`.`family_id` IS NOT NULL;
+
+-- Agrégation par (produit, date d'expiration) lue entièrement dans l'index (quantity incluse)
+CREATE INDEX IF NOT EXISTS `ix_stocks_family_product_expiration` ON `stocks` (`family_id`, `product_id`, `expiration_date`, `quantity`);
@@ -0,0 +1,21 @@
+-- Alertes d'expiration : GET /stocks/expiring et digest quotidien (python -m ustock_api.expiry_alerts digest)
+
+-- Parcours par plage de dates pour un utilisateur (dans l'index (user_id, product_id, expiration_date), product_id s'intercale avant la date)
+CREATE INDEX IF NOT EXISTS `ix_stocks_user_expiration` ON `stocks` (`user_id`, `expiration_date`);
+
+-- Un digest par utilisateur et par jour, relevé par l'application (GET /notifications/)
+CREATE TABLE IF NOT EXISTS `notifications` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `user_id` int(11) NOT NULL,
+  `kind` enum('expiry_digest') NOT NULL,
+  `notification_date` date NOT NULL,
+  `expiring_count` int(11) NOT NULL DEFAULT 0,
+  `expired_count` int(11) NOT NULL DEFAULT 0,
+  `items` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL CHECK (json_valid(`items`)),
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  `read_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_notifications_user_kind_date` (`user_id`,`kind`,`notification_date`),
+  KEY `ix_notifications_date` (`notification_date`),
+  CONSTRAINT `notifications_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
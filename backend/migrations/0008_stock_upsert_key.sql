@@ -0,0 +1,36 @@
+-- Écritures atomiques sur le stock : clé unique (user_id, product_id, date d'expiration) pour l'upsert de POST /stocks/
+
+-- Date sentinelle pour les produits sans date (plusieurs NULL ne sont pas des doublons pour un index UNIQUE)
+ALTER TABLE `stocks` ADD COLUMN IF NOT EXISTS `expiration_key` date GENERATED ALWAYS AS (coalesce(`expiration_date`,'1000-01-01')) STORED AFTER `expiration_date`;
+
+-- Fusionner les doublons créés par l'ancienne lecture-modification-écriture : la plus ancienne ligne garde la somme
+CREATE TEMPORARY TABLE `stock_duplicates` AS
+SELECT `user_id`, `product_id`, `expiration_key`, MIN(`id`) AS `keep_id`, SUM(`quantity`) AS `total`
+FROM `stocks`
+WHERE `user_id` IS NOT NULL
+GROUP BY `user_id`, `product_id`, `expiration_key`
+HAVING COUNT(*) > 1;
+
+-- Journal de synchronisation : une nouvelle version par utilisateur concerné (ligne conservée modifiée, autres supprimées)
+UPDATE `users` JOIN (SELECT DISTINCT `user_id` FROM `stock_duplicates`) AS `d` ON `d`.`user_id` = `users`.`id`
+SET `users`.`stock_version` = `users`.`stock_version` + 1, `users`.`updated_at` = `users`.`updated_at`;
+
+INSERT INTO `change_log` (`user_id`, `version`, `entity`, `entity_id`, `action`)
+SELECT `s`.`user_id`, `u`.`stock_version`, 'stock', `s`.`id`, IF(`s`.`id` = `d`.`keep_id`, 'upsert', 'delete')
+FROM `stocks` AS `s`
+JOIN `stock_duplicates` AS `d` ON `d`.`user_id` = `s`.`user_id` AND `d`.`product_id` = `s`.`product_id` AND `d`.`expiration_key` = `s`.`expiration_key`
+JOIN `users` AS `u` ON `u`.`id` = `s`.`user_id`
+ORDER BY `s`.`id` = `d`.`keep_id` DESC, `s`.`id`;
+
+UPDATE `stocks` JOIN `stock_duplicates` AS `d` ON `d`.`keep_id` = `stocks`.`id`
+SET `stocks`.`quantity` = `d`.`total`;
+
+DELETE `stocks` FROM `stocks`
+JOIN `stock_duplicates` AS `d` ON `d`.`user_id` = `stocks`.`user_id` AND `d`.`product_id` = `stocks`.`product_id` AND `d`.`expiration_key` = `stocks`.`expiration_key`
+WHERE `stocks`.`id` <> `d`.`keep_id`;
+
+DROP TEMPORARY TABLE `stock_duplicates`;
+
+-- La clé unique remplace l'index (user_id, product_id, expiration_date) de 0002 (mêmes préfixes)
+CREATE UNIQUE INDEX IF NOT EXISTS `uq_stocks_user_product_expiration` ON `stocks` (`user_id`, `product_id`, `expiration_key`);
+DROP INDEX IF EXISTS `ix_stocks_user_product_expiration` ON `stocks`;
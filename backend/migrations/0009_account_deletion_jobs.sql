@@ -0,0 +1,13 @@
+-- Suppression de compte en arrière-plan (POST /users/me/deletion, python -m ustock_api.account_deletion resume)
+-- Pas de clé étrangère vers users : le job doit rester lisible une fois le compte supprimé
+CREATE TABLE IF NOT EXISTS `account_deletion_jobs` (
+  `id` varchar(32) NOT NULL,
+  `user_id` int(11) NOT NULL,
+  `status` enum('pending','running','done','failed') NOT NULL DEFAULT 'pending',
+  `deleted_rows` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL CHECK (json_valid(`deleted_rows`)),
+  `error` varchar(255) DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  `finished_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `ix_account_deletion_jobs_status` (`status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
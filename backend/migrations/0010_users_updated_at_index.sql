@@ -0,0 +1,2 @@
+-- Invalidation des caches entre workers (ustock_api/invalidation.py) : comptes modifiés récemment
+CREATE INDEX IF NOT EXISTS `ix_users_updated_at` ON `users` (`updated_at`);
@@ -0,0 +1,9 @@
+-- Inventaire familial (GET /families/me/inventory) : COUNT(DISTINCT user_id) lit aussi user_id,
+-- absent de l'index de 0006 ; on l'ajoute en fin de clé pour que l'agrégation reste dans l'index
+DROP INDEX IF EXISTS `ix_stocks_family_product_expiration` ON `stocks`;
+CREATE INDEX IF NOT EXISTS `ix_stocks_family_product_expiration` ON `stocks` (`family_id`, `product_id`, `expiration_date`, `quantity`, `user_id`);
+
+-- Stocks restés sur l'ancienne famille de leur propriétaire : reprendre sa famille actuelle
+UPDATE `stocks` JOIN `users` ON `users`.`id` = `stocks`.`user_id`
+SET `stocks`.`family_id` = `users`.`family_id`
+WHERE NOT (`stocks`.`family_id` <=> `users`.`family_id`);
@@ -1,81 +1,72 @@
-import requests
-import mysql.connector
+import argparse
+import asyncio
+import logging
 import sys
-
-if len(sys.argv) < 2:
-    print("Usage: python openfoodfact.py <GTIN/EAN>")
-    sys.exit(1)
-
-GTIN = sys.argv[1]
-
-
-
-# ⚙️ Configuration de la connexion MySQL
-db_config = {
-    "host": "localhost",
-    "user": "ustock",
-    "password": "UStock",
-    "database": "UStock"
-}
+from contextlib import contextmanager
+from sqlalchemy.exc import SQLAlchemyError
+from ustock_api.database import SessionLocal
+from ustock_api.logs import setup_logging
+from ustock_api.models import Product
+from ustock_api.off_client import OFFClient, OFFUnavailable
+from ustock_api.product_import import import_barcodes, normalize_product, summarize
+
+logger = logging.getLogger(__name__)
+
+
+# 🔌 Réutiliser la session de l'appelant, sinon en emprunter une au pool partagé
+@contextmanager
+def _session(db=None):
+    if db is not None:
+        yield db
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
 
 
 # 🔍 Fonction pour vérifier si un produit existe déjà
-def check_product_exists(barcode):
+def check_product_exists(barcode, db=None):
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM products WHERE barcode = %s", (barcode,))
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return result is not None  # True si le produit existe
-    except mysql.connector.Error as err:
-        print(f"Erreur MySQL : {err}")
+        with _session(db) as session:
+            result = session.query(Product.id).filter(Product.barcode == barcode).first()
+            return result is not None  # True si le produit existe
+    except SQLAlchemyError as err:
+        logger.error("Erreur MySQL : %s", err, extra={"barcode": barcode})
         return False
 
-# 🌍 Fonction pour récupérer les données depuis Open Food Facts
+# 🌍 Fonction pour récupérer les données depuis Open Food Facts (usage en ligne de commande)
 def fetch_product_from_api(barcode):
-    url = f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        data = response.json()
-        if 'product' in data and data['product'].get('product_name'):
-            print(data['product'].get('categories', 'Inconnu'))
-            return {
-                "barcode": barcode,
-                "product_name": data['product'].get('product_name', 'Inconnu'),
-                "brand": data['product'].get('brands', 'Non spécifié'),
-                "content_size": data['product'].get('quantity', 'Non spécifié'),
-                "nutriscore": data['product'].get('nutriscore_grade', None),
-                "image_url": data['product'].get('image_front_url', None)
-            }
-    return None
+    async def fetch():
+        client = OFFClient()
+        try:
+            return await client.fetch_product(barcode)
+        finally:
+            await client.aclose()
 
-# 💾 Fonction pour insérer un produit dans la base MySQL
-def insert_product_into_db(product):
     try:
-        conn = mysql.connector.connect(**db_config)
-        cursor = conn.cursor()
-
-        VALID_NUTRISCORE = {'a', 'b', 'c', 'd', 'e'}
-        # Vérification que le Nutri-Score est valide, sinon mettre NULL
-        nutriscore = product["nutriscore"].lower() if product["nutriscore"] in VALID_NUTRISCORE else None
-
-        sql = """INSERT INTO products (barcode, product_name, brand, content_size, nutriscore, image_url, created_at)
-                 VALUES (%s, %s, %s, %s, %s, %s, NOW())"""
-        values = (product["barcode"], product["product_name"], product["brand"], product["content_size"], nutriscore, product["image_url"])
+        return asyncio.run(fetch())
+    except OFFUnavailable as err:
+        logger.warning("⚠️ Open Food Facts indisponible : %s", err, extra={"barcode": barcode})
+        return None
 
-        cursor.execute(sql, values)
-        conn.commit()
-
-        print(f"✅ Produit ajouté : {product['product_name']} ({product['barcode']})")
-        print(f"📊 Nutri-Score inséré : {nutriscore}")
+# 💾 Fonction pour insérer un produit dans la base MySQL
+def insert_product_into_db(product, db=None):
+    row = normalize_product(product)
+    try:
+        with _session(db) as session:
+            session.add(Product(**row))
+            session.commit()
 
-        cursor.close()
-        conn.close()
-    except mysql.connector.Error as err:
-        print(f"❌ Erreur MySQL : {err}")
+        logger.info(
+            "✅ Produit ajouté : %s (%s)", row["product_name"], row["barcode"],
+            extra={"barcode": row["barcode"], "nutriscore": row["nutriscore"]},
+        )
+    except SQLAlchemyError as err:
+        if db is not None:
+            db.rollback()
+        logger.error("❌ Erreur MySQL : %s", err, extra={"barcode": row["barcode"]})
 
 
 # 🚀 Fonction principale : Vérifie et ajoute un produit
@@ -90,6 +81,46 @@ def add_product(barcode):
         else:
             print(f"❌ Aucun produit trouvé pour {barcode}.")
 
-# 🏁 Tester avec un code-barres (ex: Nutella)
+# 📦 Import en masse : une requête IN, fiches récupérées en parallèle, insertion multi-lignes
+def add_products(barcodes):
+    async def run():
+        client = OFFClient()
+        db = SessionLocal()
+        try:
+            return await import_barcodes(db, barcodes, client)
+        finally:
+            db.close()
+            await client.aclose()
+
+    results = asyncio.run(run())
+    for result in results:
+        print(f"{result['barcode']}\t{result['status']}\t{result.get('detail') or ''}")
+    print(f"📊 Bilan : {summarize(results)}")
+    return results
+
+
+def read_barcodes(path):
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        return [line.strip() for line in stream if line.strip() and not line.startswith("#")]
+
+
+# 🏁 Tester avec un code-barres (ex: Nutella) ou importer une liste
 if __name__ == "__main__":
-    add_product(GTIN)
+    parser = argparse.ArgumentParser(description="Ajoute des produits Open Food Facts dans la base UStock")
+    parser.add_argument("barcodes", nargs="*", metavar="GTIN/EAN")
+    parser.add_argument("-f", "--file", help="fichier de codes-barres, un par ligne (- pour stdin)")
+    args = parser.parse_args()
+    setup_logging(default_format="text")
+
+    barcodes = list(args.barcodes)
+    if args.file:
+        barcodes += read_barcodes(args.file)
+    if not barcodes:
+        parser.print_usage()
+        sys.exit(1)
+
+    if len(barcodes) == 1:
+        add_product(barcodes[0])
+    else:
+        add_products(barcodes)
@@ -0,0 +1,75 @@
+"""Configuration commune des tests : base SQLite en mémoire, aucun service externe.
+
+Lancement (depuis backend/) : python -m pytest
+"""
+import os
+import tempfile
+
+# Avant tout import de ustock_api : les réglages sont lus une fois, à l'import
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET_KEY", "tests-only-secret")
+os.environ.setdefault("SEARCH_INDEX_ON_STARTUP", "0")
+os.environ.setdefault("CACHE_REFRESH_INTERVAL", "0")
+# Photos et images produit écrites (ou supprimées) hors de backend/static
+os.environ["STATIC_DIR"] = tempfile.mkdtemp(prefix="ustock-tests-static-")
+
+import pytest
+from benchmarks.fixtures import make_client, make_engine, make_sessionmaker, seed_user
+
+
+# 🗄️ Une base vide par test
+@pytest.fixture
+def SessionTesting():
+    engine = make_engine()
+    try:
+        yield make_sessionmaker(engine)
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def db(SessionTesting):
+    session = SessionTesting()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    return seed_user(db, "tests")
+
+
+# 🌐 Client HTTP authentifié comme `user`, branché sur la base du test
+@pytest.fixture
+def client(SessionTesting, user):
+    from ustock_api.main import app
+
+    with make_client(app, SessionTesting, user) as client:
+        yield client
+
+
+# 🌐 Client sans utilisateur imposé : l'authentification passe par le vrai token JWT
+@pytest.fixture
+def anonymous_client(SessionTesting):
+    from fastapi.testclient import TestClient
+    from ustock_api.auth import user_cache
+    from ustock_api.database import get_db
+    from ustock_api.main import app
+
+    def override_get_db():
+        db = SessionTesting()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    user_cache.clear()
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+        user_cache.clear()
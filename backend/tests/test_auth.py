@@ -0,0 +1,37 @@
+from ustock_api import models
+from ustock_api.auth import DELETED_PASSWORD_HASH, create_access_token, invalidate_user_cache
+
+
+def bearer(user):
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.username, 'id': user.id})}"}
+
+
+def test_valid_token_reads_the_profile(anonymous_client, user):
+    response = anonymous_client.get("/users/me", headers=bearer(user))
+    assert response.status_code == 200
+    assert response.json()["username"] == user.username
+
+
+def test_malformed_token_is_401_not_500(anonymous_client):
+    assert anonymous_client.get("/users/me", headers={"Authorization": "Bearer pas-un-jwt"}).status_code == 401
+
+
+def test_tokens_of_an_account_being_deleted_are_refused(anonymous_client, db, user):
+    headers = bearer(user)
+    assert anonymous_client.get("/users/me", headers=headers).status_code == 200  # Utilisateur mis en cache
+
+    db.get(models.User, user.id).password_hash = DELETED_PASSWORD_HASH
+    db.commit()
+    invalidate_user_cache(user.id)
+
+    assert anonymous_client.get("/users/me", headers=headers).status_code == 401
+
+
+def test_deleted_account_token_is_refused(anonymous_client, db, user):
+    headers = bearer(user)
+    user_id = user.id
+    response = anonymous_client.delete("/users/me", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["deleted_user_id"] == user_id
+    assert anonymous_client.get("/users/me", headers=headers).status_code == 401
@@ -0,0 +1,58 @@
+from datetime import date, datetime
+
+import pytest
+from ustock_api import models
+from ustock_api.consumption_stats import get_product_breakdown, get_stats, record_consumptions
+
+
+@pytest.fixture
+def history(db, user):
+    products = [models.Product(barcode=f"300000000000{i}", product_name=f"Produit {i}") for i in range(2)]
+    db.add_all(products)
+    db.flush()
+    consumptions = [
+        models.ProductConsumption(product_id=products[index].id, user_id=user.id, quantity=quantity, status=status, consumption_date=when)
+        for index, quantity, status, when in [
+            (0, 1, "consumed", datetime(2026, 2, 27, 10)),
+            (0, 2, "consumed", datetime(2026, 3, 2, 9)),
+            (1, 4, "wasted", datetime(2026, 3, 21, 18)),
+            (0, 8, "consumed", datetime(2026, 3, 25, 23, 59)),
+            (1, 16, "wasted", datetime(2026, 4, 1, 0, 0)),
+        ]
+    ]
+    db.add_all(consumptions)
+    db.flush()
+    record_consumptions(db, consumptions)
+    db.commit()
+    return products
+
+
+def period_counts(stats):
+    return stats["period"]["consumed_count"], stats["period"]["wasted_count"]
+
+
+def test_mid_month_period_counts_only_the_days_requested(db, user, history):
+    stats = get_stats(db, user.id, date(2026, 3, 20), date(2026, 3, 25))
+    assert period_counts(stats) == (8, 4)
+    assert stats["period"]["start"] == date(2026, 3, 20)
+
+
+def test_period_mixes_whole_months_and_partial_edges(db, user, history):
+    assert period_counts(get_stats(db, user.id, date(2026, 2, 27), date(2026, 4, 1))) == (11, 20)
+    assert period_counts(get_stats(db, user.id, date(2026, 3, 1), date(2026, 3, 31))) == (10, 4)
+    assert period_counts(get_stats(db, user.id, date(2026, 3, 3), None)) == (8, 20)
+    assert period_counts(get_stats(db, user.id, None, date(2026, 3, 1))) == (1, 0)
+
+
+def test_product_breakdown_respects_exact_bounds(db, user, history):
+    breakdown = get_product_breakdown(db, user.id, date(2026, 3, 21), date(2026, 4, 1))
+    assert [(item["product_name"], item["consumed_count"], item["wasted_count"]) for item in breakdown] == [
+        ("Produit 1", 0, 20),
+        ("Produit 0", 8, 0),
+    ]
+
+
+def test_stats_route_uses_exact_dates(client, history):
+    stats = client.get("/consumption/stats", params={"start": "2026-03-20", "end": "2026-03-25"}).json()
+    assert (stats["period"]["consumed_count"], stats["period"]["wasted_count"]) == (8, 4)
+    assert stats["total"]["total_count"] == 31
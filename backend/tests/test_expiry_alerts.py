@@ -0,0 +1,24 @@
+from datetime import date, timedelta
+
+from ustock_api import models
+from ustock_api.expiry_alerts import run_daily_digests
+from benchmarks.fixtures import seed_stocks
+
+TODAY = date(2025, 1, 31)
+
+
+def test_rerun_updates_the_digest_and_drops_users_who_no_longer_qualify(db, user):
+    seed_stocks(db, user, 3)
+    for stock in db.query(models.Stock):
+        stock.expiration_date = TODAY + timedelta(days=1)
+    db.commit()
+
+    assert run_daily_digests(db, TODAY) == (1, 1)
+    assert run_daily_digests(db, TODAY) == (1, 1)  # Relance : pas de doublon
+    digest = db.query(models.Notification).one()
+    assert digest.expiring_count == 3
+
+    db.query(models.Stock).delete()
+    db.commit()
+    assert run_daily_digests(db, TODAY) == (1, 0)
+    assert db.query(models.Notification).count() == 0
@@ -0,0 +1,75 @@
+import pytest
+from ustock_api import models
+from ustock_api.family_membership import resync_stock_families, set_user_family
+from benchmarks.fixtures import seed_stocks, seed_user
+
+
+@pytest.fixture
+def families(db):
+    first, second = models.Family(name="Martin"), models.Family(name="Durand")
+    db.add_all([first, second])
+    db.commit()
+    return first.id, second.id
+
+
+def stock_families(db):
+    db.expire_all()
+    return {family_id for (family_id,) in db.query(models.Stock.family_id)}
+
+
+def test_changing_family_moves_the_users_stocks(db, user, families):
+    first, second = families
+    set_user_family(db, user.id, first)
+    seed_stocks(db, user, 3)
+    resync_stock_families(db)
+    assert stock_families(db) == {first}
+
+    assert set_user_family(db, user.id, second) == 3
+    assert stock_families(db) == {second}
+    assert set_user_family(db, user.id, None) == 3
+    assert stock_families(db) == {None}
+
+
+def test_family_inventory_groups_members_stocks(client, db, user, families):
+    first, _ = families
+    other = seed_user(db, "other")
+    set_user_family(db, user.id, first)
+    set_user_family(db, other.id, first)
+    seed_stocks(db, user, 2)
+    seed_stocks(db, other, 2, start=2)
+    resync_stock_families(db)
+    db.expire_all()
+
+    inventory = client.get("/families/me/inventory").json()
+    assert len(inventory) == 4
+    assert {item["member_count"] for item in inventory} == {1}
+
+
+def test_family_data_requires_a_membership_row(client, db, user, families):
+    first, _ = families
+    seed_stocks(db, user, 1)
+    # users.family_id posé sans passer par family_membership : aucune ligne user_families
+    db.get(models.User, user.id).family_id = first
+    db.commit()
+
+    assert client.get("/families/me/inventory").status_code == 403
+    assert client.get("/families/me/stats").status_code == 403
+
+
+def test_family_stats_list_only_members(client, db, user, families):
+    first, _ = families
+    intruder = seed_user(db, "intruder")
+    set_user_family(db, user.id, first)
+    db.get(models.User, intruder.id).family_id = first
+    db.commit()
+    db.expire_all()
+
+    members = client.get("/families/me/stats").json()["members"]
+    assert [member["user_id"] for member in members] == [user.id]
+
+
+def test_registration_cannot_join_a_family(anonymous_client, families):
+    payload = {"first_name": "Eve", "last_name": "X", "email": "eve@ustock.test", "username": "eve", "gender": "femme", "password": "secret"}
+    assert anonymous_client.post("/users/register", json={**payload, "family_id": families[0]}).status_code == 400
+    response = anonymous_client.post("/users/register", json={**payload, "family_id": None})
+    assert response.status_code == 200 and response.json()["family_id"] is None
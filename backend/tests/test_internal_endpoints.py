@@ -0,0 +1,23 @@
+import pytest
+from ustock_api import auth
+
+TOKEN = "supervision-secret"
+
+
+@pytest.fixture(autouse=True)
+def internal_token(monkeypatch):
+    monkeypatch.setattr(auth, "INTERNAL_TOKEN", TOKEN)
+
+
+@pytest.mark.parametrize("path", [
+    "/health/db-pool", "/health/off-cache", "/health/auth-cache", "/health/search-index", "/metrics",
+])
+def test_internal_endpoint_requires_the_token(client, path):
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 403
+    assert client.get(path, headers={"Authorization": f"Bearer {TOKEN}"}).status_code == 200
+
+
+def test_internal_endpoints_are_closed_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(auth, "INTERNAL_TOKEN", None)
+    assert client.get("/health/db-pool", headers={"Authorization": "Bearer "}).status_code == 403
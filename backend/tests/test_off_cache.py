@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from ustock_api.cache import MISSING, DiskCache, TTLCache, off_product_cache
+from ustock_api.off_client import OFFClient
+
+
+# 🥫 Faux Open Food Facts local (OFF_BASE_URL / base_url pointe dessus)
+class StubOFF(BaseHTTPRequestHandler):
+    products = {"3017620422003": {"product_name": "Nutella", "brands": "Ferrero", "quantity": "400 g"}}
+    calls = []
+
+    def do_GET(self):
+        self.calls.append(self.path)
+        barcode = self.path.rsplit("/", 1)[-1].removesuffix(".json")
+        product = self.products.get(barcode)
+        body = json.dumps({"status": 1, "product": product} if product else {"status": 0}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_off():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOFF)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubOFF.calls = []
+    off_product_cache.clear()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        off_product_cache.clear()
+
+
+def test_fetch_product_from_stub_is_cached(stub_off):
+    async def scenario():
+        client = OFFClient(base_url=stub_off, max_retries=0)
+        try:
+            first = await client.fetch_product("3017620422003")
+            second = await client.fetch_product("3017620422003")
+            unknown = await client.fetch_product("0000000000000")
+            unknown_again = await client.fetch_product("0000000000000")
+        finally:
+            await client.aclose()
+        return first, second, unknown, unknown_again
+
+    first, second, unknown, unknown_again = asyncio.run(scenario())
+    assert first["product_name"] == "Nutella" and first["brand"] == "Ferrero"
+    assert second == first
+    assert unknown is None and unknown_again is None  # Absence mise en cache
+    assert len(StubOFF.calls) == 2
+
+
+def test_concurrent_fetches_share_one_upstream_call(stub_off):
+    async def scenario():
+        client = OFFClient(base_url=stub_off, max_retries=0)
+        try:
+            return await asyncio.gather(*(client.fetch_product("3017620422003") for _ in range(20)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(scenario())
+    assert {result["product_name"] for result in results} == {"Nutella"}
+    assert len(StubOFF.calls) == 1
+
+
+def test_invalidate_removes_both_tiers(tmp_path):
+    disk = DiskCache(str(tmp_path / "off.sqlite3"))
+    cache = TTLCache(maxsize=10, ttl=60, disk=disk)
+    cache.set("123", {"product_name": "Ancien"})
+
+    cache.invalidate("123")
+
+    assert disk.get("123") == (MISSING, 0.0)
+    assert cache.get("123") is MISSING
+
+
+def test_lru_eviction_and_miss_ttl():
+    cache = TTLCache(maxsize=2, ttl=60, miss_ttl=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    cache.set("absent", None)  # miss_ttl=0 : expire aussitôt
+
+    assert cache.get("a") is MISSING
+    assert cache.get("c") == 3
+    assert cache.get("absent") is MISSING
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_async_lookups_read_the_disk_tier_off_the_event_loop(tmp_path):
+    threads = []
+
+    class RecordingDiskCache(DiskCache):
+        def get(self, key):
+            threads.append(threading.get_ident())
+            return super().get(key)
+
+    disk = RecordingDiskCache(str(tmp_path / "off.sqlite3"))
+    TTLCache(maxsize=10, ttl=60, disk=disk).set("123", {"product_name": "Nutella"})
+    cache = TTLCache(maxsize=10, ttl=60, disk=disk)  # Mémoire vide : comme après un redémarrage
+
+    async def scenario():
+        return threading.get_ident(), await cache.aget("123"), await cache.aget("123")
+
+    loop_thread, first, second = asyncio.run(scenario())
+    assert first == second == {"product_name": "Nutella"}
+    assert len(threads) == 1 and threads[0] != loop_thread  # Deuxième lecture servie par la mémoire
+    assert cache.stats()["disk_hits"] == 1
@@ -0,0 +1,61 @@
+import json
+from datetime import datetime
+
+import pytest
+from ustock_api import models
+from ustock_api.pagination import NEXT_CURSOR_HEADER, _stream_batches, encode_cursor
+from ustock_api.schemas import ProductResponse
+from benchmarks.fixtures import QueryCounter, seed_stocks
+
+
+@pytest.mark.parametrize("path", ["/stocks/", "/products/", "/notifications/"])
+@pytest.mark.parametrize("cursor", [encode_cursor("abc"), encode_cursor(None), "%%%"])
+def test_non_integer_cursors_are_rejected_with_400(client, path, cursor):
+    assert client.get(path, params={"cursor": cursor, "limit": 10}).status_code == 400
+
+
+def test_stock_pages_follow_the_cursor(client, db, user):
+    seed_stocks(db, user, 5)
+    first = client.get("/stocks/", params={"limit": 3})
+    second = client.get("/stocks/", params={"limit": 3, "cursor": first.headers[NEXT_CURSOR_HEADER]})
+
+    ids = [stock["id"] for stock in first.json() + second.json()]
+    assert ids == sorted(ids) and len(set(ids)) == 5
+    assert NEXT_CURSOR_HEADER not in second.headers
+
+
+def test_products_without_limit_return_the_whole_catalogue(client, db, user):
+    seed_stocks(db, user, 7)
+    response = client.get("/products/")
+    assert response.status_code == 200
+    assert len(response.json()) == db.query(models.Product).count() == 7
+    assert client.get("/products/", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+def test_streams_are_read_in_bounded_keyset_chunks(db, user):
+    seed_stocks(db, user, 5)
+
+    def build_query(session, after=None):
+        return session.query(models.Product).filter(models.Product.id > (after or 0)).order_by(models.Product.id)
+
+    with QueryCounter(db.get_bind()) as counter:
+        batches = list(_stream_batches(db, build_query, ProductResponse, lambda product: product.id, chunk_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [json.loads(line)["barcode"] for batch in batches for line in batch] == [f"{3000000000000 + i}" for i in range(5)]
+    assert counter.count == 3  # Un SELECT LIMIT par lot
+
+
+def test_consumption_export_orders_equal_dates_by_id(client, db, user):
+    seed_stocks(db, user, 1)
+    product_id = db.query(models.Product.id).scalar()
+    same_time = datetime(2026, 3, 1, 12)
+    db.add_all(
+        models.ProductConsumption(product_id=product_id, user_id=user.id, quantity=1, status="consumed", consumption_date=same_time)
+        for _ in range(3)
+    )
+    db.commit()
+
+    lines = client.get("/consumption/", params={"format": "ndjson"}).text.splitlines()
+    ids = [json.loads(line)["id"] for line in lines]
+    assert ids == sorted(ids, reverse=True) and len(ids) == 3
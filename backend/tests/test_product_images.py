@@ -0,0 +1,86 @@
+import io
+import os
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from PIL import Image
+from ustock_api import models
+from ustock_api.http_cache import product_etags
+from ustock_api.product_images import PRODUCT_IMAGE_DIR, image_version, original_path, variant_path
+
+BARCODE = "3017620422003"
+OLD_URL = "https://images.openfoodfacts.org/images/products/301/762/042/2003/front_fr.1.400.jpg"
+NEW_URL = "https://images.openfoodfacts.org/images/products/301/762/042/2003/front_fr.2.400.jpg"
+
+
+# 🥫 Faux client OFF : renvoie une image PNG et note les URL téléchargées
+class FakeImageClient:
+    def __init__(self):
+        self.downloads = []
+
+    async def download(self, url, max_bytes):
+        self.downloads.append(url)
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 20), "red").save(buffer, format="PNG")
+        return buffer.getvalue()
+
+
+@pytest.fixture
+def off_images(monkeypatch):
+    from ustock_api.routes import products
+
+    fake = FakeImageClient()
+    monkeypatch.setattr(products, "get_off_client", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def product(db):
+    product = models.Product(barcode=BARCODE, product_name="Nutella", image_url=OLD_URL)
+    db.add(product)
+    db.commit()
+    return product
+
+
+def _version(url):
+    return parse_qs(urlparse(url).query)["v"][0]
+
+
+def test_thumbnail_url_follows_image_url(client, db, product):
+    first = client.get(f"/products/{BARCODE}").json()["thumbnail_url"]
+    assert _version(first) == image_version(OLD_URL)
+
+    product.image_url = NEW_URL
+    db.commit()
+    product_etags.clear()
+    second = client.get(f"/products/{BARCODE}").json()["thumbnail_url"]
+    assert _version(second) == image_version(NEW_URL) != _version(first)
+
+
+def test_stale_or_missing_version_redirects_to_current(client, product):
+    for query in ("size=64", f"size=64&v={image_version(NEW_URL)}"):
+        response = client.get(f"/products/{BARCODE}/image?{query}", follow_redirects=False)
+        assert response.status_code == 307
+        assert _version(response.headers["location"]) == image_version(OLD_URL)
+
+
+def test_invalid_version_is_not_a_path(client, product):
+    response = client.get(f"/products/{BARCODE}/image?size=64&v=../../etc", follow_redirects=False)
+    assert response.status_code == 404
+
+
+def test_changed_image_url_is_mirrored_again_and_old_copies_removed(client, db, product, off_images):
+    old = image_version(OLD_URL)
+    response = client.get(f"/products/{BARCODE}/image?size=64&v={old}")
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+    assert os.path.exists(variant_path(BARCODE, old, 64))
+
+    product.image_url = NEW_URL
+    db.commit()
+    new = image_version(NEW_URL)
+    response = client.get(f"/products/{BARCODE}/image?size=64&v={new}")
+    assert response.status_code == 200
+    assert off_images.downloads == [OLD_URL, NEW_URL]
+    assert os.path.exists(original_path(BARCODE, new))
+    assert os.listdir(os.path.join(PRODUCT_IMAGE_DIR, BARCODE)) == [new]
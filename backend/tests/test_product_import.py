@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from ustock_api import models
+from ustock_api.cache import MISSING
+from ustock_api.http_cache import product_etags
+from ustock_api.product_import import upsert_products
+
+NUTELLA = {"barcode": "3017620422003", "product_name": "Nutella", "brand": "Ferrero", "content_size": "400 g", "nutriscore": "e", "image_url": None}
+PAST = datetime(2020, 1, 1)
+
+
+def stored(db):
+    db.expire_all()
+    return db.query(models.Product).filter_by(barcode=NUTELLA["barcode"]).one()
+
+
+def test_upsert_inserts_then_updates_one_row(db):
+    upsert_products(db, [NUTELLA])
+    upsert_products(db, [{**NUTELLA, "product_name": "Nutella 750 g"}])
+
+    assert db.query(models.Product).count() == 1
+    assert stored(db).product_name == "Nutella 750 g"
+
+
+def test_upsert_touches_updated_at_only_when_the_product_changes(db):
+    upsert_products(db, [NUTELLA])
+    stored(db).updated_at = PAST
+    db.commit()
+
+    upsert_products(db, [NUTELLA])
+    assert stored(db).updated_at == PAST  # Fiche identique : les workers n'ont rien à relire
+
+    upsert_products(db, [{**NUTELLA, "nutriscore": "d"}])
+    assert stored(db).updated_at > PAST
+
+
+def test_upsert_drops_the_cached_etag(db):
+    product_etags.set(NUTELLA["barcode"], '"ancien"')
+    upsert_products(db, [NUTELLA])
+    assert product_etags.get(NUTELLA["barcode"]) is MISSING
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+from ustock_api.images import MULTIPART_OVERHEAD, PROFILE_IMAGE_DIR, PROFILE_IMAGE_MAX_BYTES
+
+BOUNDARY = "ustock-tests"
+
+
+def _multipart(size):
+    head = (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"photo.jpg\"\r\n"
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode()
+    return head + b"\0" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _uploads(user):
+    if not os.path.isdir(PROFILE_IMAGE_DIR):
+        return []
+    return [name for name in os.listdir(PROFILE_IMAGE_DIR) if name.startswith(f"profile_{user.id}_")]
+
+
+@pytest.mark.parametrize("chunked", [False, True], ids=["content-length", "chunked"])
+def test_oversized_upload_is_refused_before_parsing(client, user, chunked, monkeypatch):
+    from ustock_api.routes import users
+
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("la route ne doit pas recevoir l'envoi")
+
+    monkeypatch.setattr(users, "save_upload", unexpected)
+    body = _multipart(PROFILE_IMAGE_MAX_BYTES + MULTIPART_OVERHEAD)
+    content = iter([body[i:i + 1024 * 1024] for i in range(0, len(body), 1024 * 1024)]) if chunked else body
+    response = client.post(
+        "/users/me/profile-image",
+        content=content,
+        headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+    assert response.status_code == 413
+    assert "trop volumineuse" in response.json()["detail"]
+    assert _uploads(user) == []
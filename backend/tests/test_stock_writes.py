@@ -0,0 +1,144 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func
+from ustock_api import models
+
+
+@pytest.fixture
+def product(db):
+    product = models.Product(barcode="3017620422003", product_name="Nutella", brand="Ferrero")
+    db.add(product)
+    db.commit()
+    return product
+
+
+def add_stock(db, user, product, quantity, expiration_date=None):
+    stock = models.Stock(product_id=product.id, user_id=user.id, quantity=quantity, expiration_date=expiration_date)
+    db.add(stock)
+    db.commit()
+    return stock.id
+
+
+def quantity_of(db, stock_id):
+    db.expire_all()
+    return db.query(models.Stock.quantity).filter(models.Stock.id == stock_id).scalar()
+
+
+# 🔻 Décrément conditionnel (POST /consumption/)
+
+def test_consumption_decrements_the_stock(client, db, user, product):
+    stock_id = add_stock(db, user, product, 3)
+    response = client.post("/consumption/", json={"stock_id": stock_id, "quantity": 2, "status": "consumed"})
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 2
+    assert quantity_of(db, stock_id) == 1
+
+
+def test_consumption_of_the_last_units_deletes_the_stock(client, db, user, product):
+    stock_id = add_stock(db, user, product, 2)
+    assert client.post("/consumption/", json={"stock_id": stock_id, "quantity": 2, "status": "wasted"}).status_code == 200
+    assert quantity_of(db, stock_id) is None
+    assert db.query(models.ProductConsumption).filter_by(status="wasted").count() == 1
+
+
+def test_consumption_beyond_the_stock_is_refused_with_400(client, db, user, product):
+    stock_id = add_stock(db, user, product, 1)
+    response = client.post("/consumption/", json={"stock_id": stock_id, "quantity": 2, "status": "consumed"})
+    assert response.status_code == 400
+    assert quantity_of(db, stock_id) == 1
+    assert db.query(models.ProductConsumption).count() == 0
+
+
+def test_consumption_of_another_users_stock_is_404(client, db, product):
+    from benchmarks.fixtures import seed_user
+
+    other = seed_user(db, "other")
+    stock_id = add_stock(db, other, product, 5)
+    assert client.post("/consumption/", json={"stock_id": stock_id, "quantity": 1, "status": "consumed"}).status_code == 404
+    assert client.post("/consumption/", json={"stock_id": 999_999, "quantity": 1, "status": "consumed"}).status_code == 404
+    assert quantity_of(db, stock_id) == 5
+
+
+@pytest.mark.parametrize("payload", [{"quantity": 0, "status": "consumed"}, {"quantity": 1, "status": "eaten"}])
+def test_invalid_consumptions_are_refused(client, db, user, product, payload):
+    stock_id = add_stock(db, user, product, 1)
+    assert client.post("/consumption/", json={"stock_id": stock_id, **payload}).status_code in (400, 422)
+    assert quantity_of(db, stock_id) == 1
+
+
+# 📦 POST /consumption/batch
+
+def test_batch_consumption_reports_the_remaining_quantity_after_each_item(client, db, user, product):
+    stock_id = add_stock(db, user, product, 5)
+    items = [
+        {"stock_id": stock_id, "quantity": 2, "status": "consumed"},
+        {"stock_id": stock_id, "quantity": 4, "status": "consumed"},  # Plus que les 3 restants
+        {"stock_id": stock_id, "quantity": 1, "status": "wasted"},
+        {"stock_id": 999_999, "quantity": 1, "status": "consumed"},
+    ]
+    results = client.post("/consumption/batch", json={"items": items}).json()["results"]
+
+    assert [result["status"] for result in results] == ["consumed", "error", "wasted", "error"]
+    assert results[0]["remaining_quantity"] == 3
+    assert results[2]["remaining_quantity"] == 2
+    assert quantity_of(db, stock_id) == 2
+
+
+def test_batch_consumption_deletes_depleted_stocks(client, db, user, product):
+    stock_id = add_stock(db, user, product, 2)
+    items = [{"stock_id": stock_id, "quantity": 1, "status": "consumed"}] * 2
+    results = client.post("/consumption/batch", json={"items": items}).json()["results"]
+
+    assert [result["remaining_quantity"] for result in results] == [1, 0]
+    assert quantity_of(db, stock_id) is None
+
+
+# ➕ Upsert sur (user_id, product_id, expiration_date)
+
+def test_adding_the_same_product_and_date_increments_one_row(client, db, user, product):
+    expiration_date = (date.today() + timedelta(days=5)).isoformat()
+    first = client.post("/stocks/", json={"product_id": product.id, "quantity": 2, "expiration_date": expiration_date}).json()
+    second = client.post("/stocks/", json={"product_id": product.id, "quantity": 3, "expiration_date": expiration_date}).json()
+
+    assert second["id"] == first["id"]
+    assert second["quantity"] == 5
+    assert db.query(func.count(models.Stock.id)).scalar() == 1
+
+
+def test_stocks_without_date_are_deduplicated_but_distinct_dates_are_not(client, db, user, product):
+    for expiration_date in (None, None, date.today().isoformat()):
+        assert client.post("/stocks/", json={"product_id": product.id, "expiration_date": expiration_date}).status_code == 200
+
+    quantities = dict(db.query(models.Stock.expiration_date, models.Stock.quantity))
+    assert quantities == {None: 2, date.today(): 1}
+
+
+def test_batch_add_reports_created_then_updated(client, db, user, product):
+    items = [
+        {"product_id": product.id, "quantity": 2},
+        {"product_id": product.id, "quantity": 1},
+        {"product_id": 999_999, "quantity": 1},
+        {"product_id": product.id, "quantity": 0},
+    ]
+    results = client.post("/stocks/batch", json={"items": items}).json()["results"]
+
+    assert [result["status"] for result in results] == ["created", "updated", "error", "error"]
+    assert [results[0]["quantity"], results[1]["quantity"]] == [2, 3]
+    assert results[0]["stock_id"] == results[1]["stock_id"]
+
+
+@pytest.mark.parametrize("quantity", [0, -5])
+def test_adding_a_non_positive_quantity_is_refused(client, db, user, product, quantity):
+    stock_id = add_stock(db, user, product, 2)
+    response = client.post("/stocks/", json={"product_id": product.id, "quantity": quantity})
+    assert response.status_code == 400
+    assert quantity_of(db, stock_id) == 2
+    assert db.query(func.count(models.Stock.id)).scalar() == 1
+
+
+def test_batch_add_on_an_existing_empty_row_is_an_update(client, db, user, product):
+    stock_id = add_stock(db, user, product, 0)  # Ligne vide laissée par l'ancien code
+    results = client.post("/stocks/batch", json={"items": [{"product_id": product.id, "quantity": 2}]}).json()["results"]
+
+    assert results == [{"index": 0, "status": "updated", "stock_id": stock_id, "quantity": 2, "detail": None}]
@@ -0,0 +1,153 @@
+"""Suppression d'un compte et de toutes ses données par requêtes ensemblistes.
+
+Chaque table est vidée par tranches (`DELETE … WHERE id IN (…)` sur des ids lus via
+l'index user_id) : pas d'objets ORM chargés, une requête par tranche et non par ligne.
+- en ligne (DELETE /users/me) : une seule transaction, pour les comptes ordinaires ;
+- en arrière-plan (job) : un commit par tranche, les verrous restent courts même pour
+  un historique de plusieurs centaines de milliers de lignes ; une relance reprend là
+  où le job s'est arrêté.
+
+Les photos de profil sont supprimées après le commit. Reprise des jobs interrompus :
+    python -m ustock_api.account_deletion resume [--include-running]
+"""
+import argparse
+import logging
+import uuid
+from datetime import datetime
+from sqlalchemy import delete, func
+from sqlalchemy.orm import Session
+from ustock_api import models
+from ustock_api.auth import DELETED_PASSWORD_HASH, invalidate_user_cache
+from ustock_api.database import SessionLocal
+from ustock_api.images import delete_profile_images
+from ustock_api.logs import setup_logging
+from ustock_api.settings import settings
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_DELETE_CHUNK_SIZE = settings.account_delete_chunk_size
+# Au-delà (stocks + historique), DELETE /users/me confie la suppression à un job
+ACCOUNT_DELETE_INLINE_MAX_ROWS = settings.account_delete_inline_max_rows
+
+# Tables vidées par tranches, dans l'ordre (clé du compte rendu, modèle)
+PURGED_TABLES = (
+    ("stocks", models.Stock),
+    ("consumptions", models.ProductConsumption),
+    ("change_log", models.ChangeLog),
+    ("notifications", models.Notification),
+)
+
+
+def _delete_in_chunks(db: Session, model, user_id: int, chunk_size: int, commit: bool) -> int:
+    table = model.__table__
+    deleted = 0
+    while True:
+        ids = [row_id for (row_id,) in db.query(model.id).filter(model.user_id == user_id).limit(chunk_size)]
+        if not ids:
+            return deleted
+        deleted += db.execute(delete(table).where(table.c.id.in_(ids))).rowcount
+        if commit:
+            db.commit()
+        if len(ids) < chunk_size:
+            return deleted
+
+
+# 🗑️ Supprimer les données puis le compte ; renvoie le nombre de lignes supprimées par table
+# commit_chunks=False : tout reste dans la transaction de l'appelant
+def purge_user(db: Session, user_id: int, chunk_size: int = ACCOUNT_DELETE_CHUNK_SIZE, commit_chunks: bool = False):
+    counts = {name: _delete_in_chunks(db, model, user_id, chunk_size, commit_chunks) for name, model in PURGED_TABLES}
+    stats = models.ConsumptionMonthlyStat.__table__
+    counts["monthly_stats"] = db.execute(delete(stats).where(stats.c.user_id == user_id)).rowcount
+    users = models.User.__table__
+    counts["user"] = db.execute(delete(users).where(users.c.id == user_id)).rowcount
+    return counts
+
+
+def count_user_rows(db: Session, user_id: int) -> int:
+    return sum(
+        db.query(func.count(model.id)).filter(model.user_id == user_id).scalar()
+        for model in (models.Stock, models.ProductConsumption)
+    )
+
+
+# 🖼️ Tâche de fond après le commit : photos de profil (toutes les variantes)
+def remove_profile_images(user_id: int):
+    try:
+        removed = delete_profile_images(user_id)
+        logger.info("✅ Photos de profil supprimées : %s", removed, extra={"user_id": user_id})
+    except OSError as e:
+        logger.warning("⚠️ Erreur lors de la suppression de la photo de profil : %s", e, extra={"user_id": user_id})
+
+
+# 🪦 Suppression en ligne : trace d'un job déjà terminé, dans la transaction de l'appelant
+# (les autres workers y voient qu'il faut retirer le compte de leur cache, voir invalidation.py)
+def record_completed_deletion(db: Session, user_id: int, counts: dict) -> models.AccountDeletionJob:
+    job = models.AccountDeletionJob(
+        id=uuid.uuid4().hex, user_id=user_id, status="done", deleted_rows=counts, finished_at=datetime.now()
+    )
+    db.add(job)
+    return job
+
+
+# 📋 Créer un job ; le compte est désactivé tout de suite (plus de connexion, tokens refusés)
+def create_deletion_job(db: Session, user_id: int) -> models.AccountDeletionJob:
+    job = models.AccountDeletionJob(id=uuid.uuid4().hex, user_id=user_id, status="pending")
+    db.add(job)
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.password_hash: DELETED_PASSWORD_HASH}, synchronize_session=False
+    )
+    db.commit()
+    invalidate_user_cache(user_id)
+    return job
+
+
+# ⚙️ Exécuter un job (tâche de fond ou CLI), avec sa propre session
+def run_deletion_job(job_id: str, chunk_size: int = ACCOUNT_DELETE_CHUNK_SIZE) -> str:
+    db = SessionLocal()
+    try:
+        job = db.get(models.AccountDeletionJob, job_id)
+        if job is None or job.status == "done":
+            return job.status if job else "missing"
+        job.status = "running"
+        db.commit()
+        try:
+            counts = purge_user(db, job.user_id, chunk_size, commit_chunks=True)
+            job.status, job.deleted_rows, job.error = "done", counts, None
+        except Exception as e:
+            db.rollback()
+            job = db.get(models.AccountDeletionJob, job_id)
+            job.status, job.error = "failed", str(e)[:255]
+            logger.exception("❌ Job de suppression %s en échec", job_id, extra={"job_id": job_id})
+        job.finished_at = datetime.now()
+        db.commit()
+        if job.status == "done":
+            invalidate_user_cache(job.user_id)
+            remove_profile_images(job.user_id)
+            logger.info(
+                "✅ Compte %s supprimé (job %s) : %s", job.user_id, job_id, job.deleted_rows,
+                extra={"user_id": job.user_id, "job_id": job_id, "deleted_rows": job.deleted_rows},
+            )
+        return job.status
+    finally:
+        db.close()
+
+
+# 🔄 Relancer les jobs en attente ou en échec (par exemple après un redémarrage)
+def resume_jobs(include_running: bool = False):
+    statuses = ["pending", "failed"] + (["running"] if include_running else [])
+    db = SessionLocal()
+    try:
+        job_ids = [job_id for (job_id,) in db.query(models.AccountDeletionJob.id).filter(models.AccountDeletionJob.status.in_(statuses))]
+    finally:
+        db.close()
+    return {job_id: run_deletion_job(job_id) for job_id in job_ids}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suppression de comptes en arrière-plan")
+    parser.add_argument("command", choices=["resume"])
+    parser.add_argument("--include-running", action="store_true", help="reprendre aussi les jobs interrompus en cours d'exécution")
+    args = parser.parse_args()
+    setup_logging(default_format="text")
+    results = resume_jobs(args.include_running)
+    print(f"✅ {len(results)} job(s) traité(s) : {results}")
@@ -1,28 +1,37 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import jwt
-from passlib.context import CryptContext
+import secrets
+from ustock_api.cache import MISSING, TTLCache
 from ustock_api.database import get_db
+from ustock_api.passwords import verify_password
 import ustock_api.models as models
+from ustock_api.settings import settings
 
-# Clé secrète pour signer les tokens JWT (CHANGE-LA pour plus de sécurité)
-SECRET_KEY = "supersecretkey"
+# Clé secrète pour signer les tokens JWT : JWT_SECRET_KEY, obligatoire (l'API ne démarre pas sans)
+SECRET_KEY = settings.jwt_secret_key
 ALGORITHM = "HS256"
 # 🔹 MODIFICATION : Token valide pendant 48 heures au lieu de 1 heure
 ACCESS_TOKEN_EXPIRE_MINUTES = 2880  # 48h * 60 minutes = 2880 minutes
 
-# Gestion du hashage des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cache des utilisateurs authentifiés (par id) : évite un SELECT sur `users` à chaque requête.
+# Invalidé explicitement à chaque modification ; les autres workers suivent via invalidation.py.
+AUTH_CACHE_SIZE = settings.auth_cache_size
+AUTH_CACHE_TTL = settings.auth_cache_ttl
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+# Hash posé par create_deletion_job : compte en cours de suppression, plus aucune connexion ni token accepté
+DELETED_PASSWORD_HASH = "!deleted"
+
+# Jeton des points d'accès internes (supervision) : INTERNAL_TOKEN, sans valeur ils restent fermés
+INTERNAL_TOKEN = settings.internal_token
 
 # OAuth2 pour FastAPI (Authentification via `Bearer Token`)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
-# Vérifier si le mot de passe correspond au hash
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
 # Générer un token JWT
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -34,25 +43,64 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-# Récupérer un utilisateur via `username`
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user or not verify_password(password, user.password_hash):
+# Récupérer un utilisateur via `username` (bcrypt exécuté dans le pool de processus dédié)
+async def authenticate_user(db: Session, username: str, password: str):
+    user = await run_in_threadpool(lambda: db.query(models.User).filter(models.User.username == username).first())
+    if not user or user.password_hash == DELETED_PASSWORD_HASH:
         return None
+    valid, new_hash = await verify_password(password, user.password_hash)
+    if not valid:
+        return None
+    # Hash créé avec un ancien coût bcrypt : le remplacer de façon transparente
+    if new_hash:
+        def save():
+            user.password_hash = new_hash
+            db.commit()
+            db.refresh(user)
+
+        await run_in_threadpool(save)
+        invalidate_user_cache(user.id)
     return user
 
+# Copie des colonnes d'un utilisateur (mise en cache)
+def _user_snapshot(user):
+    return {column.key: getattr(user, column.key) for column in models.User.__table__.columns}
+
+# Retirer un utilisateur du cache après toute modification (profil, suppression...)
+def invalidate_user_cache(user_id: int):
+    user_cache.invalidate(user_id)
+
 # Vérifier l'authentification d'un utilisateur depuis son token
+# ⚠️ L'utilisateur renvoyé depuis le cache n'est attaché à aucune session : une route qui le
+# modifie doit le recharger avec `db.get(models.User, current_user.id)`.
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide")
+
+        user_id = payload.get("id")
+        if user_id is not None:
+            cached = user_cache.get(user_id)
+            if cached is not MISSING and cached["username"] == username:
+                if cached["password_hash"] == DELETED_PASSWORD_HASH:
+                    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Utilisateur non trouvé")
+                return models.User(**cached)
+
         user = db.query(models.User).filter(models.User.username == username).first()
-        if user is None:
+        # Compte en cours de suppression : ses tokens ne sont plus acceptés, même avant la fin du job
+        if user is None or user.password_hash == DELETED_PASSWORD_HASH:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Utilisateur non trouvé")
+        user_cache.set(user.id, _user_snapshot(user))
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expiré")
-    except jwt.JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide")
\ No newline at end of file
+    except jwt.InvalidTokenError:  # PyJWT : pas de JWTError (python-jose), qui transformait chaque 401 en 500
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide")
+
+# 🔒 Points d'accès internes : `Authorization: Bearer <INTERNAL_TOKEN>` (format attendu par Prometheus)
+def require_internal_token(authorization: str | None = Header(None)):
+    scheme, _, token = (authorization or "").partition(" ")
+    if not INTERNAL_TOKEN or scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), INTERNAL_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Accès réservé à la supervision")
@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from fastapi.concurrency import run_in_threadpool
+from ustock_api.settings import settings
+
+# Valeur renvoyée par `get` quand la clé est absente ou expirée
+MISSING = object()
+
+
+# 💽 Second niveau optionnel : fichier SQLite local, survit aux redémarrages
+class DiskCache:
+    def __init__(self, path: str, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL, stored_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return MISSING, 0.0
+        value, expires_at = row
+        if expires_at <= time.time():
+            return MISSING, 0.0
+        return json.loads(value), expires_at
+
+    def set(self, key: str, value, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, time.time()),
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._evict()
+
+    # Purger les entrées expirées puis les plus anciennes au-delà de la limite
+    def _evict(self):
+        self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY stored_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+
+# 🧠 Cache LRU en mémoire, borné en taille, avec TTL distincts pour les succès et les absences
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float, miss_ttl: float | None = None, disk: DiskCache | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.miss_ttl = ttl if miss_ttl is None else miss_ttl
+        self.disk = disk
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    # Niveau mémoire seul (aucune E/S) ; MISSING si absent ou expiré, sans compter d'échec
+    def _get_memory(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    if value is None:
+                        self.negative_hits += 1
+                    return value
+                del self._data[key]
+        return MISSING
+
+    # Niveau disque : la valeur trouvée remonte en mémoire
+    def _get_disk(self, key: str):
+        value, expires_at = self.disk.get(key)
+        if value is not MISSING:
+            with self._lock:
+                self._store(key, value, expires_at)
+                self.hits += 1
+                self.disk_hits += 1
+                if value is None:
+                    self.negative_hits += 1
+        return value
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+        return MISSING
+
+    # Une valeur `None` est mise en cache comme absence connue (cache négatif)
+    def get(self, key: str):
+        value = self._get_memory(key)
+        if value is MISSING and self.disk is not None:
+            value = self._get_disk(key)
+        return self._miss() if value is MISSING else value
+
+    def set(self, key: str, value):
+        expires_at = self._set_memory(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value, expires_at)
+
+    def _set_memory(self, key: str, value) -> float:
+        expires_at = time.time() + (self.miss_ttl if value is None else self.ttl)
+        with self._lock:
+            self._store(key, value, expires_at)
+        return expires_at
+
+    # 🔀 Variantes pour les routes async : la mémoire est lue dans la boucle, le fichier SQLite
+    # (lecture ou écriture bloquante) dans le pool de threads
+    async def aget(self, key: str):
+        value = self._get_memory(key)
+        if value is MISSING and self.disk is not None:
+            value = await run_in_threadpool(self._get_disk, key)
+        return self._miss() if value is MISSING else value
+
+    async def aset(self, key: str, value):
+        expires_at = self._set_memory(key, value)
+        if self.disk is not None:
+            await run_in_threadpool(self.disk.set, key, value, expires_at)
+
+    def _store(self, key, value, expires_at):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    # Renvoie la valeur en cache, sinon appelle `loader` et mémorise son résultat.
+    # Une exception levée par `loader` n'est pas mise en cache.
+    def get_or_load(self, key: str, loader):
+        value = self.get(key)
+        if value is MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    # Les deux niveaux : sinon la valeur sur disque reviendrait au prochain `get`
+    def invalidate(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# ⚙️ Caches Open Food Facts (fiches produit par code-barres et résultats de recherche)
+OFF_CACHE_PATH = settings.off_cache_path  # ex: /var/cache/ustock/off.sqlite3, désactivé si vide
+
+off_product_cache = TTLCache(
+    maxsize=settings.off_cache_size,
+    ttl=settings.off_cache_ttl,
+    miss_ttl=settings.off_cache_miss_ttl,
+    disk=DiskCache(OFF_CACHE_PATH, settings.off_cache_disk_size) if OFF_CACHE_PATH else None,
+)
+
+off_search_cache = TTLCache(
+    maxsize=settings.off_search_cache_size,
+    ttl=settings.off_search_cache_ttl,
+    miss_ttl=settings.off_search_cache_miss_ttl,
+)
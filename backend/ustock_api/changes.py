@@ -0,0 +1,96 @@
+"""Versions et journal des changements.
+
+- `users.stock_version` : incrémenté par chaque transaction qui modifie le stock d'un utilisateur.
+  L'UPDATE verrouille la ligne de l'utilisateur jusqu'au commit : les versions d'un même
+  utilisateur sont donc validées dans l'ordre, et un jeton de synchronisation ne peut pas
+  « sauter » une modification encore en cours.
+- `change_log` : une ligne par stock créé/modifié/supprimé et par consommation enregistrée,
+  avec la version de la transaction. Lu par GET /sync.
+
+Purge des entrées anciennes : python -m ustock_api.changes prune [--days 90]
+"""
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+from ustock_api import models
+from ustock_api.cache import MISSING, TTLCache
+from ustock_api.database import SessionLocal
+from ustock_api.settings import settings
+
+# Durée de conservation du journal : au-delà, le client doit refaire une synchronisation complète
+CHANGE_LOG_RETENTION_DAYS = settings.change_log_retention_days
+
+# Version du catalogue gardée en mémoire quelques secondes (les imports d'autres processus sont vus après ce délai)
+CATALOGUE_VERSION_TTL = settings.catalogue_version_ttl
+_catalogue_version = TTLCache(maxsize=1, ttl=CATALOGUE_VERSION_TTL)
+
+
+# 🔢 Incrémenter la version du stock d'un utilisateur, dans la transaction de l'appelant
+# (utilisée comme ETag par GET /stocks/ ; `updated_at` du compte n'est pas touché)
+def bump_stock_version(db: Session, user_id: int):
+    users = models.User.__table__
+    db.execute(
+        update(users)
+        .where(users.c.id == user_id)
+        .values(stock_version=users.c.stock_version + 1, updated_at=users.c.updated_at)
+    )
+
+
+def get_stock_version(db: Session, user_id: int) -> int:
+    return db.query(models.User.stock_version).filter(models.User.id == user_id).scalar() or 0
+
+
+# 📝 Enregistrer les changements d'une transaction (à appeler avant le commit, après le flush des ids)
+# Les suppressions sont écrites après les mises à jour : un stock modifié puis supprimé finit supprimé
+def record_changes(db: Session, user_id: int, stocks_upserted=(), stocks_deleted=(), consumptions=()) -> int | None:
+    rows = (
+        [("stock", stock_id, "upsert") for stock_id in dict.fromkeys(stocks_upserted)]
+        + [("consumption", consumption_id, "upsert") for consumption_id in consumptions]
+        + [("stock", stock_id, "delete") for stock_id in dict.fromkeys(stocks_deleted)]
+    )
+    if not rows:
+        return None
+    bump_stock_version(db, user_id)
+    version = get_stock_version(db, user_id)
+    db.execute(insert(models.ChangeLog.__table__), [
+        {"user_id": user_id, "version": version, "entity": entity, "entity_id": entity_id, "action": action}
+        for entity, entity_id, action in rows
+    ])
+    return version
+
+
+# 🔢 Version du catalogue : dernier id et dernière modification (deux lectures d'index)
+def get_catalogue_version(db: Session) -> str:
+    version = _catalogue_version.get("catalogue")
+    if version is MISSING:
+        last_id, last_update = db.query(func.max(models.Product.id), func.max(models.Product.updated_at)).one()
+        version = f"{last_id or 0}-{last_update.isoformat() if last_update else ''}"
+        _catalogue_version.set("catalogue", version)
+    return version
+
+
+# À appeler après l'insertion ou la modification de fiches produit dans ce processus
+def invalidate_catalogue_version():
+    _catalogue_version.clear()
+
+
+# 🧹 Supprimer les entrées plus anciennes que la durée de conservation
+def prune_change_log(db: Session, days: int = CHANGE_LOG_RETENTION_DAYS) -> int:
+    cutoff = datetime.now() - timedelta(days=days)
+    deleted = db.query(models.ChangeLog).filter(models.ChangeLog.changed_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintenance du journal des changements (change_log)")
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument("--days", type=int, default=CHANGE_LOG_RETENTION_DAYS, help="durée de conservation")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"✅ {prune_change_log(db, args.days)} entrée(s) supprimée(s)")
+    finally:
+        db.close()
@@ -0,0 +1,247 @@
+"""Agrégat mensuel de `product_consumption` par utilisateur et par produit.
+
+Reconstruction complète : python -m ustock_api.consumption_stats backfill [--user-id ID]
+"""
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import and_, case, false, func, insert, or_, select
+from sqlalchemy.orm import Session
+from ustock_api import models
+from ustock_api.database import SessionLocal, insert_or_update
+
+Rollup = models.ConsumptionMonthlyStat
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+# ➕ Reporter des consommations dans l'agrégat (dans la transaction de l'appelant)
+def record_consumptions(db: Session, consumptions):
+    totals = defaultdict(lambda: {"consumed_quantity": 0, "wasted_quantity": 0})
+    for consumption in consumptions:
+        key = (consumption.user_id, month_start(consumption.consumption_date), consumption.product_id)
+        totals[key][f"{consumption.status}_quantity"] += consumption.quantity
+
+    rows = [
+        {"user_id": user_id, "month": month, "product_id": product_id, **quantities}
+        for (user_id, month, product_id), quantities in totals.items()
+    ]
+    insert_or_update(
+        db, Rollup.__table__, rows,
+        conflict_columns=["user_id", "month", "product_id"],
+        increment_columns=["consumed_quantity", "wasted_quantity"],
+    )
+
+
+def _month_expression(db: Session, column):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column, "start of month")
+    return func.date_format(column, "%Y-%m-01")
+
+
+# 🔁 Reconstruire l'agrégat depuis l'historique, par tranches d'utilisateurs (verrous courts)
+# Chaque tranche est supprimée puis réinsérée dans une même transaction : les lectures
+# concurrentes voient l'ancien ou le nouvel agrégat, jamais un agrégat vide
+def backfill(db: Session, user_id: int | None = None, batch_size: int = 500):
+    Consumption = models.ProductConsumption
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        # Aussi les utilisateurs qui n'ont plus d'historique : leurs lignes d'agrégat sont retirées
+        user_ids = sorted(
+            {row[0] for row in db.query(Consumption.user_id).distinct()}
+            | {row[0] for row in db.query(Rollup.user_id).distinct()}
+        )
+
+    month = _month_expression(db, Consumption.consumption_date)
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        db.query(Rollup).filter(Rollup.user_id.in_(batch)).delete(synchronize_session=False)
+        aggregate = (
+            select(
+                Consumption.user_id,
+                month,
+                Consumption.product_id,
+                func.sum(case((Consumption.status == "consumed", Consumption.quantity), else_=0)),
+                func.sum(case((Consumption.status == "wasted", Consumption.quantity), else_=0)),
+            )
+            .where(Consumption.user_id.in_(batch))
+            .group_by(Consumption.user_id, month, Consumption.product_id)
+        )
+        db.execute(insert(Rollup).from_select(
+            ["user_id", "month", "product_id", "consumed_quantity", "wasted_quantity"], aggregate
+        ))
+        db.commit()
+    return len(user_ids)
+
+
+def _rates(consumed, wasted):
+    consumed, wasted = int(consumed or 0), int(wasted or 0)
+    total = consumed + wasted
+    return {
+        "consumed_count": consumed,
+        "wasted_count": wasted,
+        "total_count": total,
+        "waste_rate": round(wasted / total * 100, 2) if total > 0 else 0
+    }
+
+
+def _sum(column, condition=None):
+    return func.sum(column if condition is None else case((condition, column), else_=0))
+
+
+# 🗓️ Période [start, end] (dates incluses) : mois entiers lus dans l'agrégat, morceaux de mois
+# aux extrémités relus dans l'historique (plages sur ix_consumption_user_date)
+class Period:
+    def __init__(self, start: date | None, end: date | None):
+        self.start, self.end = start, end
+        after_end = end + timedelta(days=1) if end is not None else None
+        first_month = start if start is None or start.day == 1 else next_month(start)
+        last_month = month_start(after_end) if after_end is not None else None  # Exclu
+        self.ranges = []  # Plages [début, fin[ relues dans product_consumption
+        if first_month is not None and last_month is not None and first_month >= last_month:
+            # Aucun mois entier : toute la période vient de l'historique
+            self.months = false()
+            self.ranges.append((start, after_end))
+            return
+        months = []
+        if first_month is not None:
+            months.append(Rollup.month >= first_month)
+            if first_month != start:
+                self.ranges.append((start, first_month))
+        if last_month is not None:
+            months.append(Rollup.month < last_month)
+            if last_month != after_end:
+                self.ranges.append((last_month, after_end))
+        self.months = and_(*months) if months else None  # None : aucune borne
+
+    @property
+    def bounded(self) -> bool:
+        return self.start is not None or self.end is not None
+
+    def raw_condition(self):
+        Consumption = models.ProductConsumption
+        return or_(*(
+            and_(Consumption.consumption_date >= begin, Consumption.consumption_date < finish)
+            for begin, finish in self.ranges
+        ))
+
+
+def next_month(value) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+# Colonnes : totaux globaux, du mois courant et de la période (consommé / gaspillé)
+def _totals(period: Period):
+    current_month = Rollup.month == month_start(date.today())
+    in_period = period.months if period.bounded else None
+    return (
+        _sum(Rollup.consumed_quantity),
+        _sum(Rollup.wasted_quantity),
+        _sum(Rollup.consumed_quantity, current_month),
+        _sum(Rollup.wasted_quantity, current_month),
+        _sum(Rollup.consumed_quantity, in_period),
+        _sum(Rollup.wasted_quantity, in_period),
+    )
+
+
+# Consommé / gaspillé des morceaux de mois de la période, par utilisateur (et par produit)
+def _raw_totals(db: Session, period: Period, user_ids, by_product: bool = False):
+    if not period.ranges or not user_ids:
+        return {}
+    Consumption = models.ProductConsumption
+    keys = [Consumption.user_id] + ([Consumption.product_id] if by_product else [])
+    rows = (
+        db.query(
+            *keys,
+            _sum(Consumption.quantity, Consumption.status == "consumed"),
+            _sum(Consumption.quantity, Consumption.status == "wasted"),
+        )
+        .filter(Consumption.user_id.in_(user_ids), period.raw_condition())
+        .group_by(*keys)
+    )
+    return {tuple(row[:-2]): (int(row[-2] or 0), int(row[-1] or 0)) for row in rows}
+
+
+def _stats_from_row(row, period: Period, extra=(0, 0)):
+    stats = {"total": _rates(row[0], row[1]), "current_month": _rates(row[2], row[3])}
+    if period.bounded:
+        consumed, wasted = int(row[4] or 0) + extra[0], int(row[5] or 0) + extra[1]
+        stats["period"] = {"start": period.start, "end": period.end, **_rates(consumed, wasted)}
+    return stats
+
+
+# 📊 Totaux globaux, du mois courant et (optionnellement) d'une période
+def get_stats(db: Session, user_id: int, start: date | None = None, end: date | None = None):
+    period = Period(start, end)
+    row = db.query(*_totals(period)).filter(Rollup.user_id == user_id).one()
+    return _stats_from_row(row, period, _raw_totals(db, period, [user_id]).get((user_id,), (0, 0)))
+
+
+# 👪 Statistiques d'une famille : une requête groupée par membre, totaux famille additionnés ensuite
+def get_family_stats(db: Session, family_id: int, start: date | None = None, end: date | None = None):
+    period = Period(start, end)
+    rows = (
+        db.query(models.User.id, models.User.first_name, *_totals(period))
+        .join(models.UserFamily, models.UserFamily.user_id == models.User.id)
+        .outerjoin(Rollup, Rollup.user_id == models.User.id)
+        .filter(models.UserFamily.family_id == family_id)
+        .group_by(models.User.id, models.User.first_name)
+        .order_by(models.User.id)
+        .all()
+    )
+    raw = _raw_totals(db, period, [row[0] for row in rows])
+    extras = {row[0]: raw.get((row[0],), (0, 0)) for row in rows}
+    family_row = [sum(int(row[index] or 0) for row in rows) for index in range(2, 8)]
+    family_extra = (sum(extra[0] for extra in extras.values()), sum(extra[1] for extra in extras.values()))
+    return {
+        **_stats_from_row(family_row, period, family_extra),
+        "members": [
+            {"user_id": row[0], "first_name": row[1], **_stats_from_row(row[2:], period, extras[row[0]])}
+            for row in rows
+        ],
+    }
+
+
+# 📦 Détail par produit sur une période (mois entiers depuis l'agrégat, bords depuis l'historique)
+def get_product_breakdown(db: Session, user_id: int, start: date | None = None, end: date | None = None, limit: int = 50):
+    period = Period(start, end)
+    query = (
+        db.query(Rollup.product_id, func.sum(Rollup.consumed_quantity), func.sum(Rollup.wasted_quantity))
+        .filter(Rollup.user_id == user_id)
+    )
+    if period.months is not None:
+        query = query.filter(period.months)
+    totals = defaultdict(lambda: [0, 0])
+    for product_id, consumed, wasted in query.group_by(Rollup.product_id):
+        totals[product_id][0] += int(consumed or 0)
+        totals[product_id][1] += int(wasted or 0)
+    for (_, product_id), (consumed, wasted) in _raw_totals(db, period, [user_id], by_product=True).items():
+        totals[product_id][0] += consumed
+        totals[product_id][1] += wasted
+
+    top = sorted(totals.items(), key=lambda item: (-sum(item[1]), item[0]))[:limit]
+    names = dict(
+        db.query(models.Product.id, models.Product.product_name).filter(models.Product.id.in_([product_id for product_id, _ in top]))
+    ) if top else {}
+    return [
+        {"product_id": product_id, "product_name": names.get(product_id), **_rates(consumed, wasted)}
+        for product_id, (consumed, wasted) in top
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintenance de l'agrégat consumption_monthly_stats")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--user-id", type=int, help="ne reconstruire que cet utilisateur")
+    parser.add_argument("--batch-size", type=int, default=500, help="utilisateurs par transaction")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        count = backfill(db, args.user_id, args.batch_size)
+        print(f"✅ Agrégat reconstruit pour {count} utilisateur(s)")
+    finally:
+        db.close()
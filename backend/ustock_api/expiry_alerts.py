@@ -0,0 +1,133 @@
+"""Alertes d'expiration : produits qui expirent bientôt et digest quotidien par utilisateur.
+
+Le digest parcourt les utilisateurs par tranches (pagination par clé sur users.id) :
+pour chaque tranche, une requête lit les stocks concernés via ix_stocks_user_expiration,
+puis un seul INSERT … ON DUPLICATE KEY UPDATE écrit les notifications et la tranche est
+validée. La mémoire reste bornée par la taille d'une tranche et une relance le même jour
+met à jour les digests existants au lieu de les dupliquer (et supprime ceux des utilisateurs
+qui n'ont plus rien à signaler).
+
+Usage (depuis backend/, par exemple une fois par jour via cron) :
+    python -m ustock_api.expiry_alerts digest [--days 3] [--date 2025-01-31]
+    python -m ustock_api.expiry_alerts prune [--days 30]
+"""
+import argparse
+from datetime import date, timedelta
+from sqlalchemy.orm import Session
+from ustock_api import models
+from ustock_api.database import SessionLocal, insert_or_update
+from ustock_api.settings import settings
+
+# Fenêtre « expire bientôt » (jours à venir, aujourd'hui compris)
+EXPIRY_ALERT_DAYS = settings.expiry_alert_days
+# Produits déjà expirés repris dans le digest (au-delà, l'utilisateur les a sans doute jetés)
+EXPIRED_LOOKBACK_DAYS = settings.expired_lookback_days
+DIGEST_CHUNK_SIZE = settings.digest_chunk_size
+DIGEST_MAX_ITEMS = 20  # Produits détaillés par digest (les compteurs restent exacts)
+NOTIFICATION_RETENTION_DAYS = settings.notification_retention_days
+
+
+# ⏳ Conditions de la fenêtre d'alerte : expire avant today + days, et au plus tôt today - lookback
+# (lookback None : tous les produits déjà expirés). Parcours par plage de ix_stocks_user_expiration.
+def expiry_window(today: date, days: int, lookback: int | None):
+    conditions = [models.Stock.expiration_date < today + timedelta(days=days)]
+    if lookback is not None:
+        conditions.append(models.Stock.expiration_date >= today - timedelta(days=lookback))
+    return conditions
+
+
+def _digest_rows(db: Session, user_ids, today: date, days: int):
+    rows = (
+        db.query(
+            models.Stock.user_id, models.Stock.id, models.Stock.product_id, models.Product.product_name,
+            models.Stock.quantity, models.Stock.expiration_date,
+        )
+        .join(models.Product, models.Product.id == models.Stock.product_id)
+        .filter(
+            models.Stock.user_id.in_(user_ids),
+            *expiry_window(today, days, EXPIRED_LOOKBACK_DAYS),
+        )
+        .order_by(models.Stock.user_id, models.Stock.expiration_date, models.Stock.id)
+    )
+    digests = {}
+    for user_id, stock_id, product_id, product_name, quantity, expiration_date in rows:
+        digest = digests.setdefault(user_id, {
+            "user_id": user_id, "kind": "expiry_digest", "notification_date": today,
+            "expiring_count": 0, "expired_count": 0, "items": [],
+        })
+        digest["expired_count" if expiration_date < today else "expiring_count"] += 1
+        if len(digest["items"]) < DIGEST_MAX_ITEMS:
+            digest["items"].append({
+                "stock_id": stock_id, "product_id": product_id, "product_name": product_name,
+                "quantity": quantity, "expiration_date": expiration_date.isoformat(),
+            })
+    return list(digests.values())
+
+
+# 📬 Calculer les digests du jour pour tous les utilisateurs ; renvoie (utilisateurs parcourus, digests écrits)
+def run_daily_digests(db: Session, today: date | None = None, days: int = EXPIRY_ALERT_DAYS, chunk_size: int = DIGEST_CHUNK_SIZE):
+    today = today or date.today()
+    scanned = written = 0
+    last_id = 0
+    while True:
+        user_ids = [
+            user_id for (user_id,) in db.query(models.User.id)
+            .filter(models.User.id > last_id)
+            .order_by(models.User.id)
+            .limit(chunk_size)
+        ]
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+        digests = _digest_rows(db, user_ids, today, days)
+        insert_or_update(
+            db, models.Notification.__table__, digests,
+            conflict_columns=["user_id", "kind", "notification_date"],
+            update_columns=["expiring_count", "expired_count", "items"],
+        )
+        # Relance le même jour : digest périmé pour qui n'a plus de produit dans la fenêtre
+        stale = set(user_ids) - {digest["user_id"] for digest in digests}
+        if stale:
+            db.query(models.Notification).filter(
+                models.Notification.user_id.in_(stale),
+                models.Notification.kind == "expiry_digest",
+                models.Notification.notification_date == today,
+            ).delete(synchronize_session=False)
+        db.commit()  # Une transaction par tranche : une relance reprend sans doublon
+        scanned += len(user_ids)
+        written += len(digests)
+    return scanned, written
+
+
+# 🧹 Supprimer les notifications plus anciennes que la durée de conservation
+def prune_notifications(db: Session, days: int = NOTIFICATION_RETENTION_DAYS) -> int:
+    cutoff = date.today() - timedelta(days=days)
+    deleted = db.query(models.Notification).filter(models.Notification.notification_date < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alertes d'expiration (digest quotidien des notifications)")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    digest = subcommands.add_parser("digest", help="calculer les digests du jour")
+    digest.add_argument("--days", type=int, default=EXPIRY_ALERT_DAYS, help="fenêtre « expire bientôt »")
+    digest.add_argument("--date", type=date.fromisoformat, help="jour du digest (par défaut aujourd'hui)")
+    digest.add_argument("--chunk-size", type=int, default=DIGEST_CHUNK_SIZE, help="utilisateurs par tranche")
+    prune = subcommands.add_parser("prune", help="supprimer les anciennes notifications")
+    prune.add_argument("--days", type=int, default=NOTIFICATION_RETENTION_DAYS, help="durée de conservation")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "digest":
+            scanned, written = run_daily_digests(db, args.date, args.days, args.chunk_size)
+            print(f"✅ {written} digest(s) écrit(s) pour {scanned} utilisateur(s)")
+        else:
+            print(f"✅ {prune_notifications(db, args.days)} notification(s) supprimée(s)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
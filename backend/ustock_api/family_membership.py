@@ -0,0 +1,79 @@
+"""Changement de famille d'un utilisateur.
+
+Les stocks portent une copie de la famille de leur propriétaire (stocks.family_id, lue
+par l'inventaire familial via ix_stocks_family_product_expiration) : tout changement de
+users.family_id doit passer par `set_user_family`, qui met à jour les deux dans la même
+transaction, ainsi que l'appartenance dans user_families (seule vérifiée par les routes
+/families). Les autres workers voient le changement via users.updated_at (invalidation.py).
+
+Usage (depuis backend/) :
+    python -m ustock_api.family_membership set --user 12 --family 3 [--role admin]   # --family vide : quitter la famille
+    python -m ustock_api.family_membership resync                                    # réaligner tous les stocks
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from ustock_api import models
+from ustock_api.auth import invalidate_user_cache
+from ustock_api.database import SessionLocal
+
+
+# 👪 Rejoindre (ou quitter, family_id=None) une famille, stocks compris ; renvoie le nombre de stocks déplacés
+def set_user_family(db: Session, user_id: int, family_id: int | None, role: str = "member") -> int:
+    db.execute(delete(models.UserFamily).where(models.UserFamily.user_id == user_id))
+    if family_id is not None:
+        db.add(models.UserFamily(user_id=user_id, family_id=family_id, role=role))
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(family_id=family_id, updated_at=datetime.now())
+    )
+    moved = db.execute(
+        update(models.Stock)
+        .where(models.Stock.user_id == user_id)
+        .values(family_id=family_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    invalidate_user_cache(user_id)
+    return moved
+
+
+# 🔄 Stocks restés sur une ancienne famille de leur propriétaire (modification directe en base)
+def resync_stock_families(db: Session) -> int:
+    owner_family = (
+        select(models.User.family_id)
+        .where(models.User.id == models.Stock.user_id)
+        .scalar_subquery()
+    )
+    moved = db.execute(
+        update(models.Stock)
+        .where(models.Stock.user_id.is_not(None))
+        .where(models.Stock.family_id.is_distinct_from(owner_family))
+        .values(family_id=owner_family)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Changement de famille des utilisateurs")
+    parser.add_argument("command", choices=["set", "resync"])
+    parser.add_argument("--user", type=int, help="identifiant de l'utilisateur (set)")
+    parser.add_argument("--family", type=lambda value: int(value) if value else None, default=None,
+                        help="identifiant de la famille (set), vide pour quitter la famille")
+    parser.add_argument("--role", choices=["admin", "member"], default="member", help="rôle dans la famille (set)")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        if args.command == "set":
+            if args.user is None:
+                parser.error("--user est obligatoire pour set")
+            moved = set_user_family(db, args.user, args.family, args.role)
+            print(f"✅ Utilisateur {args.user} -> famille {args.family} ({moved} stock(s) déplacé(s))")
+        else:
+            print(f"✅ {resync_stock_families(db)} stock(s) réaligné(s) sur la famille de leur propriétaire")
+    finally:
+        db.close()
@@ -0,0 +1,61 @@
+import hashlib
+import os
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse
+from ustock_api.cache import TTLCache
+from ustock_api.settings import settings
+
+# Les variantes d'images ne changent jamais à URL égale : cache navigateur/CDN d'un an
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Fiches produit : quasi immuables, réutilisables une heure puis revalidées par ETag
+PRODUCT_CACHE_CONTROL = settings.product_cache_control
+# Données d'un utilisateur : toujours revalidées (304 si rien n'a changé)
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+# ETag déjà calculés par code-barres : un If-None-Match connu est servi en 304 sans requête SQL
+PRODUCT_ETAG_CACHE_SIZE = settings.product_etag_cache_size
+PRODUCT_ETAG_TTL = settings.product_etag_ttl
+product_etags = TTLCache(maxsize=PRODUCT_ETAG_CACHE_SIZE, ttl=PRODUCT_ETAG_TTL)
+
+
+# 🏷️ ETag fort à partir d'un contenu (octets) ou de ses composantes de version
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+# 🏷️ If-None-Match correspond-il à l'ETag courant ? (gère les listes et "*")
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+# 📤 Réponse JSON avec ETag (calculé sur le corps si non fourni), 304 si le client l'a déjà
+def json_response(request: Request, content, cache_control: str, etag: str | None = None) -> Response:
+    response = JSONResponse(jsonable_encoder(content))
+    etag = etag or make_etag(response.body)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+# 📤 Servir un fichier avec ETag (taille + date de modification), 304 si le client l'a déjà
+def file_response(request: Request, path: str, media_type: str, cache_control: str = IMMUTABLE_CACHE_CONTROL) -> Response:
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return FileResponse(path, media_type=media_type, stat_result=stat, headers={"ETag": etag, "Cache-Control": cache_control})
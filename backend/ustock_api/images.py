@@ -0,0 +1,188 @@
+import asyncio
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from ustock_api.settings import settings
+
+# ⚙️ Photos de profil
+PROFILE_IMAGE_DIR = os.path.join(settings.static_dir, "profile_images")
+PROFILE_IMAGE_PUBLIC_URL = (
+    settings.profile_image_public_url or f"{settings.public_api_url.rstrip('/')}/static/profile_images"
+).rstrip("/")
+PROFILE_IMAGE_MAX_BYTES = settings.profile_image_max_bytes
+PROFILE_IMAGE_SIZES = (64, 256, 512)
+IMAGE_WORKERS = settings.image_workers or min(2, settings.cpus_per_worker())  # Un pool par worker web
+# Refuser les images dont le décodage exploserait la mémoire (bombes de décompression)
+IMAGE_MAX_PIXELS = 40_000_000
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Envoi de la photo : en-têtes multipart (limite, Content-Disposition…) tolérés en plus de l'image
+PROFILE_IMAGE_UPLOAD_PATH = "/users/me/profile-image"
+MULTIPART_OVERHEAD = 16 * 1024
+# Après un envoi, les fichiers plus récents que ce délai ne sont pas supprimés (autre envoi en cours)
+PROFILE_IMAGE_CLEANUP_GRACE = 300
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Image trop volumineuse (max {max_bytes // (1024 * 1024)} Mo)")
+
+
+# 🚧 Plafond de l'envoi appliqué pendant la réception du corps : Starlette analyse le multipart
+# (et l'écrit dans un fichier temporaire) avant d'appeler la route, save_upload arriverait trop tard.
+# Content-Length trop grand : 413 sans rien lire ; sinon (chunked, en-tête mensonger) 413 dès que
+# les octets reçus dépassent le plafond.
+class UploadSizeLimitMiddleware:
+    def __init__(self, app, path: str = PROFILE_IMAGE_UPLOAD_PATH, max_bytes: int = PROFILE_IMAGE_MAX_BYTES):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_body = max_bytes + MULTIPART_OVERHEAD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_body:
+            error = _too_large(self.max_bytes)
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    raise _too_large(self.max_bytes)  # Relevée telle quelle par FastAPI pendant l'analyse du corps
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# 📥 Écrire un upload sur disque par morceaux, sans dépasser `max_bytes` (413 sinon)
+async def save_upload(upload: UploadFile, destination: str, max_bytes: int = PROFILE_IMAGE_MAX_BYTES) -> int:
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    size = 0
+    handle = await run_in_threadpool(open, destination, "wb")
+    try:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+            await run_in_threadpool(handle.write, chunk)
+    except BaseException:
+        await run_in_threadpool(handle.close)
+        await run_in_threadpool(_remove_quietly, destination)
+        raise
+    await run_in_threadpool(handle.close)
+    return size
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Exécuté dans le pool de processus : recadrage carré + réduction, WebP (JPEG si WebP indisponible)
+def _render_square_variants(source: str, destination_prefix: str, sizes) -> dict:
+    from PIL import Image, ImageOps, features
+
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+    extension, image_format = ("webp", "WEBP") if features.check("webp") else ("jpg", "JPEG")
+    options = {"quality": 80, "method": 4} if image_format == "WEBP" else {"quality": 82, "optimize": True}
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        variants = {}
+        for size in sizes:
+            path = f"{destination_prefix}_{size}.{extension}"
+            ImageOps.fit(image, (size, size), Image.LANCZOS).save(path, image_format, **options)
+            variants[size] = os.path.basename(path)
+    return variants
+
+
+# 🖼️ Générer les miniatures d'une photo de profil hors de la boucle d'événements
+async def render_profile_variants(source: str, destination_prefix: str, sizes=PROFILE_IMAGE_SIZES) -> dict:
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            _get_pool(), _render_square_variants, source, destination_prefix, sizes
+        )
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise HTTPException(status_code=400, detail="Fichier image invalide ou non supporté")
+
+
+# Exécuté dans le pool de processus : réduction en conservant les proportions
+def _render_fit_variant(source: str, destination: str, size: int) -> str:
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image.thumbnail((size, size), Image.LANCZOS)
+        temporary = f"{destination}.{os.getpid()}.tmp"
+        image.save(temporary, "WEBP", quality=80, method=4)
+    os.replace(temporary, destination)  # Écriture atomique : plusieurs requêtes peuvent générer la même variante
+    return destination
+
+
+# 🖼️ Générer une variante WebP d'au plus `size` px de côté
+async def render_fit_variant(source: str, destination: str, size: int) -> str:
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), _render_fit_variant, source, destination, size)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise HTTPException(status_code=502, detail="Image source illisible")
+
+
+def _modified_at(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def profile_image_url(filename: str) -> str:
+    return f"{PROFILE_IMAGE_PUBLIC_URL}/{filename}"
+
+
+# 🧹 Supprimer les photos de profil d'un utilisateur, sauf celles qui commencent par `keep_prefix`
+# et celles modifiées depuis moins de `min_age` secondes (envoi peut-être encore en cours)
+def delete_profile_images(user_id: int, keep_prefix: str | None = None, directory: str = PROFILE_IMAGE_DIR, min_age: float = 0) -> int:
+    removed = 0
+    newest = time.time() - min_age
+    for path in glob.glob(os.path.join(directory, f"profile_{user_id}_*")):
+        if keep_prefix and os.path.basename(path).startswith(keep_prefix):
+            continue
+        if min_age and _modified_at(path) > newest:
+            continue
+        _remove_quietly(path)
+        removed += 1
+    return removed
@@ -0,0 +1,113 @@
+"""Invalidation des caches de processus à partir de la base (plusieurs workers, CLI).
+
+Chaque worker garde ses propres caches (utilisateurs authentifiés, ETag des fiches produit,
+index de recherche) : une modification faite par un autre processus ne les invalide pas.
+Toutes les CACHE_REFRESH_INTERVAL secondes, chaque worker relit ce qui a changé depuis son
+dernier passage (lectures d'index sur `updated_at`) :
+- `users.updated_at` et les jobs de suppression de compte -> cache d'authentification ;
+- `products.updated_at` -> ETag des fiches produit et index de recherche.
+
+Le délai de propagation entre workers est donc borné par l'intervalle, et non plus par
+les TTL des caches. CACHE_REFRESH_INTERVAL=0 désactive la tâche (un seul processus).
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from ustock_api import models
+from ustock_api.auth import invalidate_user_cache
+from ustock_api.database import SessionLocal
+from ustock_api.http_cache import product_etags
+from ustock_api.search_index import product_index
+from ustock_api.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_REFRESH_INTERVAL = settings.cache_refresh_interval
+# Les horodatages sont à la seconde et une transaction peut valider une ligne datée du
+# début de la transaction : on relit un peu en arrière, les lignes déjà vues sont ignorées
+REFRESH_LOOKBACK = timedelta(seconds=5)
+
+
+# 🕒 Lignes modifiées depuis le dernier passage, chacune renvoyée une seule fois
+class Watermark:
+    def __init__(self, since=None):
+        self.since = since
+        self._seen = {}  # clé -> horodatage déjà traité
+
+    def fresh(self, rows):
+        fresh = []
+        for key, changed_at, *values in rows:
+            if self._seen.get(key) != changed_at:
+                self._seen[key] = changed_at
+                fresh.append((key, *values))
+            if self.since is None or changed_at > self.since:
+                self.since = changed_at
+        if self.since is not None:
+            horizon = self.since - REFRESH_LOOKBACK
+            self._seen = {key: changed_at for key, changed_at in self._seen.items() if changed_at >= horizon}
+        return fresh
+
+    def start(self):
+        return self.since - REFRESH_LOOKBACK
+
+
+class CacheRefresher:
+    def __init__(self):
+        self.users = Watermark()
+        self.deletions = Watermark()
+        self.products = Watermark()
+
+    # Premier passage : rien à invalider, on part de l'heure de la base (l'index part de sa construction)
+    def _initialize(self, db: Session):
+        now = db.scalar(select(func.now()))
+        self.users.since = self.deletions.since = now
+        self.products.since = product_index.built_at or now
+
+    def refresh(self, db: Session) -> dict:
+        if self.users.since is None:
+            self._initialize(db)
+        User, Job, Product = models.User, models.AccountDeletionJob, models.Product
+
+        users = self.users.fresh(
+            db.query(User.id, User.updated_at).filter(User.updated_at >= self.users.start())
+        )
+        deletions = self.deletions.fresh(
+            db.query(Job.id, Job.created_at, Job.user_id).filter(Job.created_at >= self.deletions.start())
+        )
+        for user_id in {user_id for (user_id,) in users} | {user_id for _, user_id in deletions}:
+            invalidate_user_cache(user_id)
+
+        products = self.products.fresh(
+            db.query(Product.id, Product.updated_at, Product.barcode, Product.product_name, Product.brand)
+            .filter(Product.updated_at >= self.products.start())
+        )
+        for _, barcode, _, _ in products:
+            product_etags.invalidate(barcode)
+        # Aussi pendant une construction : les ajouts sont alors rejoués sur le nouvel index
+        product_index.add_products((product_id, name, brand) for product_id, _, name, brand in products)
+        return {"users": len(users) + len(deletions), "products": len(products)}
+
+
+# Un par processus (comme les caches qu'il invalide)
+cache_refresher = CacheRefresher()
+
+
+def refresh_caches() -> dict:
+    db = SessionLocal()
+    try:
+        return cache_refresher.refresh(db)
+    finally:
+        db.close()
+
+
+# 🔄 Boucle lancée au démarrage de chaque worker (main.py)
+async def refresh_caches_forever(interval: float = CACHE_REFRESH_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(refresh_caches)
+        except Exception:
+            logger.exception("❌ Rafraîchissement des caches en échec")
@@ -0,0 +1,191 @@
+"""Journalisation structurée et non bloquante.
+
+- les routes ne font qu'ajouter l'enregistrement dans une file bornée (QueueHandler) ;
+  un thread d'arrière-plan (QueueListener) le sérialise en JSON et l'écrit sur stdout.
+  File pleine : l'enregistrement est abandonné et compté, la requête n'attend jamais ;
+- chaque requête HTTP reçoit un identifiant (en-tête X-Request-ID repris ou généré),
+  ajouté à toutes ses lignes de journal et renvoyé dans la réponse ;
+- niveaux par module : LOG_LEVELS="sqlalchemy.engine=INFO,ustock_api.metrics=WARNING" ;
+- échantillonnage des événements fréquents (sous WARNING) : LOG_SAMPLING="ustock_api.routes.users.login=0.1".
+
+LOG_FORMAT=text pour un affichage lisible en développement (les CLI l'utilisent par défaut).
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from ustock_api.settings import settings
+
+# ⚙️ Configuration
+LOG_LEVEL = settings.log_level.upper()
+LOG_LEVELS = settings.log_levels
+LOG_SAMPLING = settings.log_sampling
+LOG_QUEUE_SIZE = settings.log_queue_size
+
+REQUEST_ID_HEADER = "x-request-id"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._\-]{1,64}$")
+# Attributs standard d'un LogRecord : tout le reste (passé via `extra=`) est un champ structuré
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "sample_rate"}
+
+_request_id: ContextVar[str | None] = ContextVar("ustock_request_id", default=None)
+
+
+def get_request_id() -> str | None:
+    return _request_id.get()
+
+
+# "a=INFO,b=0.1" -> {"a": "INFO", "b": "0.1"}
+def _parse_pairs(value: str):
+    pairs = {}
+    for part in value.split(","):
+        name, _, setting = part.partition("=")
+        if name.strip() and setting.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+# 🧾 Une ligne JSON par enregistrement (les champs `extra=` sont repris tels quels)
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "sample_rate", None) is not None:
+            entry["sample_rate"] = record.sample_rate
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s %(message)s", "%H:%M:%S")
+
+    def format(self, record):
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [{request_id}]" if request_id else line
+
+
+# 🎲 Ne garder qu'une fraction des événements fréquents (WARNING et au-delà toujours gardés)
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        # Préfixe le plus long d'abord : « a.b.c » l'emporte sur « a.b »
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                record.sample_rate = rate
+                return random.random() < rate
+        return True
+
+
+# 📨 Côté requête : on fige le message et l'identifiant de requête, puis dépôt sans attente
+class NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # Les arguments et la pile ne sont lisibles que dans le thread d'origine
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        record.request_id = _request_id.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: NonBlockingQueueHandler | None = None
+_listener: QueueListener | None = None
+_configured_pid: int | None = None
+
+
+# 🏗️ À appeler au démarrage de chaque processus (relancé après un fork : le thread d'écriture ne survit pas)
+def setup_logging(default_format: str = "json"):
+    global _handler, _listener, _configured_pid
+    if _configured_pid == os.getpid():
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if (settings.log_format or default_format) == "json" else TextFormatter())
+    handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    rates = {name: float(rate) for name, rate in _parse_pairs(LOG_SAMPLING).items()}
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_pairs(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(handler.queue, output)
+    _listener.start()
+    _handler, _configured_pid = handler, os.getpid()
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+# Vider la file à l'arrêt du processus
+@atexit.register
+def _flush():
+    if _listener is not None and _configured_pid == os.getpid():
+        _listener.stop()
+
+
+# 🪪 Middleware ASGI : identifiant de requête (repris du client ou du proxy s'il est sûr)
+class RequestIdMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")
+        request_id = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = _request_id.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_id.reset(token)
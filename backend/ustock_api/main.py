@@ -1,16 +1,68 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from ustock_api.routes import users, products, stocks, consumption
+from fastapi.concurrency import run_in_threadpool
+from ustock_api.routes import users, products, stocks, consumption, families, health, metrics, notifications, sync
+from ustock_api.database import engine
+from ustock_api.logs import RequestIdMiddleware, setup_logging
+from ustock_api.metrics import MetricsMiddleware, instrument_engine
+from ustock_api.off_client import close_off_client
+from ustock_api import images, passwords
+from ustock_api.search_index import SEARCH_INDEX_ON_STARTUP, build_product_index, product_index
+from ustock_api.invalidation import CACHE_REFRESH_INTERVAL, refresh_caches_forever
+from ustock_api.settings import SettingsError, settings
 from fastapi.staticfiles import StaticFiles
 
-app = FastAPI(title="UStock API", version="1.0")
 
-app.mount("/static", StaticFiles(directory="/root/UStock/backend/static"), name="static")
+# 🔄 Démarrage : construire l'index de recherche en arrière-plan et suivre les modifications
+# faites par les autres processus (caches de ce worker)
+# Arrêt : fermer les connexions keep-alive vers Open Food Facts et les pools de processus
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Déjà construit par le processus maître (serve.py, application préchargée) : hérité au fork
+    if SEARCH_INDEX_ON_STARTUP and not product_index.ready:
+        app.state.search_index_build = asyncio.ensure_future(run_in_threadpool(build_product_index))
+    refresher = asyncio.ensure_future(refresh_caches_forever()) if CACHE_REFRESH_INTERVAL > 0 else None
+    yield
+    if refresher is not None:
+        refresher.cancel()
+    await close_off_client()
+    passwords.shutdown_pool()
+    images.shutdown_pool()
+
+
+# 🔐 Sans clé de signature, n'importe qui pourrait forger un token : refuser de démarrer
+if not settings.jwt_secret_key:
+    raise SettingsError(
+        "JWT_SECRET_KEY manquant : clé de signature des tokens "
+        "(générer avec python -c \"import secrets; print(secrets.token_urlsafe(64))\")"
+    )
+
+# 📝 Journal JSON écrit par un thread dédié (les routes ne bloquent jamais sur stdout)
+setup_logging()
+
+app = FastAPI(title="UStock API", version="1.0", lifespan=lifespan)
+
+# 📈 Instrumentation : latence par route, requêtes SQL et temps en base (exposés sur /metrics)
+instrument_engine(engine)
+app.add_middleware(MetricsMiddleware)
+# 🚧 Photo de profil : plafond de taille vérifié avant l'analyse multipart
+app.add_middleware(images.UploadSizeLimitMiddleware)
+# Ajouté en dernier : le plus externe, l'identifiant de requête couvre aussi le journal des requêtes lentes
+app.add_middleware(RequestIdMiddleware)
+
+app.mount("/static", StaticFiles(directory=settings.static_dir), name="static")
 
 # 📌 Inclure les routes
 app.include_router(stocks.router)
 app.include_router(users.router)
 app.include_router(products.router)
 app.include_router(consumption.router)
+app.include_router(sync.router)
+app.include_router(families.router)
+app.include_router(notifications.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
 
 # 🌍 Tester l'API
 @app.get("/")
@@ -0,0 +1,209 @@
+"""Instrumentation par requête, exposée au format Prometheus sur GET /metrics.
+
+- middleware ASGI : latence par route (gabarit de chemin, ex. /products/{barcode}),
+  nombre de requêtes SQL et temps passé en base, temps bcrypt et appels Open Food Facts ;
+- événements SQLAlchemy : chaque requête SQL est chronométrée et imputée à la requête
+  HTTP en cours (contextvar, visible aussi dans le threadpool des routes synchrones) ;
+- les requêtes qui dépassent le budget (durée ou nombre de requêtes SQL) sont journalisées :
+  c'est ainsi qu'on repère le prochain N+1.
+
+Avec plusieurs workers, définir PROMETHEUS_MULTIPROC_DIR (dossier vide, partagé par les
+workers) pour que /metrics agrège les compteurs de tous les processus.
+/metrics est réservé à la supervision : `Authorization: Bearer <INTERNAL_TOKEN>`
+(`authorization` du scrape_config Prometheus).
+"""
+import logging
+import os
+import time
+from contextvars import ContextVar
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from ustock_api.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# ⚙️ Budgets au-delà desquels une requête est journalisée comme lente
+SLOW_REQUEST_SECONDS = settings.slow_request_seconds
+SLOW_REQUEST_QUERIES = settings.slow_request_queries
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250)
+
+REQUEST_LATENCY = Histogram(
+    "ustock_http_request_duration_seconds", "Durée des requêtes HTTP",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "ustock_http_request_sql_queries", "Requêtes SQL émises par requête HTTP",
+    ["method", "route"], buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    "ustock_http_request_db_seconds", "Temps passé en base par requête HTTP",
+    ["method", "route"], buckets=LATENCY_BUCKETS,
+)
+SLOW_REQUESTS = Counter("ustock_http_slow_requests_total", "Requêtes hors budget", ["method", "route", "reason"])
+SQL_DURATION = Histogram("ustock_sql_query_duration_seconds", "Durée des requêtes SQL", buckets=LATENCY_BUCKETS)
+OFF_LATENCY = Histogram(
+    "ustock_off_request_duration_seconds", "Appels à Open Food Facts (chaque tentative)",
+    ["operation", "status"], buckets=LATENCY_BUCKETS,
+)
+BCRYPT_DURATION = Histogram(
+    "ustock_bcrypt_duration_seconds", "Hashage et vérification bcrypt (attente du pool comprise)",
+    ["operation"], buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+# 🧮 Compteurs de la requête HTTP en cours (un objet partagé entre la boucle et le threadpool)
+class RequestStats:
+    __slots__ = ("queries", "db_time", "off_calls", "off_time", "bcrypt_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.off_calls = 0
+        self.off_time = 0.0
+        self.bcrypt_time = 0.0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("ustock_request_stats", default=None)
+
+
+# 🌍 Appel à Open Food Facts (status : code HTTP ou « error » pour une erreur réseau)
+def observe_off_call(operation: str, status, seconds: float):
+    OFF_LATENCY.labels(operation, str(status)).observe(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.off_calls += 1
+        stats.off_time += seconds
+
+
+def observe_bcrypt(operation: str, seconds: float):
+    BCRYPT_DURATION.labels(operation).observe(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.bcrypt_time += seconds
+
+
+# 🗄️ Chronométrer chaque requête SQL d'un moteur
+def instrument_engine(engine):
+    if getattr(engine, "_ustock_instrumented", False):
+        return
+    engine._ustock_instrumented = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("ustock_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["ustock_query_start"].pop()
+        elapsed = time.perf_counter() - started
+        SQL_DURATION.observe(elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+
+# 📊 Jauges lues au moment de la collecte : pool de connexions et caches en mémoire
+class RuntimeCollector:
+    # Pas de description à l'enregistrement : collect() importe des modules qui importent celui-ci
+    def describe(self):
+        return []
+
+    def collect(self):
+        from ustock_api.auth import user_cache
+        from ustock_api.cache import off_product_cache, off_search_cache
+        from ustock_api.database import get_pool_stats
+        from ustock_api.http_cache import product_etags
+        from ustock_api.logs import dropped_records
+
+        pool = get_pool_stats()
+        pool_gauge = GaugeMetricFamily("ustock_db_pool", "État du pool de connexions", labels=["state"])
+        for state in ("checked_in", "checked_out", "overflow", "timeouts"):
+            pool_gauge.add_metric([state], pool[state])
+        yield pool_gauge
+        yield GaugeMetricFamily("ustock_db_pool_wait_max_seconds", "Attente maximale d'une connexion", value=pool["wait_max_ms"] / 1000)
+
+        caches = {"auth_users": user_cache, "off_products": off_product_cache, "off_search": off_search_cache, "product_etags": product_etags}
+        size = GaugeMetricFamily("ustock_cache_entries", "Entrées en cache", labels=["cache"])
+        lookups = CounterMetricFamily("ustock_cache_lookups", "Accès aux caches depuis le démarrage", labels=["cache", "result"])
+        for name, cache in caches.items():
+            stats = cache.stats()
+            size.add_metric([name], stats["size"])
+            for result in ("hits", "misses", "evictions"):
+                lookups.add_metric([name, result], stats[result])
+        yield size
+        yield lookups
+        yield CounterMetricFamily("ustock_log_records_dropped", "Lignes de journal abandonnées (file pleine)", value=dropped_records())
+
+
+_runtime_collector = RuntimeCollector()
+REGISTRY.register(_runtime_collector)
+
+
+# 📤 Corps de GET /metrics
+def render_metrics():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_runtime_collector)  # Jauges du worker qui répond
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+# ⏱️ Middleware ASGI (pas BaseHTTPMiddleware : les réponses en flux passent sans tampon)
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+            REQUEST_QUERIES.labels(method, route).observe(stats.queries)
+            REQUEST_DB_TIME.labels(method, route).observe(stats.db_time)
+            _log_if_slow(method, route, status, elapsed, stats)
+
+
+def _log_if_slow(method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+    reasons = []
+    if elapsed > SLOW_REQUEST_SECONDS:
+        reasons.append("latency")
+    if stats.queries > SLOW_REQUEST_QUERIES:
+        reasons.append("queries")
+    if not reasons:
+        return
+    for reason in reasons:
+        SLOW_REQUESTS.labels(method, route, reason).inc()
+    logger.warning(
+        "🐢 Requête lente %s %s -> %s : %.0f ms, %d requêtes SQL", method, route, status, elapsed * 1000, stats.queries,
+        extra={
+            "method": method, "route": route, "status": status, "reasons": reasons,
+            "duration_ms": round(elapsed * 1000, 1), "sql_queries": stats.queries, "db_ms": round(stats.db_time * 1000, 1),
+            "off_calls": stats.off_calls, "off_ms": round(stats.off_time * 1000, 1), "bcrypt_ms": round(stats.bcrypt_time * 1000, 1),
+        },
+    )
@@ -0,0 +1,74 @@
+"""Migrations de schéma versionnées (fichiers SQL dans backend/migrations).
+
+Usage (depuis backend/) :
+    python -m ustock_api.migrate            # appliquer les migrations en attente
+    python -m ustock_api.migrate status     # lister les migrations appliquées / en attente
+
+Chaque fichier `NNNN_description.sql` est appliqué une seule fois, dans l'ordre, puis
+enregistré dans `schema_migrations`. MariaDB valide implicitement les DDL : les
+migrations doivent donc rester idempotentes (IF NOT EXISTS / IF EXISTS).
+"""
+import argparse
+import os
+import re
+from sqlalchemy import text
+from ustock_api.database import engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_[\w-]+\.sql$")
+
+
+def list_migrations(directory: str = MIGRATIONS_DIR):
+    return sorted(name for name in os.listdir(directory) if MIGRATION_FILE.match(name))
+
+
+# Découper un fichier en instructions (pas de `;` dans les littéraux de nos migrations)
+def split_statements(sql: str):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def _ensure_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR(255) NOT NULL PRIMARY KEY, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def applied_migrations(conn):
+    _ensure_table(conn)
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+# 🚀 Appliquer les migrations en attente, renvoie la liste des versions appliquées
+def migrate(directory: str = MIGRATIONS_DIR):
+    applied = []
+    with engine.begin() as conn:
+        done = applied_migrations(conn)
+    for name in list_migrations(directory):
+        if name in done:
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as handle:
+            statements = split_statements(handle.read())
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            conn.execute(text("INSERT INTO schema_migrations (version) VALUES (:version)"), {"version": name})
+        print(f"✅ Migration appliquée : {name}")
+        applied.append(name)
+    return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrations du schéma UStock")
+    parser.add_argument("command", nargs="?", choices=["up", "status"], default="up")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        with engine.begin() as conn:
+            done = applied_migrations(conn)
+        for name in list_migrations():
+            print(f"{'✅' if name in done else '⏳'} {name}")
+    elif not migrate():
+        print("🔎 Schéma déjà à jour")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey, Date, Enum
+from sqlalchemy import BigInteger, Column, Computed, Integer, JSON, String, TIMESTAMP, ForeignKey, Date, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from ustock_api.database import Base
 from sqlalchemy.sql import func
@@ -23,13 +23,25 @@ class User(Base):
     family_id = Column(Integer, ForeignKey("families.id", ondelete="SET NULL"), nullable=True)
     password_hash = Column(String(255), nullable=False)
     profile_image_url = Column(String(255), nullable=True)
+    stock_version = Column(Integer, nullable=False, default=0, server_default="0")  # Voir changes.py
     # 🔹 MODIFICATION : S'assurer que les timestamps sont correctement définis
     created_at = Column(TIMESTAMP, nullable=False, default=func.now())
-    updated_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now())
+    updated_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now(), index=True)  # Voir invalidation.py
 
     family = relationship("Family", backref="users")
 
 
+# Appartenance à une famille : seule source de vérité pour l'accès aux données familiales
+# (users.family_id et stocks.family_id en sont des copies, voir family_membership.py)
+class UserFamily(Base):
+    __tablename__ = "user_families"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(Integer, ForeignKey("families.id", ondelete="CASCADE"), nullable=False, index=True)
+    role = Column(Enum("admin", "member"), default="member")
+
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -41,6 +53,7 @@ class Product(Base):
     nutriscore = Column(Enum("a", "b", "c", "d", "e"))
     image_url = Column(String(255))
     created_at = Column(TIMESTAMP, default=func.now())
+    updated_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now(), index=True)
 
 
 class Stock(Base):
@@ -52,11 +65,22 @@ class Stock(Base):
     family_id = Column(Integer, ForeignKey("families.id", ondelete="SET NULL"), nullable=True)
     quantity = Column(Integer, nullable=False, default=1)
     expiration_date = Column(Date, nullable=True)
+    # Clé d'unicité : une date NULL ne compte pas comme doublon dans un index UNIQUE, d'où une date sentinelle
+    expiration_key = Column(Date, Computed("coalesce(expiration_date, '1000-01-01')", persisted=True))
     added_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    updated_at = Column(TIMESTAMP, nullable=False, default=func.now(), onupdate=func.now())
 
     product = relationship("Product")
     user = relationship("User")
 
+    # Index alignés sur les requêtes des routes (voir migrations/)
+    # Une seule ligne par (utilisateur, produit, date) : POST /stocks/ fait un vrai upsert sur cette clé
+    __table_args__ = (
+        UniqueConstraint("user_id", "product_id", "expiration_key", name="uq_stocks_user_product_expiration"),
+        Index("ix_stocks_family_product_expiration", "family_id", "product_id", "expiration_date", "quantity", "user_id"),
+        Index("ix_stocks_user_expiration", "user_id", "expiration_date"),
+    )
+
 
 class ProductConsumption(Base):
     __tablename__ = "product_consumption"
@@ -71,4 +95,81 @@ class ProductConsumption(Base):
     consumption_date = Column(TIMESTAMP, nullable=False, default=func.now())
 
     product = relationship("Product")
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_consumption_user_status_date", "user_id", "status", "consumption_date"),
+        Index("ix_consumption_user_date", "user_id", "consumption_date"),
+    )
+
+
+# Agrégat mensuel de l'historique, maintenu à chaque consommation (voir consumption_stats.py)
+class ConsumptionMonthlyStat(Base):
+    __tablename__ = "consumption_monthly_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # Premier jour du mois
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    consumed_quantity = Column(Integer, nullable=False, default=0)
+    wasted_quantity = Column(Integer, nullable=False, default=0)
+
+
+# Fichiers de dump / delta Open Food Facts déjà importés (voir off_dump.py)
+class OffDumpImport(Base):
+    __tablename__ = "off_dump_imports"
+
+    filename = Column(String(255), primary_key=True)
+    products = Column(Integer, nullable=False, default=0)
+    imported_at = Column(TIMESTAMP, nullable=False, default=func.now())
+
+
+# Journal des créations / modifications / suppressions, lu par GET /sync (voir changes.py)
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)  # users.stock_version après la modification
+    entity = Column(Enum("stock", "consumption"), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    action = Column(Enum("upsert", "delete"), nullable=False)
+    changed_at = Column(TIMESTAMP, nullable=False, default=func.now(), index=True)
+
+    __table_args__ = (
+        Index("ix_change_log_user_version", "user_id", "version"),
+    )
+
+
+# Notifications relevées par l'application (digest quotidien des dates d'expiration, voir expiry_alerts.py)
+class Notification(Base):
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(Enum("expiry_digest"), nullable=False)
+    notification_date = Column(Date, nullable=False)
+    expiring_count = Column(Integer, nullable=False, default=0)
+    expired_count = Column(Integer, nullable=False, default=0)
+    items = Column(JSON, nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    read_at = Column(TIMESTAMP, nullable=True)
+
+    # Un digest par utilisateur et par jour : relancer le calcul met à jour la ligne existante
+    __table_args__ = (
+        UniqueConstraint("user_id", "kind", "notification_date", name="uq_notifications_user_kind_date"),
+        Index("ix_notifications_date", "notification_date"),
+    )
+
+
+# Suppression de compte en arrière-plan (voir account_deletion.py) ; la ligne survit au compte
+# pour que l'application puisse suivre l'avancement avec l'identifiant du job
+class AccountDeletionJob(Base):
+    __tablename__ = "account_deletion_jobs"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    status = Column(Enum("pending", "running", "done", "failed"), nullable=False, default="pending", index=True)
+    deleted_rows = Column(JSON, nullable=True)  # Lignes supprimées par table
+    error = Column(String(255), nullable=True)
+    created_at = Column(TIMESTAMP, nullable=False, default=func.now())
+    finished_at = Column(TIMESTAMP, nullable=True)
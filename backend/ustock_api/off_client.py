@@ -0,0 +1,183 @@
+import asyncio
+import time
+import httpx
+from ustock_api.cache import MISSING, off_product_cache, off_search_cache
+from ustock_api.metrics import observe_off_call
+from ustock_api.settings import settings
+
+# ⚙️ Configuration du client Open Food Facts
+OFF_BASE_URL = settings.off_base_url.rstrip("/")
+OFF_TIMEOUT = settings.off_timeout
+OFF_CONNECT_TIMEOUT = settings.off_connect_timeout
+OFF_MAX_RETRIES = settings.off_max_retries
+OFF_RETRY_BACKOFF = settings.off_retry_backoff
+OFF_MAX_CONCURRENCY = settings.off_max_concurrency
+OFF_USER_AGENT = "UStock/1.0 (https://ustock.pro)"
+
+# Statuts pour lesquels une nouvelle tentative a du sens
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+# Erreur transitoire côté Open Food Facts : la réponse ne doit pas être mise en cache
+class OFFUnavailable(Exception):
+    pass
+
+
+# 🧾 Projeter une fiche Open Food Facts sur les colonnes de `products`
+def parse_product(barcode, data):
+    if data and 'product' in data and data['product'].get('product_name'):
+        return {
+            "barcode": barcode,
+            "product_name": data['product'].get('product_name', 'Inconnu'),
+            "brand": data['product'].get('brands', 'Non spécifié'),
+            "content_size": data['product'].get('quantity', 'Non spécifié'),
+            "nutriscore": data['product'].get('nutriscore_grade', None),
+            "image_url": data['product'].get('image_front_url', None)
+        }
+    return None
+
+
+def parse_search_results(data, limit):
+    return [
+        {
+            "product_name": product.get("product_name", ""),
+            "brand": product.get("brands", ""),
+            "image_url": product.get("image_url", ""),
+            "barcode": product.get("code", ""),
+            "nutriscore": product.get("nutriscore_grade", ""),
+            "content_size": product.get("quantity", "")
+        }
+        for product in (data or {}).get("products", [])[:limit]
+    ]
+
+
+# 🌍 Client asynchrone : connexions keep-alive partagées, timeouts, retries et coalescence des requêtes
+class OFFClient:
+    def __init__(
+        self,
+        base_url: str = OFF_BASE_URL,
+        timeout: float = OFF_TIMEOUT,
+        connect_timeout: float = OFF_CONNECT_TIMEOUT,
+        max_retries: int = OFF_MAX_RETRIES,
+        retry_backoff: float = OFF_RETRY_BACKOFF,
+        max_concurrency: int = OFF_MAX_CONCURRENCY,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            headers={"User-Agent": OFF_USER_AGENT},
+            transport=transport,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    # GET JSON avec retries exponentiels ; renvoie None sur 404
+    # `operation` étiquette les métriques (pas le chemin : un code-barres par série sinon)
+    async def _get_json(self, path: str, params: dict | None = None, operation: str = "other"):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            started = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    response = await self._client.get(path, params=params)
+            except httpx.TransportError as err:
+                observe_off_call(operation, "error", time.perf_counter() - started)
+                error = err
+                continue
+            observe_off_call(operation, response.status_code, time.perf_counter() - started)
+            if response.status_code == 404:
+                return None
+            if response.status_code in RETRYABLE_STATUS:
+                error = f"HTTP {response.status_code}"
+                continue
+            if response.status_code != 200:
+                raise OFFUnavailable(f"HTTP {response.status_code}")
+            try:
+                return response.json()
+            except ValueError as err:
+                raise OFFUnavailable(f"Réponse invalide : {err}") from err
+        raise OFFUnavailable(str(error) or "Open Food Facts injoignable")
+
+    # Single-flight : les appels concurrents sur la même clé partagent une seule requête amont
+    async def _coalesce(self, key: str, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    # 🔍 Fiche produit par code-barres (None si inconnu)
+    async def fetch_product(self, barcode: str):
+        cached = await off_product_cache.aget(barcode)
+        if cached is not MISSING:
+            return cached
+
+        async def load():
+            product = parse_product(barcode, await self._get_json(f"/api/v0/product/{barcode}.json", operation="product"))
+            await off_product_cache.aset(barcode, product)
+            return product
+
+        return await self._coalesce(f"product:{barcode}", load)
+
+    # 🔎 Recherche par nom (liste vide si aucun résultat)
+    async def search(self, query: str, limit: int = 10):
+        key = f"{limit}:{query.strip().lower()}"
+        cached = await off_search_cache.aget(key)
+        if cached is not MISSING:
+            return cached or []
+
+        async def load():
+            params = {"search_terms": query, "search_simple": 1, "action": "process", "json": 1}
+            results = parse_search_results(await self._get_json("/cgi/search.pl", params, operation="search"), limit)
+            await off_search_cache.aset(key, results or None)
+            return results
+
+        return await self._coalesce(f"search:{key}", load)
+
+    # 📥 Télécharger un fichier (image) avec une taille maximale ; None si absent ou trop gros
+    async def download(self, url: str, max_bytes: int):
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                async with self._client.stream("GET", url) as response:
+                    if response.status_code != 200:
+                        observe_off_call("image", response.status_code, time.perf_counter() - started)
+                        return None
+                    content = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        content.extend(chunk)
+                        if len(content) > max_bytes:
+                            return None
+                    observe_off_call("image", 200, time.perf_counter() - started)
+                    return bytes(content)
+            except httpx.TransportError as err:
+                observe_off_call("image", "error", time.perf_counter() - started)
+                raise OFFUnavailable(str(err)) from err
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+# Client partagé par les routes de l'API (un par processus)
+_client: OFFClient | None = None
+
+
+def get_off_client() -> OFFClient:
+    global _client
+    if _client is None:
+        _client = OFFClient()
+    return _client
+
+
+async def close_off_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,158 @@
+"""Import d'un dump Open Food Facts (JSONL ou CSV, éventuellement gzippé) dans `products`.
+
+Le fichier est lu ligne à ligne : la mémoire reste bornée par la taille d'un lot,
+quelle que soit la taille du dump. Chaque lot est inséré en une requête multi-lignes
+(les codes-barres déjà connus sont mis à jour, `updated_at` seulement si la fiche change).
+Les workers de l'API ajoutent les fiches écrites à leur index de recherche en relisant
+`products.updated_at` (invalidation.py) : pas besoin de les redémarrer après un import.
+
+Usage (depuis backend/) :
+    python -m ustock_api.off_dump import openfoodfacts-products.jsonl.gz
+    python -m ustock_api.off_dump import en.openfoodfacts.org.products.csv.gz --batch-size 5000
+    python -m ustock_api.off_dump deltas /srv/off/deltas    # fichiers delta pas encore importés
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+from sqlalchemy.orm import Session
+from ustock_api import models
+from ustock_api.database import SessionLocal
+from ustock_api.logs import setup_logging
+from ustock_api.product_import import is_valid_barcode, upsert_products
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 2000
+
+# Champs OFF candidats pour chaque colonne, par ordre de préférence
+FIELDS = {
+    "product_name": ("product_name", "product_name_fr", "product_name_en", "generic_name"),
+    "brand": ("brands",),
+    "content_size": ("quantity",),
+    "nutriscore": ("nutriscore_grade", "nutrition_grades"),
+    "image_url": ("image_front_url", "image_url"),
+}
+# Longueurs des colonnes de `products` : les valeurs plus longues sont tronquées
+LENGTHS = {column: models.Product.__table__.c[column].type.length for column in ("barcode", "product_name", "brand", "content_size", "image_url")}
+
+
+def _open_text(path: str):
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith((".csv", ".tsv")) else "jsonl"
+
+
+# Lecture incrémentale : un dict par produit
+def iter_records(handle, file_format: str):
+    if file_format == "csv":
+        # Les exports OFF sont séparés par des tabulations, avec des champs très longs
+        csv.field_size_limit(sys.maxsize)
+        yield from csv.DictReader(handle, delimiter="\t")
+        return
+    for line in handle:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue  # Ligne tronquée ou corrompue : on continue le flux
+
+
+def _first(record, names):
+    for name in names:
+        value = record.get(name)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return None
+
+
+# 🧾 Projeter une fiche du dump sur les colonnes de `products` (None si inexploitable)
+def project_record(record):
+    barcode = str(record.get("code") or "").strip()
+    if not is_valid_barcode(barcode):
+        return None
+    product = {"barcode": barcode, **{column: _first(record, names) for column, names in FIELDS.items()}}
+    if not product["product_name"]:
+        return None
+    for column, length in LENGTHS.items():
+        if product[column] and len(product[column]) > length:
+            product[column] = product[column][:length] if column != "image_url" else None
+    return product
+
+
+# 📦 Importer un fichier par lots ; renvoie le nombre de fiches écrites
+def import_dump(db: Session, path: str, file_format: str | None = None, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    file_format = file_format or detect_format(path)
+    written = 0
+    batch = {}  # Par code-barres : un doublon dans le même INSERT est refusé par SQLite
+    with _open_text(path) as handle:
+        for record in iter_records(handle, file_format):
+            product = project_record(record)
+            if product is None:
+                continue
+            batch[product["barcode"]] = product
+            if len(batch) >= batch_size:
+                upsert_products(db, batch.values())
+                written += len(batch)
+                batch.clear()
+                logger.info("… %d fiches importées", written)
+        if batch:
+            upsert_products(db, batch.values())
+            written += len(batch)
+    return written
+
+
+# 🔄 Importer, dans l'ordre des noms, les fichiers delta d'un dossier pas encore importés
+def import_deltas(db: Session, directory: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    done = {filename for (filename,) in db.query(models.OffDumpImport.filename)}
+    imported = []
+    for filename in sorted(os.listdir(directory)):
+        if filename in done or not filename.endswith((".json.gz", ".jsonl.gz", ".jsonl", ".json", ".csv.gz", ".csv")):
+            continue
+        count = import_dump(db, os.path.join(directory, filename), batch_size=batch_size)
+        db.add(models.OffDumpImport(filename=filename, products=count))
+        db.commit()
+        logger.info("✅ %s : %d fiches", filename, count, extra={"filename": filename, "products": count})
+        imported.append((filename, count))
+    return imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import d'un dump Open Food Facts dans la table products")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    dump = subcommands.add_parser("import", help="importer un dump complet ou un fichier delta")
+    dump.add_argument("path", help="fichier .jsonl/.csv (éventuellement .gz), '-' pour l'entrée standard")
+    dump.add_argument("--format", choices=["jsonl", "csv"], help="forcé si l'extension ne suffit pas")
+    deltas = subcommands.add_parser("deltas", help="importer les fichiers delta d'un dossier pas encore traités")
+    deltas.add_argument("directory")
+    for subcommand in (dump, deltas):
+        subcommand.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="fiches par INSERT")
+    args = parser.parse_args(argv)
+    setup_logging(default_format="text")
+
+    db = SessionLocal()
+    try:
+        if args.command == "import":
+            print(f"✅ {import_dump(db, args.path, args.format, args.batch_size)} fiches importées")
+        else:
+            imported = import_deltas(db, args.directory, args.batch_size)
+            print(f"✅ {len(imported)} fichier(s) delta importé(s)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
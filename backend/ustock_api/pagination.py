@@ -0,0 +1,80 @@
+import base64
+import json
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+# En-tête renvoyé quand une page suivante existe
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Taille de page maximale acceptée par les routes paginées
+MAX_PAGE_SIZE = 500
+
+# Export NDJSON : une ligne JSON par élément, lue par lots depuis un curseur serveur
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_CHUNK_SIZE = 500
+
+
+# 🔐 Encoder la clé de tri du dernier élément en curseur opaque
+def encode_cursor(*values) -> str:
+    raw = json.dumps(list(values), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+# 🔓 Décoder un curseur reçu du client (400 si illisible)
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    return values
+
+
+# Éléments sérialisés en JSON, par lots, lus sur une session propre au flux
+# Chaque lot est une requête LIMIT chunk_size reprise après la clé du dernier élément
+# (`build_query(session, page_key(dernier))`) : mysql-connector ne sait pas lire un résultat
+# en flux côté serveur (pas de curseur serveur), un seul SELECT serait entièrement chargé.
+# `prepare` complète chaque élément validé avant sérialisation (ex. product_images.with_thumbnail)
+def _stream_batches(db: Session, build_query, schema, page_key, chunk_size: int, prepare=None):
+    with Session(bind=db.get_bind()) as session:
+        after = None
+        while True:
+            rows = build_query(session, after).limit(chunk_size).all()
+            if not rows:
+                return
+            batch = []
+            for row in rows:
+                item = schema.model_validate(row)
+                batch.append((prepare(item) if prepare else item).model_dump_json())
+            after = page_key(rows[-1])
+            session.expunge_all()  # Mémoire bornée par un lot
+            yield batch
+            if len(rows) < chunk_size:
+                return
+
+
+# 📤 Export NDJSON en flux : mémoire constante, premier octet envoyé après le premier lot
+# `build_query(session, after)` construit la requête triée (éléments après la clé `after`, ou
+# depuis le début si None) sur une session propre au flux, qui vit aussi longtemps que la
+# réponse (celle de la requête peut être fermée avant la fin de l'envoi)
+def ndjson_response(db: Session, build_query, schema, page_key, chunk_size: int = STREAM_CHUNK_SIZE, prepare=None) -> StreamingResponse:
+    def lines():
+        for batch in _stream_batches(db, build_query, schema, page_key, chunk_size, prepare):
+            yield "\n".join(batch) + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+# 📤 Tableau JSON complet en flux (clients qui ne paginent pas) : même corps qu'une liste, mémoire constante
+def json_array_response(db: Session, build_query, schema, page_key, chunk_size: int = STREAM_CHUNK_SIZE, headers=None, prepare=None) -> StreamingResponse:
+    def body():
+        separator = "["
+        for batch in _stream_batches(db, build_query, schema, page_key, chunk_size, prepare):
+            yield separator + ",".join(batch)
+            separator = ","
+        yield "]" if separator == "," else "[]"
+
+    return StreamingResponse(body(), media_type="application/json", headers=headers)
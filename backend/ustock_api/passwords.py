@@ -0,0 +1,71 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+from ustock_api.metrics import observe_bcrypt
+from ustock_api.settings import settings
+
+# ⚙️ Coût bcrypt (2^rounds itérations) : les hashs à un autre coût sont recalculés à la connexion
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+# Processus dédiés au hashage, séparés du threadpool qui sert les requêtes (un pool par worker web)
+PASSWORD_HASH_WORKERS = settings.password_hash_workers or max(1, settings.cpus_per_worker() // 2)
+# Au-delà, les demandes attendent (sans bloquer de thread) au lieu de s'empiler dans le pool
+PASSWORD_HASH_MAX_PENDING = settings.password_hash_max_pending or PASSWORD_HASH_WORKERS * 4
+
+# Gestion du hashage des mots de passe
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_pool: ProcessPoolExecutor | None = None
+_pending: asyncio.Semaphore | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pending
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    _pending = None
+
+
+# Fonctions exécutées dans les processus du pool
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+async def _run(operation: str, function, *args):
+    global _pending
+    if _pending is None:
+        _pending = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+    started = time.perf_counter()
+    try:
+        async with _pending:
+            return await asyncio.get_running_loop().run_in_executor(_get_pool(), function, *args)
+    finally:
+        observe_bcrypt(operation, time.perf_counter() - started)
+
+
+# 🔐 Hasher un mot de passe hors des workers de requêtes
+async def hash_password(password: str) -> str:
+    return await _run("hash", _hash, password)
+
+
+# 🔐 Vérifier un mot de passe ; renvoie (valide, nouveau_hash ou None si le hash est à jour)
+async def verify_password(password: str, hashed_password: str):
+    return await _run("verify", _verify_and_update, password, hashed_password)
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+from urllib.parse import urlparse
+from fastapi.concurrency import run_in_threadpool
+from ustock_api import models
+from ustock_api.database import SessionLocal
+from ustock_api.images import render_fit_variant
+from ustock_api.off_client import OFFClient, OFFUnavailable
+from ustock_api.product_import import is_valid_barcode
+from ustock_api.schemas import ProductResponse
+from ustock_api.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# ⚙️ Miroir local des images Open Food Facts
+PRODUCT_IMAGE_DIR = settings.product_image_dir or os.path.join(settings.static_dir, "product_images")
+PRODUCT_IMAGE_SIZES = (64, 128, 256, 512)
+PRODUCT_IMAGE_DEFAULT_SIZE = 256
+PRODUCT_IMAGE_MAX_BYTES = settings.product_image_max_bytes
+# Seuls les hôtes d'images OFF sont téléchargés (les URL viennent de données externes)
+PRODUCT_IMAGE_HOSTS = settings.product_image_hosts
+PRODUCT_IMAGE_MIRROR_CONCURRENCY = settings.product_image_mirror_concurrency
+PUBLIC_API_URL = settings.public_api_url.rstrip("/")
+# Version d'une image : empreinte de son image_url. Elle figure dans l'URL servie (`v=`) et dans
+# le chemin sur disque : une nouvelle image_url donne une nouvelle URL, l'ancienne peut rester
+# « immutable » dans les caches des clients sans jamais devenir fausse.
+IMAGE_VERSION = re.compile(r"^[0-9a-f]{12}$")
+
+
+def image_version(image_url: str) -> str:
+    return hashlib.sha1(image_url.encode()).hexdigest()[:12]
+
+
+def original_path(barcode: str, version: str, directory: str = PRODUCT_IMAGE_DIR) -> str:
+    return os.path.join(directory, barcode, version, "original")
+
+
+def variant_path(barcode: str, version: str, size: int, directory: str = PRODUCT_IMAGE_DIR) -> str:
+    return os.path.join(directory, barcode, version, f"{size}.webp")
+
+
+def product_image_url(barcode: str, image_url: str, size: int = PRODUCT_IMAGE_DEFAULT_SIZE) -> str:
+    return f"{PUBLIC_API_URL}/products/{barcode}/image?size={size}&v={image_version(image_url)}"
+
+
+# 🖼️ Renseigner thumbnail_url (copie locale de l'image OFF) d'un produit sérialisé ou de l'élément qui le contient
+def with_thumbnail(item):
+    product = item if isinstance(item, ProductResponse) else item.product
+    product.thumbnail_url = product_image_url(product.barcode, product.image_url) if product.image_url else None
+    return item
+
+
+# Objets ORM -> réponses `schema` avec leur miniature
+def thumbnail_responses(schema, rows):
+    return [with_thumbnail(schema.model_validate(row)) for row in rows]
+
+
+def is_allowed_source(url: str) -> bool:
+    parsed = urlparse(url or "")
+    host = (parsed.hostname or "").lower()
+    return parsed.scheme in ("http", "https") and any(
+        host == allowed or host.endswith(f".{allowed}") for allowed in PRODUCT_IMAGE_HOSTS
+    )
+
+
+def _write_atomically(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(content)
+    os.replace(temporary, path)
+
+
+# 🧹 Supprimer les copies (original et variantes) des anciennes image_url d'un produit
+def _remove_other_versions(barcode: str, version: str, directory: str = PRODUCT_IMAGE_DIR):
+    folder = os.path.join(directory, barcode)
+    for entry in os.listdir(folder):
+        if entry == version:
+            continue
+        path = os.path.join(folder, entry)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)  # Ancienne disposition, sans version
+
+
+# 📥 Copier l'image d'origine d'un produit ; True si elle est disponible localement
+# Une nouvelle image_url (dump, import) est copiée à part, puis les anciennes copies sont supprimées
+async def mirror_image(barcode: str, url: str, client: OFFClient, directory: str = PRODUCT_IMAGE_DIR) -> bool:
+    version = image_version(url)
+    path = original_path(barcode, version, directory)
+    if await run_in_threadpool(os.path.exists, path):
+        return True
+    if not is_valid_barcode(barcode) or not is_allowed_source(url):
+        return False
+    try:
+        content = await client.download(url, PRODUCT_IMAGE_MAX_BYTES)
+    except OFFUnavailable as err:
+        logger.warning("⚠️ Image %s non copiée : %s", barcode, err, extra={"barcode": barcode})
+        return False
+    if not content:
+        return False
+    await run_in_threadpool(_write_atomically, path, content)
+    await run_in_threadpool(_remove_other_versions, barcode, version, directory)
+    return True
+
+
+def _load_image_urls(barcodes):
+    db = SessionLocal()
+    try:
+        return db.query(models.Product.barcode, models.Product.image_url).filter(
+            models.Product.barcode.in_(list(barcodes)), models.Product.image_url.isnot(None)
+        ).all()
+    finally:
+        db.close()
+
+
+# 🔄 Tâche de fond après insertion : copier les images des produits ajoutés
+async def mirror_product_images(barcodes, client: OFFClient, concurrency: int = PRODUCT_IMAGE_MIRROR_CONCURRENCY) -> int:
+    barcodes = [barcode for barcode in barcodes if is_valid_barcode(barcode)]
+    if not barcodes:
+        return 0
+    rows = await run_in_threadpool(_load_image_urls, barcodes)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def mirror(barcode, url):
+        async with semaphore:
+            return await mirror_image(barcode, url, client)
+
+    return sum(await asyncio.gather(*(mirror(barcode, url) for barcode, url in rows)))
+
+
+# 🖼️ Chemin de la variante demandée pour l'image_url actuelle, générée à la première demande ;
+# None si l'image ne peut pas être copiée
+async def get_variant(barcode: str, size: int, image_url: str, client: OFFClient) -> str | None:
+    version = image_version(image_url)
+    path = variant_path(barcode, version, size)
+    if await run_in_threadpool(os.path.exists, path):
+        return path
+    if not await mirror_image(barcode, image_url, client):
+        return None
+    return await render_fit_variant(original_path(barcode, version), path, size)
@@ -0,0 +1,103 @@
+import asyncio
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from ustock_api import models
+from ustock_api.database import insert_or_update
+from ustock_api.http_cache import product_etags
+from ustock_api.off_client import OFFClient, OFFUnavailable
+from ustock_api.settings import settings
+
+# Nombre de fiches récupérées en parallèle par import (laisse de la marge aux scans interactifs)
+BULK_IMPORT_CONCURRENCY = settings.bulk_import_concurrency
+
+VALID_NUTRISCORE = {'a', 'b', 'c', 'd', 'e'}
+PRODUCT_COLUMNS = ["product_name", "brand", "content_size", "nutriscore", "image_url"]
+
+
+# 🧾 Préparer une fiche pour la table `products` (Nutri-Score invalide => NULL)
+def normalize_product(product):
+    nutriscore = (product.get("nutriscore") or "").lower()
+    return {
+        "barcode": product["barcode"],
+        "product_name": product["product_name"],
+        "brand": product.get("brand"),
+        "content_size": product.get("content_size"),
+        "nutriscore": nutriscore if nutriscore in VALID_NUTRISCORE else None,
+        "image_url": product.get("image_url"),
+    }
+
+
+# Un GTIN/EAN valide ne contient que 8 à 14 chiffres
+def is_valid_barcode(barcode: str) -> bool:
+    return barcode.isdigit() and 8 <= len(barcode) <= 14
+
+
+# 🔍 Codes-barres déjà en base => id, en une requête IN par tranche
+def find_existing_barcodes(db: Session, barcodes, chunk_size: int = 1000):
+    found = {}
+    barcodes = list(barcodes)
+    for start in range(0, len(barcodes), chunk_size):
+        rows = db.query(models.Product.barcode, models.Product.id).filter(
+            models.Product.barcode.in_(barcodes[start:start + chunk_size])
+        ).all()
+        found.update(rows)
+    return found
+
+
+# 💾 Insertion multi-lignes, les doublons mettent à jour la fiche existante
+# `updated_at` ne bouge que si la fiche change : les workers de l'API relisent ces fiches
+# (index de recherche, ETag, voir invalidation.py), quel que soit le processus qui les a écrites
+def upsert_products(db: Session, products):
+    rows = [normalize_product(product) for product in products]
+    insert_or_update(db, models.Product.__table__, rows, ["barcode"], PRODUCT_COLUMNS, touch_column="updated_at")
+    db.commit()
+    # Ce processus n'attend pas le prochain passage : un If-None-Match ne doit plus donner 304
+    for row in rows:
+        product_etags.invalidate(row["barcode"])
+
+
+# 📦 Importer une liste de codes-barres : rapport de statut par code
+async def import_barcodes(db: Session, barcodes, client: OFFClient, concurrency: int = BULK_IMPORT_CONCURRENCY):
+    # Dédoublonner en gardant l'ordre de la demande
+    barcodes = list(dict.fromkeys(barcode.strip() for barcode in barcodes if barcode.strip()))
+    report = {barcode: {"barcode": barcode, "status": "invalid"} for barcode in barcodes}
+    valid = [barcode for barcode in barcodes if is_valid_barcode(barcode)]
+
+    existing = await run_in_threadpool(find_existing_barcodes, db, valid)
+    for barcode, product_id in existing.items():
+        report[barcode].update(status="exists", product_id=product_id)
+
+    # Récupérer les fiches manquantes en parallèle, avec une limite de concurrence
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(barcode):
+        async with semaphore:
+            try:
+                return barcode, await client.fetch_product(barcode), None
+            except OFFUnavailable as err:
+                return barcode, None, str(err)
+
+    missing = [barcode for barcode in valid if barcode not in existing]
+    fetched = []
+    for barcode, product, error in await asyncio.gather(*(fetch(barcode) for barcode in missing)):
+        if error:
+            report[barcode].update(status="error", detail=f"Open Food Facts indisponible : {error}")
+        elif product is None:
+            report[barcode]["status"] = "not_found"
+        else:
+            fetched.append(product)
+
+    if fetched:
+        await run_in_threadpool(upsert_products, db, fetched)
+        inserted = await run_in_threadpool(find_existing_barcodes, db, [product["barcode"] for product in fetched])
+        for barcode, product_id in inserted.items():
+            report[barcode].update(status="added", product_id=product_id)
+
+    return list(report.values())
+
+
+def summarize(results):
+    summary = {"added": 0, "exists": 0, "not_found": 0, "invalid": 0, "error": 0}
+    for result in results:
+        summary[result["status"]] += 1
+    return summary
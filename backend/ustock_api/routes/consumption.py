@@ -1,36 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.orm import Session, contains_eager
 from ustock_api.auth import get_current_user
+from ustock_api.changes import record_changes
 from ustock_api.database import get_db
-from ustock_api.schemas import ProductConsumptionCreate, ProductConsumptionResponse
+from ustock_api.schemas import (
+    ProductConsumptionBatchRequest,
+    ProductConsumptionBatchResponse,
+    ProductConsumptionCreate,
+    ProductConsumptionResponse,
+)
 from ustock_api import models
-from datetime import datetime
+from ustock_api.consumption_stats import get_product_breakdown, get_stats, record_consumptions
+from ustock_api.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, ndjson_response
+from ustock_api.product_images import thumbnail_responses, with_thumbnail
+from datetime import date, datetime
+from typing import Optional
 
 router = APIRouter(prefix="/consumption", tags=["Consumption"])
 
+# ➖ Décrément conditionnel en une requête : la vérification et l'écriture sont atomiques,
+# deux appareils qui consomment le même stock ne peuvent ni perdre une mise à jour ni passer sous zéro
+def _decrement_stock(db: Session, stock_id: int, user_id: int, quantity: int) -> bool:
+    stocks = models.Stock.__table__
+    result = db.execute(
+        update(stocks)
+        .where(stocks.c.id == stock_id, stocks.c.user_id == user_id, stocks.c.quantity >= quantity)
+        .values(quantity=stocks.c.quantity - quantity)
+    )
+    return result.rowcount == 1
+
+
+# Supprimer les stocks épuisés (la ligne reste verrouillée par le décrément jusqu'au commit)
+def _delete_depleted(db: Session, stock_ids):
+    stocks = models.Stock.__table__
+    db.execute(delete(stocks).where(stocks.c.id.in_(stock_ids), stocks.c.quantity <= 0))
+
+
 @router.post("/", response_model=ProductConsumptionResponse)
 def add_consumption(
     consumption_data: ProductConsumptionCreate, 
     db: Session = Depends(get_db), 
     current_user = Depends(get_current_user)
 ):
-    # Vérifier que le stock existe et appartient à l'utilisateur
-    stock = db.query(models.Stock).filter(
-        models.Stock.id == consumption_data.stock_id,
-        models.Stock.user_id == current_user.id
-    ).first()
-    
-    if not stock:
-        raise HTTPException(status_code=404, detail="Stock non trouvé ou n'appartient pas à l'utilisateur")
-    
-    # Vérifier que la quantité est valide
-    if consumption_data.quantity > stock.quantity:
+    if consumption_data.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantité invalide")
+
+    if not _decrement_stock(db, consumption_data.stock_id, current_user.id, consumption_data.quantity):
+        # Aucune ligne modifiée : stock absent (ou d'un autre utilisateur) ou quantité insuffisante
+        owned = db.query(models.Stock.id).filter(
+            models.Stock.id == consumption_data.stock_id,
+            models.Stock.user_id == current_user.id
+        ).first()
+        if not owned:
+            raise HTTPException(status_code=404, detail="Stock non trouvé ou n'appartient pas à l'utilisateur")
         raise HTTPException(status_code=400, detail="Quantité demandée supérieure à la quantité en stock")
-    
-    # Stocker les informations importantes avant de modifier le stock
-    product_id = stock.product_id
-    expiration_date = stock.expiration_date
+
+    # Informations du stock après le décrément
+    product_id, expiration_date, remaining = db.query(
+        models.Stock.product_id, models.Stock.expiration_date, models.Stock.quantity
+    ).filter(models.Stock.id == consumption_data.stock_id).one()
     
     # Créer l'entrée dans l'historique
     new_consumption = models.ProductConsumption(
@@ -43,86 +72,153 @@ def add_consumption(
     )
     
     db.add(new_consumption)
-    db.flush()  # S'assurer que l'insertion est réalisée avant de potentiellement supprimer le stock
-    
-    # Mettre à jour la quantité en stock
-    stock.quantity -= consumption_data.quantity
+    db.flush()
+    record_consumptions(db, [new_consumption])  # Agrégat mensuel, même transaction
     
     # Si la quantité devient 0, supprimer l'entrée du stock
-    if stock.quantity <= 0:
-        db.delete(stock)
+    if remaining <= 0:
+        _delete_depleted(db, [consumption_data.stock_id])
+        record_changes(db, current_user.id, stocks_deleted=[consumption_data.stock_id], consumptions=[new_consumption.id])
+    else:
+        record_changes(db, current_user.id, stocks_upserted=[consumption_data.stock_id], consumptions=[new_consumption.id])
     
     db.commit()
     db.refresh(new_consumption)
     
-    return new_consumption
+    return with_thumbnail(ProductConsumptionResponse.model_validate(new_consumption))
+
+@router.post("/batch", response_model=ProductConsumptionBatchResponse)
+def add_consumptions_in_batch(
+    payload: ProductConsumptionBatchRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    # Charger en une requête les stocks concernés appartenant à l'utilisateur (produit et date ne changent pas)
+    stock_ids = {item.stock_id for item in payload.items}
+    stocks = {
+        stock_id: (product_id, expiration_date)
+        for stock_id, product_id, expiration_date in db.query(
+            models.Stock.id, models.Stock.product_id, models.Stock.expiration_date
+        ).filter(
+            models.Stock.id.in_(stock_ids),
+            models.Stock.user_id == current_user.id
+        )
+    }
 
+    # Un décrément conditionnel par élément, dans l'ordre : chaque élément voit les précédents
+    now = datetime.now()
+    applied = []
+    results = {}
+    for index, item in enumerate(payload.items):
+        if item.stock_id not in stocks:
+            results[index] = {"index": index, "status": "error", "detail": "Stock non trouvé ou n'appartient pas à l'utilisateur"}
+        elif item.quantity <= 0 or not _decrement_stock(db, item.stock_id, current_user.id, item.quantity):
+            results[index] = {"index": index, "status": "error", "detail": "Quantité demandée supérieure à la quantité en stock"}
+        else:
+            product_id, expiration_date = stocks[item.stock_id]
+            consumption = models.ProductConsumption(
+                product_id=product_id,
+                user_id=current_user.id,
+                quantity=item.quantity,
+                status=item.status,
+                expiration_date=expiration_date,
+                consumption_date=now
+            )
+            db.add(consumption)
+            applied.append((index, item, consumption))
+
+    touched = {item.stock_id for _, item, _ in applied}
+    remaining = dict(
+        db.query(models.Stock.id, models.Stock.quantity).filter(models.Stock.id.in_(touched))
+    ) if touched else {}
+
+    # Supprimer les stocks épuisés
+    depleted = [stock_id for stock_id, quantity in remaining.items() if quantity <= 0]
+    if depleted:
+        _delete_depleted(db, depleted)
+
+    db.flush()  # Attribue les id de l'historique
+    record_consumptions(db, [consumption for _, _, consumption in applied])
+    # Quantité restante après chaque élément : on remonte depuis la quantité finale
+    for index, item, consumption in reversed(applied):
+        results[index] = {"index": index, "status": item.status, "consumption_id": consumption.id, "remaining_quantity": remaining[item.stock_id]}
+        remaining[item.stock_id] += item.quantity
+    record_changes(
+        db, current_user.id,
+        stocks_upserted=touched.difference(depleted),
+        stocks_deleted=depleted,
+        consumptions=[consumption.id for _, _, consumption in applied],
+    )
+    db.commit()
+
+    return {"results": [results[index] for index in range(len(payload.items))]}
+
+# Historique du plus récent au plus ancien, paginé par (consumption_date, id) avec `limit`,
+# complet sans `limit` (comme avant la pagination) ; format=ndjson pour tout exporter en flux
 @router.get("/", response_model=list[ProductConsumptionResponse])
 def get_consumption_history(
+    response: Response,
     status: str = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
     db: Session = Depends(get_db), 
     current_user = Depends(get_current_user)
 ):
-    query = db.query(models.ProductConsumption).filter(
-        models.ProductConsumption.user_id == current_user.id
-    )
-    
-    if status:
-        query = query.filter(models.ProductConsumption.status == status)
-    
-    return query.order_by(models.ProductConsumption.consumption_date.desc()).all()
+    user_id = current_user.id
+    after = None
+    if cursor:
+        last_date, last_id = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(last_date), int(last_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+    # `resume` : clé (date, id) du dernier élément déjà envoyé (lots successifs d'un export en flux)
+    def build_query(session, resume=None):
+        start = resume or after
+        query = (
+            session.query(models.ProductConsumption)
+            .join(models.ProductConsumption.product)
+            .options(contains_eager(models.ProductConsumption.product))
+            .filter(models.ProductConsumption.user_id == user_id)
+        )
+        if status:
+            query = query.filter(models.ProductConsumption.status == status)
+        if start:
+            # Clé de tri stable : la date seule peut se répéter (consommations groupées)
+            query = query.filter(or_(
+                models.ProductConsumption.consumption_date < start[0],
+                and_(models.ProductConsumption.consumption_date == start[0], models.ProductConsumption.id < start[1]),
+            ))
+        return query.order_by(models.ProductConsumption.consumption_date.desc(), models.ProductConsumption.id.desc())
+
+    if format == "ndjson":
+        return ndjson_response(
+            db, build_query, ProductConsumptionResponse,
+            lambda consumption: (consumption.consumption_date, consumption.id), prepare=with_thumbnail,
+        )
+
+    if limit is None:
+        return thumbnail_responses(ProductConsumptionResponse, build_query(db).all())
+
+    consumptions = build_query(db).limit(limit + 1).all()
+    if len(consumptions) > limit:
+        consumptions = consumptions[:limit]
+        last = consumptions[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.consumption_date.isoformat(), last.id)
+    return thumbnail_responses(ProductConsumptionResponse, consumptions)
 
 @router.get("/stats")
 def get_consumption_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    by_product: bool = False,
     db: Session = Depends(get_db), 
     current_user = Depends(get_current_user)
 ):
-    # Statistiques globales
-    consumed_count = db.query(func.sum(models.ProductConsumption.quantity)).filter(
-        models.ProductConsumption.user_id == current_user.id,
-        models.ProductConsumption.status == "consumed"
-    ).scalar() or 0
-    
-    wasted_count = db.query(func.sum(models.ProductConsumption.quantity)).filter(
-        models.ProductConsumption.user_id == current_user.id,
-        models.ProductConsumption.status == "wasted"
-    ).scalar() or 0
-    
-    total_count = consumed_count + wasted_count
-    waste_rate = (wasted_count / total_count * 100) if total_count > 0 else 0
-    
-    # Statistiques mensuelles
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    
-    monthly_consumed = db.query(func.sum(models.ProductConsumption.quantity)).filter(
-        models.ProductConsumption.user_id == current_user.id,
-        models.ProductConsumption.status == "consumed",
-        func.month(models.ProductConsumption.consumption_date) == current_month,
-        func.year(models.ProductConsumption.consumption_date) == current_year
-    ).scalar() or 0
-    
-    monthly_wasted = db.query(func.sum(models.ProductConsumption.quantity)).filter(
-        models.ProductConsumption.user_id == current_user.id,
-        models.ProductConsumption.status == "wasted",
-        func.month(models.ProductConsumption.consumption_date) == current_month,
-        func.year(models.ProductConsumption.consumption_date) == current_year
-    ).scalar() or 0
-    
-    monthly_total = monthly_consumed + monthly_wasted
-    monthly_waste_rate = (monthly_wasted / monthly_total * 100) if monthly_total > 0 else 0
-    
-    return {
-        "total": {
-            "consumed_count": int(consumed_count),
-            "wasted_count": int(wasted_count),
-            "total_count": int(total_count),
-            "waste_rate": round(waste_rate, 2)
-        },
-        "current_month": {
-            "consumed_count": int(monthly_consumed),
-            "wasted_count": int(monthly_wasted),
-            "total_count": int(monthly_total),
-            "waste_rate": round(monthly_waste_rate, 2)
-        }
-    }
\ No newline at end of file
+    """Statistiques lues dans l'agrégat mensuel ; les mois incomplets de `start`/`end` (inclus) sont relus dans l'historique"""
+    stats = get_stats(db, current_user.id, start, end)
+    if by_product:
+        stats["products"] = get_product_breakdown(db, current_user.id, start, end)
+    return stats
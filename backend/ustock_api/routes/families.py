@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from datetime import date
+from typing import Optional
+from ustock_api import models
+from ustock_api.auth import get_current_user
+from ustock_api.consumption_stats import get_family_stats
+from ustock_api.database import get_db
+from ustock_api.product_images import with_thumbnail
+from ustock_api.schemas import FamilyInventoryItem, ProductResponse
+
+router = APIRouter(prefix="/families", tags=["Familles"])
+
+
+# users.family_id seul ne suffit pas : l'appartenance est vérifiée dans user_families
+def _family_id(db: Session, current_user) -> int:
+    if current_user.family_id is None:
+        raise HTTPException(status_code=404, detail="Aucune famille associée à cet utilisateur")
+    member = db.query(models.UserFamily.id).filter(
+        models.UserFamily.user_id == current_user.id,
+        models.UserFamily.family_id == current_user.family_id,
+    ).first()
+    if member is None:
+        raise HTTPException(status_code=403, detail="Vous n'êtes pas membre de cette famille")
+    return current_user.family_id
+
+
+# 👪 Inventaire commun de la famille, agrégé en SQL par (produit, date d'expiration)
+# Le GROUP BY (member_count compris) est lu dans ix_stocks_family_product_expiration ; les produits sont joints ensuite
+@router.get("/me/inventory", response_model=list[FamilyInventoryItem])
+def get_family_inventory(
+    expires_before: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    family_id = _family_id(db, current_user)
+    grouped = (
+        select(
+            models.Stock.product_id,
+            models.Stock.expiration_date,
+            func.sum(models.Stock.quantity).label("quantity"),
+            func.count().label("stock_count"),
+            func.count(func.distinct(models.Stock.user_id)).label("member_count"),
+        )
+        .where(models.Stock.family_id == family_id)
+        .group_by(models.Stock.product_id, models.Stock.expiration_date)
+    )
+    if expires_before is not None:
+        grouped = grouped.where(models.Stock.expiration_date <= expires_before)
+    grouped = grouped.subquery()
+
+    rows = (
+        db.query(models.Product, grouped.c.expiration_date, grouped.c.quantity, grouped.c.stock_count, grouped.c.member_count)
+        .join(grouped, grouped.c.product_id == models.Product.id)
+        # Les dates les plus proches d'abord, les produits sans date à la fin
+        .order_by(grouped.c.expiration_date.is_(None), grouped.c.expiration_date, models.Product.id)
+        .all()
+    )
+    return [
+        {
+            "product": with_thumbnail(ProductResponse.model_validate(product)),
+            "expiration_date": expiration_date,
+            "quantity": int(quantity),
+            "stock_count": stock_count,
+            "member_count": member_count,
+        }
+        for product, expiration_date, quantity, stock_count, member_count in rows
+    ]
+
+
+# 📊 Consommation et gaspillage de la famille, avec le détail par membre (agrégat mensuel)
+@router.get("/me/stats")
+def get_family_consumption_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Statistiques lues dans l'agrégat mensuel ; les mois incomplets de `start`/`end` (inclus) sont relus dans l'historique"""
+    return get_family_stats(db, _family_id(db, current_user), start, end)
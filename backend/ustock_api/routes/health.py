@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+from ustock_api.auth import require_internal_token, user_cache
+from ustock_api.cache import off_product_cache, off_search_cache
+from ustock_api.database import get_pool_stats
+from ustock_api.search_index import product_index
+
+# Diagnostics internes : tous réservés à la supervision (INTERNAL_TOKEN)
+router = APIRouter(prefix="/health", tags=["Santé"], dependencies=[Depends(require_internal_token)])
+
+# 📊 Statistiques du pool de connexions MySQL
+@router.get("/db-pool")
+def db_pool_stats():
+    return get_pool_stats()
+
+# 📊 Compteurs des caches Open Food Facts
+@router.get("/off-cache")
+def off_cache_stats():
+    return {"products": off_product_cache.stats(), "search": off_search_cache.stats()}
+
+# 📊 Compteurs du cache d'authentification
+@router.get("/auth-cache")
+def auth_cache_stats():
+    return user_cache.stats()
+
+# 📊 État de l'index de recherche local
+@router.get("/search-index")
+def search_index_stats():
+    return product_index.stats()
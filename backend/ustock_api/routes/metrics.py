@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Depends, Response
+from ustock_api.auth import require_internal_token
+from ustock_api.metrics import render_metrics
+
+router = APIRouter(tags=["Santé"])
+
+# 📈 Métriques au format Prometheus (latences, requêtes SQL, Open Food Facts, bcrypt, pool, caches), interne : INTERNAL_TOKEN
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(require_internal_token)])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
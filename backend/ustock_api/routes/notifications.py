@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Optional
+from ustock_api import models
+from ustock_api.auth import get_current_user
+from ustock_api.database import get_db
+from ustock_api.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from ustock_api.schemas import NotificationResponse
+
+router = APIRouter(prefix="/notifications", tags=["Notifications"])
+
+
+# 🔔 Notifications de l'utilisateur, les plus récentes d'abord (pagination par clé sur l'id)
+@router.get("/", response_model=list[NotificationResponse])
+def get_notifications(
+    response: Response,
+    unread_only: bool = False,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    query = db.query(models.Notification).filter(models.Notification.user_id == current_user.id)
+    if unread_only:
+        query = query.filter(models.Notification.read_at.is_(None))
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        if not isinstance(last_id, int):
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+        query = query.filter(models.Notification.id < last_id)
+
+    notifications = query.order_by(models.Notification.id.desc()).limit(limit + 1).all()
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(notifications[-1].id)
+    return notifications
+
+
+# ✅ Marquer une notification comme lue
+@router.post("/{notification_id}/read")
+def mark_notification_read(notification_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    updated = db.query(models.Notification).filter(
+        models.Notification.id == notification_id,
+        models.Notification.user_id == current_user.id,
+    ).update({models.Notification.read_at: func.coalesce(models.Notification.read_at, func.now())}, synchronize_session=False)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Notification non trouvée")
+    db.commit()
+    return {"message": "Notification marquée comme lue"}
@@ -1,8 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from typing import Optional
 from ustock_api import schemas, models
+from ustock_api.cache import MISSING
+from ustock_api.changes import get_catalogue_version, invalidate_catalogue_version
 from ustock_api.database import get_db
-import requests
+from ustock_api.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, json_array_response, ndjson_response
+from ustock_api.http_cache import (
+    PRODUCT_CACHE_CONTROL,
+    etag_matches,
+    file_response,
+    json_response,
+    make_etag,
+    not_modified,
+    product_etags,
+)
+from ustock_api.off_client import OFFUnavailable, get_off_client
+from ustock_api.product_import import import_barcodes, is_valid_barcode, summarize
+from ustock_api.search_index import index_barcodes, product_index
+from ustock_api.product_images import (
+    IMAGE_VERSION,
+    PRODUCT_IMAGE_DEFAULT_SIZE,
+    PRODUCT_IMAGE_SIZES,
+    get_variant,
+    image_version,
+    mirror_product_images,
+    product_image_url,
+    thumbnail_responses,
+    variant_path,
+    with_thumbnail,
+)
 import sys
 import os
 
@@ -12,68 +41,174 @@ chemin_parent = os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")
 # Ajoute ce chemin à sys.path
 sys.path.append(chemin_parent)
 
-from openfoodfact import fetch_product_from_api, check_product_exists, insert_product_into_db
+from openfoodfact import check_product_exists, insert_product_into_db
 
 router = APIRouter(prefix="/products", tags=["Produits"])
 
-# 🔍 Récupérer tous les produits
+# 🔍 Catalogue paginé par id avec `limit` (curseur dans X-Next-Cursor), complet sans `limit`
+# (tableau JSON envoyé en flux, comme avant la pagination), ou exporté en NDJSON avec format=ndjson
+# ETag = version du catalogue : 304 sans relire la table
 @router.get("/", response_model=list[schemas.ProductResponse])
-def get_products(db: Session = Depends(get_db)):
-    return db.query(models.Product).all()
+def get_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db),
+):
+    last_id = decode_cursor(cursor, 1)[0] if cursor else 0
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+    # `after` : id du dernier produit déjà envoyé (lots successifs d'un export en flux)
+    def build_query(session, after=None):
+        start = last_id if after is None else after
+        return session.query(models.Product).filter(models.Product.id > start).order_by(models.Product.id)
+
+    def page_key(product):
+        return product.id
+
+    if format == "ndjson":
+        return ndjson_response(db, build_query, schemas.ProductResponse, page_key, prepare=with_thumbnail)
+
+    etag = make_etag("products", get_catalogue_version(db), request.url.query)
+    if etag_matches(request, etag):
+        return not_modified(etag, PRODUCT_CACHE_CONTROL)
+    if limit is None:
+        return json_array_response(
+            db, build_query, schemas.ProductResponse, page_key,
+            headers={"ETag": etag, "Cache-Control": PRODUCT_CACHE_CONTROL}, prepare=with_thumbnail,
+        )
+    products = build_query(db).limit(limit + 1).all()
+    response = json_response(
+        request, thumbnail_responses(schemas.ProductResponse, products[:limit]), PRODUCT_CACHE_CONTROL, etag
+    )
+    if len(products) > limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(products[limit - 1].id)
+    return response
 
 # ➕ Ajouter un produit via son code-barres
 @router.post("/")
-def add_product_by_barcode(barcode: str, db: Session = Depends(get_db)):
-    # Vérifier si le produit est déjà en base
-    if check_product_exists(barcode):
+async def add_product_by_barcode(barcode: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    # Vérifier si le produit est déjà en base (requête bloquante, hors de la boucle d'événements)
+    if await run_in_threadpool(check_product_exists, barcode, db):
         raise HTTPException(status_code=409, detail="Le produit existe déjà en base.")
 
     # Récupérer les infos depuis Open Food Facts
-    product = fetch_product_from_api(barcode)
+    try:
+        product = await get_off_client().fetch_product(barcode)
+    except OFFUnavailable as e:
+        raise HTTPException(status_code=502, detail=f"Open Food Facts indisponible : {str(e)}")
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé sur Open Food Facts.")
 
     # Ajouter le produit en base
-    insert_product_into_db(product)
+    await run_in_threadpool(insert_product_into_db, product, db)
+    await run_in_threadpool(index_barcodes, db, [barcode])
+    invalidate_catalogue_version()
+    # Copier l'image dans notre stockage après la réponse
+    background_tasks.add_task(mirror_product_images, [barcode], get_off_client())
 
     return {"message": "Produit ajouté avec succès", "product": product}
 
-# 🔍 Rechercher un produit par code-barres
+# 📦 Ajouter une liste de codes-barres en une requête
+@router.post("/bulk", response_model=schemas.BulkImportResponse)
+async def add_products_in_bulk(payload: schemas.BulkImportRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    results = await import_barcodes(db, payload.barcodes, get_off_client())
+    added = [result["barcode"] for result in results if result["status"] == "added"]
+    if added:
+        await run_in_threadpool(index_barcodes, db, added)
+        invalidate_catalogue_version()
+        background_tasks.add_task(mirror_product_images, added, get_off_client())
+    return {"results": results, "summary": summarize(results)}
+
+# 🔎 Rechercher un produit par nom
+# Déclarée avant /{barcode}/image : sinon GET /products/search/image serait pris pour une image
+@router.get("/search/{query}")
+async def search_products(
+    query: str,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    """Recherche de produits par nom ou marque dans le catalogue local, Open Food Facts en repli"""
+    if product_index.ready:
+        ids, total = await run_in_threadpool(product_index.search, query, (page - 1) * limit, limit)
+        if total:
+            products = await run_in_threadpool(
+                lambda: {product.id: product for product in db.query(models.Product).filter(models.Product.id.in_(ids))}
+            )
+            results = [_search_result(products[product_id]) for product_id in ids if product_id in products]
+            return {"results": results, "source": "local", "page": page, "total": total}
+
+    # Aucun résultat local : interroger Open Food Facts (première page uniquement)
+    if page > 1:
+        return {"results": [], "source": "openfoodfacts", "page": page, "total": 0}
+    try:
+        results = await get_off_client().search(query, limit=limit)
+    except OFFUnavailable as e:
+        raise HTTPException(status_code=502, detail=f"Erreur lors de la recherche: {str(e)}")
+    return {"results": results, "source": "openfoodfacts", "page": page, "total": len(results)}
+
+# 🔍 Rechercher un produit par code-barres (ETag déjà connu => 304 sans requête SQL)
 @router.get("/{barcode}", response_model=schemas.ProductResponse)
-def get_product(barcode: str, db: Session = Depends(get_db)):
+def get_product(barcode: str, request: Request, db: Session = Depends(get_db)):
+    known_etag = product_etags.get(barcode)
+    if known_etag is not MISSING and etag_matches(request, known_etag):
+        return not_modified(known_etag, PRODUCT_CACHE_CONTROL)
+
     product = db.query(models.Product).filter(models.Product.barcode == barcode).first()
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
-    return product
+    response = json_response(request, with_thumbnail(schemas.ProductResponse.model_validate(product)), PRODUCT_CACHE_CONTROL)
+    product_etags.set(barcode, response.headers["ETag"])
+    return response
 
+# 🖼️ Image d'un produit redimensionnée, servie depuis notre copie locale
+# `v` (version de l'image_url, voir product_images) : une URL versionnée ne change jamais de
+# contenu et peut être mise en cache un an ; sans `v` ou avec une ancienne version, redirection
+# vers l'URL de l'image actuelle
+@router.get("/{barcode}/image")
+async def get_product_image(
+    barcode: str,
+    request: Request,
+    size: int = Query(PRODUCT_IMAGE_DEFAULT_SIZE),
+    v: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    if size not in PRODUCT_IMAGE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Taille invalide (valeurs possibles : {', '.join(map(str, PRODUCT_IMAGE_SIZES))})")
+    if not is_valid_barcode(barcode) or (v is not None and not IMAGE_VERSION.match(v)):
+        raise HTTPException(status_code=404, detail="Image non trouvée")
 
-# Dans ustock_api/routes/products.py
-@router.get("/search/{query}")
-def search_products(query: str, db: Session = Depends(get_db)):
-    """Recherche de produits par nom via OpenFoodFacts"""
-    url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={query}&search_simple=1&action=process&json=1"
-    
-    try:
-        response = requests.get(url)
-        data = response.json()
-        
-        if "products" not in data or len(data["products"]) == 0:
-            return {"results": []}
-        
-        # Formater les résultats
-        results = []
-        for product in data["products"][:10]:  # Limiter à 10 résultats
-            result = {
-                "product_name": product.get("product_name", ""),
-                "brand": product.get("brands", ""),
-                "image_url": product.get("image_url", ""),
-                "barcode": product.get("code", ""),
-                "nutriscore": product.get("nutriscore_grade", ""),
-                "content_size": product.get("quantity", "")
-            }
-            results.append(result)
-        
-        return {"results": results}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
-    
+    # Variante déjà générée pour cette version : aucune requête SQL
+    if v is not None:
+        path = variant_path(barcode, v, size)
+        if await run_in_threadpool(os.path.exists, path):
+            return await run_in_threadpool(file_response, request, path, "image/webp")
+
+    image_url = await run_in_threadpool(
+        lambda: db.query(models.Product.image_url).filter(models.Product.barcode == barcode).scalar()
+    )
+    if not image_url:
+        raise HTTPException(status_code=404, detail="Image non trouvée")
+    if v != image_version(image_url):
+        return RedirectResponse(product_image_url(barcode, image_url, size), status_code=307)
+
+    path = await get_variant(barcode, size, image_url, get_off_client())
+    if path is None:
+        # Copie impossible (OFF injoignable, hôte refusé) : renvoyer vers l'image d'origine
+        return RedirectResponse(image_url, status_code=307)
+    return await run_in_threadpool(file_response, request, path, "image/webp")
+
+
+# Même forme que les résultats Open Food Facts (chaînes vides plutôt que null)
+def _search_result(product: models.Product):
+    return {
+        "product_name": product.product_name or "",
+        "brand": product.brand or "",
+        "image_url": product.image_url or "",
+        "barcode": product.barcode,
+        "nutriscore": product.nutriscore or "",
+        "content_size": product.content_size or "",
+    }
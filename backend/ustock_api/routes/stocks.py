@@ -1,61 +1,193 @@
-from fastapi import APIRouter, Depends, HTTPException, status   
-from sqlalchemy.orm import Session
+from collections import defaultdict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.orm import Session, contains_eager
+from typing import Optional
+from datetime import date
 from ustock_api.auth import get_current_user
-from ustock_api.database import get_db
-from ustock_api.schemas import StockCreate, StockResponse
+from ustock_api.changes import get_catalogue_version, get_stock_version, record_changes
+from ustock_api.database import get_db, insert_or_update
+from ustock_api.expiry_alerts import EXPIRY_ALERT_DAYS, expiry_window
+from ustock_api.http_cache import PRIVATE_CACHE_CONTROL, etag_matches, make_etag, not_modified
+from ustock_api.schemas import StockBatchRequest, StockBatchResponse, StockCreate, StockResponse
 from ustock_api import models
+from ustock_api.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from ustock_api.product_images import thumbnail_responses, with_thumbnail
 
 
 router = APIRouter(prefix="/stocks", tags=["Stocks"])
 
+# ➕ Upsert atomique sur la clé unique (user_id, product_id, expiration_key) : la quantité est
+# incrémentée par la base, deux appareils qui ajoutent en même temps ne perdent aucune unité
+def _upsert_stocks(db: Session, user, quantities):
+    insert_or_update(
+        db, models.Stock.__table__,
+        [
+            {
+                "product_id": product_id,
+                "user_id": user.id,
+                "family_id": user.family_id,  # Partagé avec la famille (GET /families/me/inventory)
+                "quantity": quantity,
+                "expiration_date": expiration_date,
+            }
+            for (product_id, expiration_date), quantity in quantities.items()
+        ],
+        conflict_columns=["user_id", "product_id", "expiration_key"],
+        increment_columns=["quantity"],
+    )
+
+
 # 🔹 Ajouter un produit à l'inventaire d'un utilisateur
 @router.post("/", response_model=StockResponse)
 def add_product_to_user(stock_data: StockCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    # Même règle que /stocks/batch : une quantité nulle ou négative corromprait le stock existant
+    if stock_data.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantité invalide")
     product = db.query(models.Product).filter(models.Product.id == stock_data.product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
 
-    # Vérifier si ce produit est déjà dans le stock de l'utilisateur avec la MÊME DATE D'EXPIRATION
-    existing_stock = db.query(models.Stock).filter(
-        models.Stock.user_id == current_user.id,
-        models.Stock.product_id == stock_data.product_id,
-        models.Stock.expiration_date == stock_data.expiration_date  # Ajout de cette condition
-    ).first()
-
-    if existing_stock:
-        existing_stock.quantity += stock_data.quantity  # Ajouter à la quantité existante
-    else:
-        new_stock = models.Stock(
-            product_id=stock_data.product_id,
-            user_id=current_user.id,
-            quantity=stock_data.quantity,
-            expiration_date=stock_data.expiration_date
+    # Même produit avec la MÊME DATE D'EXPIRATION : la quantité s'ajoute à la ligne existante
+    _upsert_stocks(db, current_user, {(stock_data.product_id, stock_data.expiration_date): stock_data.quantity})
+    stock = (
+        db.query(models.Stock)
+        .join(models.Stock.product)
+        .options(contains_eager(models.Stock.product))
+        .filter(
+            models.Stock.user_id == current_user.id,
+            models.Stock.product_id == stock_data.product_id,
+            models.Stock.expiration_date == stock_data.expiration_date,  # IS NULL si aucune date
         )
-        db.add(new_stock)
+        .one()
+    )
+    record_changes(db, current_user.id, stocks_upserted=[stock.id])
+    db.commit()
+    return with_thumbnail(StockResponse.model_validate(stock))
+
+# 🔹 Ajouter plusieurs produits en une requête (une seule transaction, un seul upsert)
+@router.post("/batch", response_model=StockBatchResponse)
+def add_products_to_user_in_batch(payload: StockBatchRequest, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    product_ids = {item.product_id for item in payload.items}
+    known_products = {
+        product_id for (product_id,) in db.query(models.Product.id).filter(models.Product.id.in_(product_ids))
+    }
 
+    # Quantités regroupées par clé (une clé ne peut apparaître qu'une fois dans l'INSERT)
+    results = {}
+    accepted = []
+    quantities = defaultdict(int)
+    for index, item in enumerate(payload.items):
+        if item.product_id not in known_products:
+            results[index] = {"index": index, "status": "error", "detail": "Produit non trouvé"}
+        elif item.quantity <= 0:
+            results[index] = {"index": index, "status": "error", "detail": "Quantité invalide"}
+        else:
+            key = (item.product_id, item.expiration_date)
+            quantities[key] += item.quantity
+            accepted.append((index, key, item.quantity))
+
+    if accepted:
+        # Lignes déjà présentes (même vides) : le premier ajout sur ces clés est une mise à jour
+        existing = {
+            key for key in db.query(models.Stock.product_id, models.Stock.expiration_date).filter(
+                models.Stock.user_id == current_user.id,
+                models.Stock.product_id.in_({product_id for product_id, _ in quantities}),
+            )
+        }
+        _upsert_stocks(db, current_user, quantities)
+        stocks = {
+            (stock.product_id, stock.expiration_date): stock
+            for stock in db.query(models.Stock).filter(
+                models.Stock.user_id == current_user.id,
+                models.Stock.product_id.in_({product_id for product_id, _ in quantities}),
+            )
+        }
+        # Quantité après chaque élément : quantité finale moins les ajouts des éléments suivants de la même clé
+        remaining = {key: stocks[key].quantity for key in quantities}
+        first_item = {}
+        for index, key, _ in accepted:
+            first_item.setdefault(key, index)
+        for index, key, quantity in reversed(accepted):
+            stock = stocks[key]
+            after = remaining[key]
+            remaining[key] -= quantity
+            # Seul le premier élément d'une clé absente avant l'appel a créé la ligne
+            status_ = "created" if key not in existing and first_item[key] == index else "updated"
+            results[index] = {"index": index, "status": status_, "stock_id": stock.id, "quantity": after}
+        record_changes(db, current_user.id, stocks_upserted=[stocks[key].id for key in quantities])
     db.commit()
-    return db.query(models.Stock).filter(models.Stock.user_id == current_user.id, models.Stock.product_id == stock_data.product_id).first()
 
-# 🔹 Récupérer tous les produits d'un utilisateur
+    return {"results": [results[index] for index in range(len(payload.items))]}
+
+# 🔹 Récupérer les produits d'un utilisateur (une seule requête, produits chargés par jointure)
+# ETag = version du stock de l'utilisateur + version du catalogue + paramètres : 304 sans relire les stocks
 @router.get("/", response_model=list[StockResponse])
-def get_user_stocks(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    stocks = db.query(models.Stock).filter(models.Stock.user_id == current_user.id).all()
-
-    # Charger les détails des produits
-    stocks_with_products = []
-    for stock in stocks:
-        product = db.query(models.Product).filter(models.Product.id == stock.product_id).first()
-        if product:
-            stock_data = StockResponse(
-                id=stock.id,
-                quantity=stock.quantity,
-                expiration_date=stock.expiration_date,
-                product=product  # On ajoute les détails du produit
-            )
-            stocks_with_products.append(stock_data)
+def get_user_stocks(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    product_id: Optional[int] = None,
+    expires_after: Optional[date] = None,
+    expires_before: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    # Lire la version avant les données : une modification concurrente donnera au pire un ETag déjà périmé
+    etag = make_etag("stocks", current_user.id, get_stock_version(db, current_user.id), get_catalogue_version(db), request.url.query)
+    if etag_matches(request, etag):
+        return not_modified(etag, PRIVATE_CACHE_CONTROL)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = PRIVATE_CACHE_CONTROL
+
+    query = (
+        db.query(models.Stock)
+        .join(models.Stock.product)
+        .options(contains_eager(models.Stock.product))
+        .filter(models.Stock.user_id == current_user.id)
+    )
+
+    if product_id is not None:
+        query = query.filter(models.Stock.product_id == product_id)
+    if expires_after is not None:
+        query = query.filter(models.Stock.expiration_date >= expires_after)
+    if expires_before is not None:
+        query = query.filter(models.Stock.expiration_date <= expires_before)
+
+    # Pagination par clé (keyset) sur l'id : pas d'OFFSET, coût constant quelle que soit la page
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        if not isinstance(last_id, int):
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+        query = query.filter(models.Stock.id > last_id)
+
+    query = query.order_by(models.Stock.id)
+    if limit is None:
+        return thumbnail_responses(StockResponse, query.all())
+
+    stocks = query.limit(limit + 1).all()
+    if len(stocks) > limit:
+        stocks = stocks[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(stocks[-1].id)
+    return thumbnail_responses(StockResponse, stocks)
 
-    return stocks_with_products
 
+# 🔹 Produits qui expirent bientôt (parcours par plage sur (user_id, expiration_date), plus proches d'abord)
+@router.get("/expiring", response_model=list[StockResponse])
+def get_expiring_stocks(
+    days: int = Query(EXPIRY_ALERT_DAYS, ge=1, le=365),
+    include_expired: bool = False,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    stocks = (
+        db.query(models.Stock)
+        .join(models.Stock.product)
+        .options(contains_eager(models.Stock.product))
+        .filter(models.Stock.user_id == current_user.id, *expiry_window(date.today(), days, None if include_expired else 0))
+        .order_by(models.Stock.expiration_date, models.Stock.id)
+        .all()
+    )
+    return thumbnail_responses(StockResponse, stocks)
 
 
 # 🔹 Supprimer un produit du stock d'un utilisateur
@@ -67,5 +199,6 @@ def remove_product_from_user(stock_id: int, db: Session = Depends(get_db), curre
         raise HTTPException(status_code=404, detail="Stock non trouvé")
 
     db.delete(stock)
+    record_changes(db, current_user.id, stocks_deleted=[stock.id])
     db.commit()
     return {"message": "Produit retiré du stock"}
\ No newline at end of file
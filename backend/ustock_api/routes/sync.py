@@ -0,0 +1,100 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session, contains_eager
+from typing import Optional
+from ustock_api import models
+from ustock_api.auth import get_current_user
+from ustock_api.changes import get_stock_version
+from ustock_api.database import get_db
+from ustock_api.pagination import decode_cursor, encode_cursor
+from ustock_api.product_images import thumbnail_responses
+from ustock_api.schemas import ProductConsumptionResponse, StockResponse, SyncResponse
+from ustock_api.settings import settings
+
+router = APIRouter(prefix="/sync", tags=["Synchronisation"])
+
+# Nombre maximal de versions (transactions) renvoyées par appel ; au-delà, has_more = true
+SYNC_MAX_VERSIONS = settings.sync_max_versions
+
+
+def _stocks(db: Session, user_id: int, stock_ids=None):
+    query = (
+        db.query(models.Stock)
+        .join(models.Stock.product)
+        .options(contains_eager(models.Stock.product))
+        .filter(models.Stock.user_id == user_id)
+    )
+    if stock_ids is not None:
+        query = query.filter(models.Stock.id.in_(stock_ids))
+    return thumbnail_responses(StockResponse, query.order_by(models.Stock.id).all())
+
+
+def _consumptions(db: Session, user_id: int, consumption_ids):
+    consumptions = (
+        db.query(models.ProductConsumption)
+        .join(models.ProductConsumption.product)
+        .options(contains_eager(models.ProductConsumption.product))
+        .filter(models.ProductConsumption.user_id == user_id, models.ProductConsumption.id.in_(consumption_ids))
+        .order_by(models.ProductConsumption.id)
+        .all()
+    )
+    return thumbnail_responses(ProductConsumptionResponse, consumptions)
+
+
+def _expired():
+    return HTTPException(status_code=410, detail="Jeton de synchronisation expiré : refaire une synchronisation complète")
+
+
+# 🔄 Changements du stock depuis le dernier jeton (sans `since` : inventaire complet + jeton)
+@router.get("", response_model=SyncResponse)
+def sync(since: Optional[str] = None, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    user_id = current_user.id
+    # Lire la version avant les données : un changement concurrent sera au pire renvoyé deux fois
+    current = get_stock_version(db, user_id)
+
+    if since is None:
+        return {
+            "token": encode_cursor(current), "full": True, "has_more": False,
+            "stocks": _stocks(db, user_id), "deleted_stocks": [], "consumptions": [],
+        }
+
+    (version,) = decode_cursor(since, 1)
+    if not isinstance(version, int) or version > current:
+        raise _expired()
+    if version == current:
+        return {"token": since, "full": False, "has_more": False, "stocks": [], "deleted_stocks": [], "consumptions": []}
+
+    # Versions suivantes, par transaction entière (une transaction n'est jamais coupée en deux)
+    versions = [
+        row_version for (row_version,) in db.query(models.ChangeLog.version)
+        .filter(models.ChangeLog.user_id == user_id, models.ChangeLog.version > version)
+        .distinct()
+        .order_by(models.ChangeLog.version)
+        .limit(SYNC_MAX_VERSIONS + 1)
+    ]
+    # Les versions d'un utilisateur sont consécutives : un trou signifie que le journal a été purgé
+    if not versions or versions[0] != version + 1:
+        raise _expired()
+    has_more = len(versions) > SYNC_MAX_VERSIONS
+    upto = versions[min(len(versions), SYNC_MAX_VERSIONS) - 1]
+
+    # Dernière action par entité (un stock modifié puis supprimé n'est renvoyé que supprimé)
+    latest = {}
+    for entity, entity_id, action in (
+        db.query(models.ChangeLog.entity, models.ChangeLog.entity_id, models.ChangeLog.action)
+        .filter(models.ChangeLog.user_id == user_id, models.ChangeLog.version > version, models.ChangeLog.version <= upto)
+        .order_by(models.ChangeLog.version, models.ChangeLog.id)
+    ):
+        latest[(entity, entity_id)] = action
+
+    upserted = [entity_id for (entity, entity_id), action in latest.items() if entity == "stock" and action == "upsert"]
+    deleted = [entity_id for (entity, entity_id), action in latest.items() if entity == "stock" and action == "delete"]
+    consumed = [entity_id for (entity, entity_id), action in latest.items() if entity == "consumption"]
+    return {
+        "token": encode_cursor(upto),
+        "full": False,
+        "has_more": has_more,
+        # Un stock absent ici a été supprimé dans une version ultérieure (renvoyée au prochain appel)
+        "stocks": _stocks(db, user_id, upserted) if upserted else [],
+        "deleted_stocks": sorted(deleted),
+        "consumptions": _consumptions(db, user_id, consumed) if consumed else [],
+    }
@@ -1,24 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import timedelta, datetime
-from ustock_api.auth import authenticate_user, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user, pwd_context
-from ustock_api.database import get_db
-from ustock_api.schemas import UserCreate, UserResponse, UserLogin, TokenResponse
+from ustock_api.auth import authenticate_user, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user, invalidate_user_cache
+from ustock_api.passwords import hash_password
+from ustock_api.database import SessionLocal, get_db
+from ustock_api.images import PROFILE_IMAGE_CLEANUP_GRACE, PROFILE_IMAGE_DIR, delete_profile_images, profile_image_url, render_profile_variants, save_upload
+from ustock_api.schemas import AccountDeletionJobResponse, UserCreate, UserResponse, UserLogin, TokenResponse
+from ustock_api.account_deletion import (
+    ACCOUNT_DELETE_INLINE_MAX_ROWS,
+    count_user_rows,
+    create_deletion_job,
+    purge_user,
+    record_completed_deletion,
+    remove_profile_images,
+    run_deletion_job,
+)
 import ustock_api.models as models
 from ustock_api.models import User
+import logging
 import os
 import uuid
 
 router = APIRouter(prefix="/users", tags=["Utilisateurs"])
 
+logger = logging.getLogger(__name__)
+# Une ligne par connexion : journal échantillonné (voir LOG_SAMPLING)
+login_logger = logging.getLogger(__name__ + ".login")
+
 # 🔹 Route pour s'inscrire (création d'un utilisateur)
 @router.post("/register", response_model=UserResponse)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.username == user_data.username).first()
+async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+    existing_user = await run_in_threadpool(
+        lambda: db.query(models.User).filter(models.User.username == user_data.username).first()
+    )
     if existing_user:
         raise HTTPException(status_code=400, detail="Nom d'utilisateur déjà pris.")
+    # N'importe qui peut s'inscrire : rejoindre une famille passe par family_membership, pas par ce champ
+    if user_data.family_id is not None:
+        raise HTTPException(status_code=400, detail="Impossible de rejoindre une famille à l'inscription.")
 
-    hashed_password = pwd_context.hash(user_data.password)
+    # bcrypt dans le pool de processus dédié
+    hashed_password = await hash_password(user_data.password)
 
     new_user = models.User(
         first_name=user_data.first_name,
@@ -27,21 +50,23 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
         username=user_data.username,
         gender=user_data.gender,
         password_hash=hashed_password,
-        family_id=user_data.family_id if user_data.family_id is not None else None,
         created_at=datetime.now(),
         updated_at=datetime.now()
     )
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    def save():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+
+    await run_in_threadpool(save)
 
     return new_user
 
 # 🔹 Route pour se connecter et obtenir un token JWT
 @router.post("/login", response_model=TokenResponse)
-def login_for_access_token(form_data: UserLogin, db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: UserLogin, db: Session = Depends(get_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Nom d'utilisateur ou mot de passe invalide")
 
@@ -49,7 +74,7 @@ def login_for_access_token(form_data: UserLogin, db: Session = Depends(get_db)):
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": user.username, "id": user.id, "email": user.email}, expires_delta=access_token_expires)
 
-    print(f"✅ Token créé avec une durée de vie de {ACCESS_TOKEN_EXPIRE_MINUTES} minutes (48h)")
+    login_logger.info("✅ Connexion de l'utilisateur %s", user.id, extra={"user_id": user.id, "token_minutes": ACCESS_TOKEN_EXPIRE_MINUTES})
     
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -73,85 +98,116 @@ def read_users_me(current_user: models.User = Depends(get_current_user)):
         "created_at": current_user.created_at.isoformat() if current_user.created_at else None
     }
     
-    print(f"📅 Date formatée pour iOS: {user_data['created_at']}")
+    logger.debug("📅 Date formatée pour iOS : %s", user_data["created_at"])
     return user_data
 
 # 🔹 Route pour supprimer le compte utilisateur
 @router.delete("/me")
-def delete_user_account(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_user_account(background_tasks: BackgroundTasks, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     """
     Supprime complètement le compte utilisateur et toutes ses données associées
+    (requêtes ensemblistes ; les très gros comptes sont confiés à un job d'arrière-plan)
     """
     try:
         user_id = current_user.id
-        
-        # 1. Supprimer tous les stocks de l'utilisateur
-        user_stocks = db.query(models.Stock).filter(models.Stock.user_id == user_id).all()
-        for stock in user_stocks:
-            db.delete(stock)
-        
-        # 2. Supprimer l'historique de consommation de l'utilisateur
-        user_consumptions = db.query(models.ProductConsumption).filter(models.ProductConsumption.user_id == user_id).all()
-        for consumption in user_consumptions:
-            db.delete(consumption)
-        
-        # 3. Supprimer la photo de profil si elle existe
-        if current_user.profile_image_url:
-            try:
-                # Extraire le nom du fichier de l'URL
-                filename = current_user.profile_image_url.split("/")[-1]
-                file_path = f"static/profile_images/{filename}"
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    print(f"✅ Photo de profil supprimée : {file_path}")
-            except Exception as e:
-                print(f"⚠️ Erreur lors de la suppression de la photo de profil : {e}")
-        
-        # 4. Supprimer l'utilisateur lui-même
-        db.delete(current_user)
-        
-        # 5. Confirmer toutes les suppressions
+
+        if count_user_rows(db, user_id) > ACCOUNT_DELETE_INLINE_MAX_ROWS:
+            job = create_deletion_job(db, user_id)
+            background_tasks.add_task(run_deletion_job, job.id)
+            logger.info("⏳ Suppression du compte %s confiée au job %s", user_id, job.id, extra={"user_id": user_id, "job_id": job.id})
+            return {
+                "message": "La suppression de votre compte est en cours",
+                "deleted_user_id": user_id,
+                "job_id": job.id,
+                "status": job.status,
+            }
+
+        # Stocks, historique, journal, notifications, agrégats puis le compte, dans une seule transaction
+        deleted = purge_user(db, user_id)
+        record_completed_deletion(db, user_id, deleted)
         db.commit()
-        
-        print(f"✅ Compte utilisateur {user_id} ({current_user.username}) supprimé avec succès")
+        invalidate_user_cache(user_id)
+
+        # Photos de profil supprimées après l'envoi de la réponse (le commit est déjà fait)
+        background_tasks.add_task(remove_profile_images, user_id)
+
+        logger.info("✅ Compte utilisateur %s supprimé : %s", user_id, deleted, extra={"user_id": user_id, "deleted_rows": deleted})
         
         return {
             "message": "Votre compte a été supprimé définitivement",
             "deleted_user_id": user_id,
-            "deleted_stocks": len(user_stocks),
-            "deleted_consumptions": len(user_consumptions)
+            "deleted_stocks": deleted["stocks"],
+            "deleted_consumptions": deleted["consumptions"]
         }
         
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"❌ Erreur lors de la suppression du compte : {e}")
+        logger.exception("❌ Erreur lors de la suppression du compte %s", user_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erreur lors de la suppression du compte"
         )
 
+# 🔹 Demander la suppression du compte en arrière-plan (202 + identifiant du job à suivre)
+@router.post("/me/deletion", response_model=AccountDeletionJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def request_account_deletion(background_tasks: BackgroundTasks, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    job = create_deletion_job(db, current_user.id)
+    background_tasks.add_task(run_deletion_job, job.id)
+    return job
+
+# 🔹 Suivre un job de suppression (sans authentification : le compte n'existe plus à la fin,
+# l'identifiant aléatoire du job fait office de jeton)
+@router.get("/deletion-jobs/{job_id}", response_model=AccountDeletionJobResponse)
+def get_account_deletion_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(models.AccountDeletionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job de suppression introuvable")
+    return job
+
+# 🧹 Après un envoi : les anciennes photos ne sont supprimées que si cet envoi est toujours la
+# photo du compte (deux envois simultanés : le premier terminé ne supprime pas les fichiers du
+# second). Les fichiers récents, peut-être d'un envoi en cours, attendent le prochain nettoyage.
+def cleanup_profile_images(user_id: int, prefix: str):
+    db = SessionLocal()
+    try:
+        current = db.query(models.User.profile_image_url).filter(models.User.id == user_id).scalar()
+    finally:
+        db.close()
+    if current and os.path.basename(current).startswith(prefix):
+        delete_profile_images(user_id, keep_prefix=prefix, min_age=PROFILE_IMAGE_CLEANUP_GRACE)
+
 @router.post("/me/profile-image")
 async def upload_profile_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Générer un nom de fichier unique
-    filename = f"profile_{current_user.id}_{uuid.uuid4()}.jpg"
-    file_location = f"static/profile_images/{filename}"
-    
-    # Créer le dossier s'il n'existe pas
-    os.makedirs(os.path.dirname(file_location), exist_ok=True)
-    
-    # Enregistrer le fichier
-    with open(file_location, "wb+") as file_object:
-        file_object.write(await file.read())
-    
-    # Construire l'URL
-    image_url = f"https://api.ustock.pro:8443/static/profile_images/{filename}"
-    
-    # Mettre à jour l'utilisateur en base de données
-    current_user.profile_image_url = image_url
-    db.commit()
-    
-    return {"filename": filename, "profile_image_url": image_url}
\ No newline at end of file
+    # Générer un préfixe de fichier unique
+    prefix = f"profile_{current_user.id}_{uuid.uuid4()}"
+    upload_path = os.path.join(PROFILE_IMAGE_DIR, f"{prefix}.upload")
+
+    # Enregistrer le fichier par morceaux (taille plafonnée), puis produire les miniatures dans le pool d'images
+    await save_upload(file, upload_path)
+    try:
+        variants = await render_profile_variants(upload_path, os.path.join(PROFILE_IMAGE_DIR, prefix))
+    finally:
+        await run_in_threadpool(os.remove, upload_path)
+
+    # Construire les URL (la plus grande variante sert de photo principale)
+    variant_urls = {str(size): profile_image_url(filename) for size, filename in variants.items()}
+    image_url = variant_urls[str(max(variants))]
+
+    # Mettre à jour l'utilisateur en base de données (rechargé : current_user peut venir du cache)
+    def save():
+        user = db.get(models.User, current_user.id)
+        user.profile_image_url = image_url
+        db.commit()
+
+    await run_in_threadpool(save)
+    invalidate_user_cache(current_user.id)
+
+    # Supprimer les anciennes photos de l'utilisateur après la réponse
+    background_tasks.add_task(cleanup_profile_images, current_user.id, prefix)
+
+    return {"filename": variants[max(variants)], "profile_image_url": image_url, "variants": variant_urls}
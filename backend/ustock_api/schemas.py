@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
 from datetime import date, datetime
 
 class ProductCreate(BaseModel):
@@ -18,10 +18,24 @@ class ProductResponse(BaseModel):
     content_size: Optional[str]
     nutriscore: Optional[str]
     image_url: Optional[str]
+    thumbnail_url: Optional[str] = None  # Miniature servie par l'API, renseignée par les routes (product_images.with_thumbnail)
 
     class Config:
         from_attributes = True
 
+class BulkImportRequest(BaseModel):
+    barcodes: list[str] = Field(..., min_length=1, max_length=1000)
+
+class BulkImportItem(BaseModel):
+    barcode: str
+    status: str  # "added", "exists", "not_found", "invalid" ou "error"
+    product_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class BulkImportResponse(BaseModel):
+    results: list[BulkImportItem]
+    summary: dict[str, int]
+
 class UserCreate(BaseModel):
     first_name: str
     last_name: str
@@ -29,7 +43,7 @@ class UserCreate(BaseModel):
     username: str
     gender: str
     password: str
-    family_id: Optional[int] = None
+    family_id: Optional[int] = None  # Toujours null (l'application iOS l'envoie), refusé sinon
 
 # 🔹 MODIFICATION : Ajout de created_at
 class UserResponse(BaseModel):
@@ -59,6 +73,19 @@ class StockCreate(BaseModel):
     quantity: int = 1
     expiration_date: Optional[date] = None
 
+class StockBatchRequest(BaseModel):
+    items: list[StockCreate] = Field(..., min_length=1, max_length=500)
+
+class StockBatchItemResult(BaseModel):
+    index: int
+    status: str  # "created", "updated" ou "error"
+    stock_id: Optional[int] = None
+    quantity: Optional[int] = None
+    detail: Optional[str] = None
+
+class StockBatchResponse(BaseModel):
+    results: list[StockBatchItemResult]
+
 # Modèle pour le stock incluant les détails du produit
 class StockResponse(BaseModel):
     id: int
@@ -72,7 +99,20 @@ class StockResponse(BaseModel):
 class ProductConsumptionCreate(BaseModel):
     stock_id: int
     quantity: int = 1
-    status: str  # "consumed" ou "wasted"
+    status: Literal["consumed", "wasted"]  # Autre valeur : 422 (et non une erreur dans l'agrégat)
+
+class ProductConsumptionBatchRequest(BaseModel):
+    items: list[ProductConsumptionCreate] = Field(..., min_length=1, max_length=500)
+
+class ProductConsumptionBatchItemResult(BaseModel):
+    index: int
+    status: str  # "consumed", "wasted" ou "error"
+    consumption_id: Optional[int] = None
+    remaining_quantity: Optional[int] = None
+    detail: Optional[str] = None
+
+class ProductConsumptionBatchResponse(BaseModel):
+    results: list[ProductConsumptionBatchItemResult]
 
 class ProductConsumptionResponse(BaseModel):
     id: int
@@ -86,4 +126,53 @@ class ProductConsumptionResponse(BaseModel):
     product: ProductResponse
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SyncResponse(BaseModel):
+    token: str  # À renvoyer dans `since` à la prochaine synchronisation
+    full: bool  # True : `stocks` contient tout l'inventaire (pas de `since`)
+    has_more: bool  # True : rappeler immédiatement avec le nouveau jeton
+    stocks: list[StockResponse]  # Stocks créés ou modifiés
+    deleted_stocks: list[int]
+    consumptions: list[ProductConsumptionResponse]  # Consommations enregistrées
+
+# Ligne de l'inventaire familial : stocks des membres regroupés par (produit, date d'expiration)
+class FamilyInventoryItem(BaseModel):
+    product: ProductResponse
+    expiration_date: Optional[date]
+    quantity: int
+    stock_count: int  # Lignes de stock regroupées
+    member_count: int  # Membres qui possèdent ce produit à cette date
+
+class ExpiryDigestItem(BaseModel):
+    stock_id: int
+    product_id: int
+    product_name: str
+    quantity: int
+    expiration_date: date
+
+# Notification relevée par l'application (digest quotidien des dates d'expiration)
+class NotificationResponse(BaseModel):
+    id: int
+    kind: str  # "expiry_digest"
+    notification_date: date
+    expiring_count: int  # Lignes de stock qui expirent bientôt
+    expired_count: int  # Lignes de stock déjà expirées
+    items: list[ExpiryDigestItem]  # Les premières, par date d'expiration
+    created_at: datetime
+    read_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+# Suivi d'une suppression de compte en arrière-plan
+class AccountDeletionJobResponse(BaseModel):
+    id: str  # Identifiant aléatoire, à conserver pour suivre le job
+    status: str  # "pending", "running", "done" ou "failed"
+    deleted_rows: Optional[dict[str, int]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
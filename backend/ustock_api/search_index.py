@@ -0,0 +1,393 @@
+"""Index inversé en mémoire sur `products.product_name` et `products.brand`.
+
+- normalisation insensible à la casse et aux accents (« Crème » == « creme ») ;
+- le dernier mot de la requête est traité comme un préfixe (recherche à la frappe),
+  via une recherche dichotomique dans le vocabulaire trié ;
+- tolérance d'une faute de frappe (distance d'édition 1) sur les mots inconnus ;
+- tous les mots doivent correspondre ; classement par score puis par id (les scores
+  sont calculés par niveaux avec des opérations d'ensembles, pas produit par produit) ;
+- les ensembles des termes fréquents et les termes des préfixes courts sont préparés
+  pendant la construction : la première recherche ne paie pas leur calcul.
+
+L'index est construit au démarrage (une fois par processus) puis complété à chaque
+insertion via l'API, puis avec les produits modifiés par les autres processus
+(invalidation.py). Un produit renommé garde ses anciens termes jusqu'à la prochaine
+reconstruction (redémarrage) : les résultats sont de toute façon relus en base.
+"""
+import bisect
+import heapq
+import itertools
+import logging
+import re
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from ustock_api import models
+from ustock_api.database import SessionLocal
+from ustock_api.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Poids d'une correspondance selon le champ et le type de correspondance
+WEIGHTS = {("name", "exact"): 4.0, ("name", "prefix"): 3.0, ("brand", "exact"): 2.0, ("brand", "prefix"): 1.5}
+TYPO_PENALTY = 0.5
+MIN_PREFIX_LENGTH = 2
+MIN_TYPO_LENGTH = 4
+# Borne le coût d'un préfixe très court (« ch ») : les termes les plus fréquents d'abord
+MAX_PREFIX_POSTINGS = 50_000
+MAX_PREFIX_TERMS = 32
+PREFIX_CACHE_SIZE = 4_096  # Préfixes dont les termes les plus fréquents sont mémorisés
+MAX_QUERY_TOKENS = 5
+# Les listes des termes fréquents sont gardées sous forme d'ensembles (LRU borné)
+SET_CACHE_MIN_POSTINGS = 2_000
+SET_CACHE_SIZE = 256
+# Préfixes couvrant au moins ce nombre de termes : termes fréquents calculés dès la construction
+PREFIX_WARM_MIN_TERMS = 256
+# Au-delà, les nouveaux termes d'un lot sont fusionnés par un tri plutôt qu'insérés un par un
+VOCABULARY_MERGE_THRESHOLD = 64
+# Parcours des ids croissants limité à SCAN_FACTOR fois la longueur attendue pour remplir la page
+SCAN_FACTOR = 4
+STOPWORDS = {"a", "au", "aux", "d", "de", "des", "du", "en", "et", "l", "la", "le", "les", "un", "une", "with", "and", "of", "the"}
+ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+BUILD_BATCH_SIZE = 10_000
+SEARCH_INDEX_ON_STARTUP = settings.search_index_on_startup
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# 🔤 « Crème Fraîche d'Isigny » -> ["creme", "fraiche", "d", "isigny"]
+def normalize(text: str | None):
+    if not text:
+        return []
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return _TOKEN.findall("".join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+# Variantes à distance d'édition 1 (suppression, substitution, insertion, transposition)
+def _edits(term: str):
+    splits = [(term[:i], term[i:]) for i in range(len(term) + 1)]
+    for left, right in splits:
+        if right:
+            yield left + right[1:]
+            for char in ALPHABET:
+                yield left + char + right[1:]
+        if len(right) > 1:
+            yield left + right[1] + right[0] + right[2:]
+        for char in ALPHABET:
+            yield left + char + right
+
+
+class SearchIndex:
+    def __init__(self):
+        self._postings = {"name": {}, "brand": {}}  # champ -> terme -> array d'ids (triés, sans doublon)
+        self._vocabulary = []  # Termes triés, pour les recherches par préfixe
+        self._max_id = 0
+        self._lock = threading.Lock()
+        self._pending = None  # Ajouts reçus pendant une reconstruction, rejoués ensuite
+        self._set_cache = OrderedDict()
+        self._prefix_cache = OrderedDict()
+        self.ready = False
+        self.built_at = None  # Heure de la base au début de la dernière construction
+
+    def __len__(self):
+        return len(self._vocabulary)
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "terms": len(self._vocabulary),
+            "postings": sum(len(ids) for postings in self._postings.values() for ids in postings.values()),
+            "cached_sets": len(self._set_cache),
+            "cached_prefixes": len(self._prefix_cache),
+        }
+
+    # Ajoute un produit aux listes ; renvoie les (champ, terme) modifiés, les termes inconnus vont dans `new_terms`
+    @staticmethod
+    def _add_to(postings, product_id, name, brand, new_terms):
+        touched = []
+        for field, text in (("name", name), ("brand", brand)):
+            for term in set(normalize(text)):
+                ids = postings[field].get(term)
+                if ids is None:
+                    postings[field][term] = array("l", [product_id])
+                    if not any(term in postings[other] for other in postings if other != field):
+                        new_terms.append(term)
+                elif product_id > ids[-1]:
+                    ids.append(product_id)
+                else:
+                    # Produit modifié (ou rejoué) : la liste reste triée et sans doublon
+                    position = bisect.bisect_left(ids, product_id)
+                    if ids[position] == product_id:
+                        continue
+                    ids.insert(position, product_id)
+                touched.append((field, term))
+        return touched
+
+    @staticmethod
+    def _frequency(postings, term):
+        return sum(len(postings[field].get(term, ())) for field in postings)
+
+    # Ensembles des termes les plus fréquents, convertis dès la construction plutôt qu'à la première recherche
+    @staticmethod
+    def _warm_sets(postings):
+        frequent = heapq.nlargest(SET_CACHE_SIZE, (
+            (len(ids), field, term)
+            for field in postings
+            for term, ids in postings[field].items()
+            if len(ids) >= SET_CACHE_MIN_POSTINGS
+        ))
+        # Les moins fréquents en tête : premiers évincés du LRU
+        return OrderedDict(((field, term), frozenset(postings[field][term])) for _, field, term in reversed(frequent))
+
+    # Termes les plus fréquents des préfixes qui couvrent beaucoup de termes (les plus longs à calculer)
+    @classmethod
+    def _warm_prefixes(cls, postings, vocabulary):
+        ranges = []
+        length = MIN_PREFIX_LENGTH
+        while True:
+            found, start = False, 0
+            while start < len(vocabulary):
+                prefix = vocabulary[start][:length]
+                if len(prefix) < length:
+                    start += 1
+                    continue
+                end = bisect.bisect_left(vocabulary, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo=start)
+                if end - start >= PREFIX_WARM_MIN_TERMS:
+                    ranges.append((end - start, prefix, start, end))
+                    found = True
+                start = end
+            if not found:
+                break
+            length += 1
+        cache = OrderedDict()
+        for _, prefix, start, end in reversed(heapq.nlargest(PREFIX_CACHE_SIZE, ranges)):
+            cache[prefix] = heapq.nlargest(
+                MAX_PREFIX_TERMS, ((cls._frequency(postings, term), term) for term in vocabulary[start:end])
+            )
+        return cache
+
+    # 🏗️ Remplacement complet à partir de (id, nom, marque), caches préparés avant la bascule
+    def load(self, products) -> int:
+        postings, vocabulary, max_id, count = {"name": {}, "brand": {}}, [], 0, 0
+        for product_id, name, brand in products:
+            self._add_to(postings, product_id, name, brand, vocabulary)
+            max_id = max(max_id, product_id)
+            count += 1
+        vocabulary.sort()
+        set_cache, prefix_cache = self._warm_sets(postings), self._warm_prefixes(postings, vocabulary)
+        with self._lock:
+            pending, self._pending = self._pending or [], None
+            self._postings, self._vocabulary, self._max_id = postings, vocabulary, max_id
+            self._set_cache, self._prefix_cache = set_cache, prefix_cache
+            self._add_locked(pending)
+            self.ready = True
+        return count
+
+    # 🏗️ Reconstruction complète depuis la base (lecture par lots)
+    def build(self, db: Session, batch_size: int = BUILD_BATCH_SIZE) -> int:
+        built_at = db.scalar(select(func.now()))
+        with self._lock:
+            self._pending = []
+        count = self.load(
+            db.query(models.Product.id, models.Product.product_name, models.Product.brand)
+            .order_by(models.Product.id)
+            .execution_options(stream_results=True, yield_per=batch_size)
+        )
+        self.built_at = built_at
+        return count
+
+    # ➕ Ajout incrémental par lots : produits insérés ou modifiés après la construction
+    def add_products(self, products):
+        products = list(products)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(products)
+            self._add_locked(products)
+
+    def add(self, product_id: int, name: str | None, brand: str | None):
+        self.add_products([(product_id, name, brand)])
+
+    def _add_locked(self, products):
+        new_terms, touched = [], {}
+        for product_id, name, brand in products:
+            for key in self._add_to(self._postings, product_id, name, brand, new_terms):
+                touched.setdefault(key, []).append(product_id)
+            self._max_id = max(self._max_id, product_id)
+        if len(new_terms) > VOCABULARY_MERGE_THRESHOLD:
+            self._vocabulary = sorted(self._vocabulary + new_terms)
+        else:
+            for term in new_terms:
+                bisect.insort(self._vocabulary, term)
+        # Caches complétés plutôt que vidés : un terme fréquent n'est pas reconverti à chaque ajout
+        for key, ids in touched.items():
+            cached = self._set_cache.get(key)
+            if cached is not None:
+                self._set_cache[key] = cached.union(ids)
+        for term in {term for _, term in touched}:
+            entry = (self._frequency(self._postings, term), term)
+            for length in range(MIN_PREFIX_LENGTH, len(term) + 1):
+                top = self._prefix_cache.get(term[:length])
+                if top is not None:
+                    self._prefix_cache[term[:length]] = heapq.nlargest(
+                        MAX_PREFIX_TERMS, [item for item in top if item[1] != term] + [entry]
+                    )
+
+    def _prefix_terms(self, prefix: str):
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo=start)
+        return vocabulary[start:end]
+
+    # Termes les plus fréquents commençant par `prefix` (calculés une fois par préfixe)
+    def _top_prefix_terms(self, prefix: str):
+        with self._lock:
+            cached = self._prefix_cache.get(prefix)
+            if cached is not None:
+                self._prefix_cache.move_to_end(prefix)
+                return cached
+        top = heapq.nlargest(MAX_PREFIX_TERMS, (
+            (self._frequency(self._postings, term), term) for term in self._prefix_terms(prefix)
+        ))
+        with self._lock:
+            self._prefix_cache[prefix] = top
+            if len(self._prefix_cache) > PREFIX_CACHE_SIZE:
+                self._prefix_cache.popitem(last=False)
+        return top
+
+    # Ensemble des ids d'un terme : converti une fois puis gardé en cache pour les termes fréquents
+    def _ids(self, field: str, term: str):
+        ids = self._postings[field].get(term)
+        if ids is None or len(ids) < SET_CACHE_MIN_POSTINGS:
+            return ids
+        key = (field, term)
+        with self._lock:
+            cached = self._set_cache.get(key)
+            if cached is not None:
+                self._set_cache.move_to_end(key)
+                return cached
+        cached = frozenset(ids)
+        with self._lock:
+            self._set_cache[key] = cached
+            if len(self._set_cache) > SET_CACHE_SIZE:
+                self._set_cache.popitem(last=False)
+        return cached
+
+    # Produits correspondant à un mot : [(poids, ids)] par poids décroissant, ensembles disjoints
+    # (chaque produit n'apparaît qu'à son meilleur niveau de correspondance)
+    def _match(self, token: str, is_last: bool):
+        levels = {}
+
+        def collect(term, kind, factor=1.0):
+            for field in ("name", "brand"):
+                ids = self._ids(field, term)
+                if ids:
+                    levels.setdefault(WEIGHTS[(field, kind)] * factor, []).append(ids)
+
+        collect(token, "exact")
+        if is_last and len(token) >= MIN_PREFIX_LENGTH:
+            budget = MAX_PREFIX_POSTINGS
+            for frequency, term in self._top_prefix_terms(token):
+                if term == token:
+                    continue
+                if budget <= 0:
+                    break
+                collect(term, "prefix")
+                budget -= frequency
+        if not levels and len(token) >= MIN_TYPO_LENGTH:
+            for candidate in set(_edits(token)):
+                collect(candidate, "exact", TYPO_PENALTY)
+
+        matched = []
+        for weight in sorted(levels, reverse=True):
+            parts = levels[weight]
+            ids = parts[0] if len(parts) == 1 and isinstance(parts[0], frozenset) else set().union(*parts)
+            if matched:
+                ids = ids.difference(*(previous for _, previous in matched))
+            if ids:
+                matched.append((weight, ids))
+        return matched
+
+    # Les `count` plus petits ids communs à tous les ensembles. Ensembles denses : parcours des
+    # ids croissants filtré par les ensembles eux-mêmes (boucle en C, arrêtée dès la page remplie),
+    # sans construire l'intersection ni trier
+    def _smallest(self, sets, count: int):
+        sets = sorted(sets, key=len)
+        for _ in range(2):
+            smallest = sets[0]
+            if count <= 0 or not smallest:
+                return []
+            span = SCAN_FACTOR * count * (self._max_id + 1) // len(smallest)
+            if span < len(smallest):
+                ids = range(span)
+                for members in sets:
+                    ids = filter(members.__contains__, ids)
+                found = list(itertools.islice(ids, count))
+                if len(found) == count:
+                    return found
+            if len(sets) == 1:
+                break
+            sets = [smallest.intersection(*sets[1:])]
+        return heapq.nsmallest(count, sets[0])
+
+    # 🔎 Renvoie (ids de la page, nombre total de résultats)
+    def search(self, query: str, offset: int = 0, limit: int = 10):
+        tokens = list(dict.fromkeys(normalize(query)))
+        # Les mots vides ne filtrent rien ; le dernier est gardé (il peut être un préfixe en cours de frappe)
+        tokens = [token for token in tokens[:-1] if token not in STOPWORDS] + tokens[-1:]
+        tokens = tokens[-MAX_QUERY_TOKENS:]
+        if not tokens:
+            return [], 0
+        matches = [self._match(token, index == len(tokens) - 1) for index, token in enumerate(tokens)]
+        if not all(matches):
+            return [], 0
+        if len(matches) == 1:
+            # Niveaux disjoints : le total est la somme de leurs tailles
+            candidates, total = [], sum(len(ids) for _, ids in matches[0])
+        else:
+            # Tous les mots doivent correspondre : intersection en commençant par le plus petit ensemble
+            unions = sorted((
+                levels[0][1] if len(levels) == 1 else set().union(*(ids for _, ids in levels))
+                for levels in matches
+            ), key=len)
+            candidates = [unions[0].intersection(*unions[1:])]
+            total = len(candidates[0])
+            if not total:
+                return [], 0
+
+        # Le score ne prend que quelques valeurs : on parcourt les combinaisons de niveaux par
+        # score décroissant et on n'extrait que les plus petits ids qui remplissent la page
+        wanted = offset + limit
+        page = []
+        combinations = sorted(itertools.product(*matches), key=lambda combo: -sum(weight for weight, _ in combo))
+        for combination in combinations:
+            page.extend(self._smallest(candidates + [ids for _, ids in combination], wanted - len(page)))
+            if len(page) >= wanted:
+                break
+        return page[offset:wanted], total
+
+
+# Index partagé par les routes (un par processus)
+product_index = SearchIndex()
+
+
+# 🏗️ Construction au démarrage (thread séparé : l'API répond pendant ce temps, avec repli OFF)
+def build_product_index() -> int:
+    db = SessionLocal()
+    try:
+        count = product_index.build(db)
+        logger.info("🔎 Index de recherche construit : %d produits, %d termes", count, len(product_index))
+        return count
+    finally:
+        db.close()
+
+
+# Indexer des produits fraîchement insérés, à partir de leurs codes-barres
+def index_barcodes(db: Session, barcodes):
+    product_index.add_products(
+        db.query(models.Product.id, models.Product.product_name, models.Product.brand)
+        .filter(models.Product.barcode.in_(list(barcodes)))
+        .all()
+    )
@@ -0,0 +1,116 @@
+"""Lancement de l'API en production : gunicorn, plusieurs workers uvicorn, application préchargée.
+
+- l'application est importée une fois dans le processus maître (preload), puis les workers
+  sont forkés : code, catalogue et index de recherche (construit avant le fork) sont partagés
+  en copie sur écriture au lieu d'être rechargés par chaque worker ;
+- chaque worker a ses pools de processus (bcrypt, images), dimensionnés par défaut sur
+  cœurs // workers pour ne pas surcharger la machine ;
+- après le fork, chaque worker abandonne les connexions SQL héritées et relance son thread
+  de journalisation ; un pool de connexions par worker (voir DB_POOL_SIZE) ;
+- les caches restent propres à chaque worker (utilisateurs authentifiés, ETag des produits,
+  index de recherche) : chacun relit les modifications des autres toutes les
+  CACHE_REFRESH_INTERVAL secondes (invalidation.py), ce qui borne le délai de propagation ;
+- avec plusieurs workers, /metrics agrège tous les processus (PROMETHEUS_MULTIPROC_DIR,
+  dossier temporaire créé si la variable n'est pas définie).
+
+Réglages : WEB_WORKERS, WEB_HOST, WEB_PORT, WEB_TIMEOUT, WEB_MAX_REQUESTS… (voir settings.py).
+
+Usage (depuis backend/) : python -m ustock_api.serve [--workers 4] [--bind 0.0.0.0:8000]
+"""
+import argparse
+import dataclasses
+import glob
+import os
+import tempfile
+
+# Pas d'import de ustock_api.main ici : prometheus_client doit voir PROMETHEUS_MULTIPROC_DIR avant d'être importé
+from ustock_api import settings as settings_module
+from ustock_api.settings import settings
+
+
+def _worker_class() -> str:
+    try:
+        import uvicorn_worker  # noqa: F401  (paquet uvicorn-worker, successeur de uvicorn.workers)
+        return "uvicorn_worker.UvicornWorker"
+    except ImportError:
+        return "uvicorn.workers.UvicornWorker"
+
+
+# 📈 Dossier partagé des métriques : vidé au démarrage (les fichiers d'un ancien lancement fausseraient les compteurs)
+def _prepare_metrics_dir(workers: int):
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory and workers > 1:
+        directory = tempfile.mkdtemp(prefix="ustock-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+    return directory
+
+
+def post_fork(server, worker):
+    from ustock_api.database import dispose_after_fork
+    from ustock_api.logs import setup_logging
+
+    dispose_after_fork()
+    setup_logging()
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def build_application(options: dict):
+    from gunicorn.app.base import BaseApplication
+
+    class UStockApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        # Exécuté une seule fois, dans le maître (preload_app)
+        def load(self):
+            from ustock_api.database import engine
+            from ustock_api.main import app
+            from ustock_api.search_index import SEARCH_INDEX_ON_STARTUP, build_product_index
+
+            if SEARCH_INDEX_ON_STARTUP:
+                build_product_index()
+            engine.dispose()  # Aucune connexion ouverte ne doit traverser le fork
+            return app
+
+    return UStockApplication()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serveur de production de l'API UStock (gunicorn + uvicorn)")
+    parser.add_argument("--workers", type=int, default=settings.web_workers)
+    parser.add_argument("--bind", default=f"{settings.web_host}:{settings.web_port}")
+    args = parser.parse_args(argv)
+    if args.workers != settings.web_workers:
+        # Avant l'import de l'application : les pools de processus sont dimensionnés d'après web_workers
+        settings_module.settings = dataclasses.replace(settings, web_workers=args.workers)
+
+    _prepare_metrics_dir(args.workers)
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": _worker_class(),
+        "preload_app": True,
+        "timeout": settings.web_timeout,
+        "graceful_timeout": settings.web_graceful_timeout,
+        "keepalive": settings.web_keepalive,
+        "max_requests": settings.web_max_requests,
+        "max_requests_jitter": settings.web_max_requests_jitter,
+        "post_fork": post_fork,
+        "child_exit": child_exit,
+    }
+    build_application(options).run()
+
+
+if __name__ == "__main__":
+    main()
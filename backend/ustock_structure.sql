@@ -15,6 +15,68 @@
 /*!40101 SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;
 /*!40111 SET @OLD_SQL_NOTES=@@SQL_NOTES, SQL_NOTES=0 */;
 
+--
+-- Table structure for table `account_deletion_jobs`
+--
+
+DROP TABLE IF EXISTS `account_deletion_jobs`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `account_deletion_jobs` (
+  `id` varchar(32) NOT NULL,
+  `user_id` int(11) NOT NULL,
+  `status` enum('pending','running','done','failed') NOT NULL DEFAULT 'pending',
+  `deleted_rows` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL CHECK (json_valid(`deleted_rows`)),
+  `error` varchar(255) DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  `finished_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `ix_account_deletion_jobs_status` (`status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `change_log`
+--
+
+DROP TABLE IF EXISTS `change_log`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `change_log` (
+  `id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `user_id` int(11) NOT NULL,
+  `version` int(11) NOT NULL,
+  `entity` enum('stock','consumption') NOT NULL,
+  `entity_id` int(11) NOT NULL,
+  `action` enum('upsert','delete') NOT NULL,
+  `changed_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  KEY `ix_change_log_user_version` (`user_id`,`version`),
+  KEY `ix_change_log_changed_at` (`changed_at`),
+  CONSTRAINT `change_log_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `consumption_monthly_stats`
+--
+
+DROP TABLE IF EXISTS `consumption_monthly_stats`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `consumption_monthly_stats` (
+  `user_id` int(11) NOT NULL,
+  `month` date NOT NULL,
+  `product_id` int(11) NOT NULL,
+  `consumed_quantity` int(11) NOT NULL DEFAULT 0,
+  `wasted_quantity` int(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`,`month`,`product_id`),
+  KEY `product_id` (`product_id`),
+  CONSTRAINT `consumption_monthly_stats_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE,
+  CONSTRAINT `consumption_monthly_stats_ibfk_2` FOREIGN KEY (`product_id`) REFERENCES `products` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `families`
 --
@@ -30,6 +92,71 @@ CREATE TABLE `families` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `notifications`
+--
+
+DROP TABLE IF EXISTS `notifications`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `notifications` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `user_id` int(11) NOT NULL,
+  `kind` enum('expiry_digest') NOT NULL,
+  `notification_date` date NOT NULL,
+  `expiring_count` int(11) NOT NULL DEFAULT 0,
+  `expired_count` int(11) NOT NULL DEFAULT 0,
+  `items` longtext CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL CHECK (json_valid(`items`)),
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  `read_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_notifications_user_kind_date` (`user_id`,`kind`,`notification_date`),
+  KEY `ix_notifications_date` (`notification_date`),
+  CONSTRAINT `notifications_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `off_dump_imports`
+--
+
+DROP TABLE IF EXISTS `off_dump_imports`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `off_dump_imports` (
+  `filename` varchar(255) NOT NULL,
+  `products` int(11) NOT NULL DEFAULT 0,
+  `imported_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`filename`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `product_consumption`
+--
+
+DROP TABLE IF EXISTS `product_consumption`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `product_consumption` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `product_id` int(11) NOT NULL,
+  `user_id` int(11) NOT NULL,
+  `stock_id` int(11) DEFAULT NULL,
+  `quantity` int(11) NOT NULL DEFAULT 1,
+  `status` enum('consumed','wasted') NOT NULL,
+  `expiration_date` date DEFAULT NULL,
+  `consumption_date` timestamp NOT NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  KEY `product_id` (`product_id`),
+  KEY `user_id` (`user_id`),
+  KEY `ix_consumption_user_status_date` (`user_id`,`status`,`consumption_date`),
+  KEY `ix_consumption_user_date` (`user_id`,`consumption_date`),
+  CONSTRAINT `product_consumption_ibfk_1` FOREIGN KEY (`product_id`) REFERENCES `products` (`id`),
+  CONSTRAINT `product_consumption_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `products`
 --
@@ -46,8 +173,10 @@ CREATE TABLE `products` (
   `nutriscore` enum('a','b','c','d','e') DEFAULT NULL,
   `image_url` varchar(255) DEFAULT NULL,
   `created_at` timestamp NULL DEFAULT current_timestamp(),
+  `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
   PRIMARY KEY (`id`),
-  UNIQUE KEY `barcode` (`barcode`)
+  UNIQUE KEY `barcode` (`barcode`),
+  KEY `ix_products_updated_at` (`updated_at`)
 ) ENGINE=InnoDB AUTO_INCREMENT=5 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -65,11 +194,16 @@ CREATE TABLE `stocks` (
   `family_id` int(11) DEFAULT NULL,
   `quantity` int(11) NOT NULL DEFAULT 1,
   `expiration_date` date DEFAULT NULL,
+  `expiration_key` date GENERATED ALWAYS AS (coalesce(`expiration_date`,'1000-01-01')) STORED,
   `added_at` timestamp NULL DEFAULT current_timestamp(),
+  `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
   PRIMARY KEY (`id`),
+  UNIQUE KEY `uq_stocks_user_product_expiration` (`user_id`,`product_id`,`expiration_key`),
   KEY `product_id` (`product_id`),
   KEY `user_id` (`user_id`),
   KEY `family_id` (`family_id`),
+  KEY `ix_stocks_family_product_expiration` (`family_id`,`product_id`,`expiration_date`,`quantity`,`user_id`),
+  KEY `ix_stocks_user_expiration` (`user_id`,`expiration_date`),
   CONSTRAINT `stocks_ibfk_1` FOREIGN KEY (`product_id`) REFERENCES `products` (`id`) ON DELETE CASCADE,
   CONSTRAINT `stocks_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE SET NULL,
   CONSTRAINT `stocks_ibfk_3` FOREIGN KEY (`family_id`) REFERENCES `families` (`id`) ON DELETE SET NULL
@@ -113,12 +247,14 @@ CREATE TABLE `users` (
   `gender` enum('homme','femme') NOT NULL,
   `family_id` int(11) DEFAULT NULL,
   `password_hash` varchar(255) NOT NULL,
+  `stock_version` int(11) NOT NULL DEFAULT 0,
   `created_at` timestamp NULL DEFAULT current_timestamp(),
   `updated_at` timestamp NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
   PRIMARY KEY (`id`),
   UNIQUE KEY `email` (`email`),
   UNIQUE KEY `username` (`username`),
   KEY `family_id` (`family_id`),
+  KEY `ix_users_updated_at` (`updated_at`),
   CONSTRAINT `users_ibfk_1` FOREIGN KEY (`family_id`) REFERENCES `families` (`id`) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;